@@ -1,7 +1,12 @@
+import { requester } from '../../utils/requester.js';
 import { HomeController } from '../HomeController.js';
 import { HeaderController } from '../HeaderController.js';
 
 export function LogoutController() {
+    let logoutUrl = 'https://tarina.herokuapp.com/api/logout/';
+
+    requester.postJSON(logoutUrl, {}).catch(() => {});
+
     localStorage.removeItem('tarina-username');
     localStorage.removeItem('tarina-token');
 
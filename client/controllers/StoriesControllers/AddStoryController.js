@@ -16,9 +16,10 @@ export function AddStoryController() {
         }); 
 }
 
-function getTitleFromTemplate() {
+function getStoryFromTemplate() {
     let data = {
-        title: ""
+        title: "",
+        opening_line: ""
     };
 
     if (validator.title($('#story-title').val())) {
@@ -28,16 +29,8 @@ function getTitleFromTemplate() {
         return;
     }
 
-    return data;
-}
-
-function getInitialStorylineFromTemplate() {
-    let data = {
-        content: ""
-    };
-
     if (validator.storyline($('#initial-storyline').val())) {
-        data.content = $('#initial-storyline').val();
+        data.opening_line = $('#initial-storyline').val();
     } else {
         Materialize.toast('Storyline should be between 3 and 250 characters long.', 3000, 'red accent-2');
         return;
@@ -49,15 +42,16 @@ function getInitialStorylineFromTemplate() {
 function postStory() {
     let domain = 'https://tarina.herokuapp.com/api';
     let postStoryUrl = `${domain}/story/`;
+    let data = getStoryFromTemplate();
+
+    if (!data) {
+        return;
+    }
 
-    requester.postJSON(postStoryUrl, getTitleFromTemplate())
+    requester.postJSON(postStoryUrl, data)
         .then((result) => {
-            let storyId = result.id;
-            let postStorylineUrl = `${postStoryUrl}${storyId}/storylines/`;
-            return requester.postJSON(postStorylineUrl, getInitialStorylineFromTemplate());
-        }).then((result) => {
             Materialize.toast('Story added successfully.', 3000, 'green accent-4');
-            window.location.href = `/#/stories/${result.story_id}/`;
+            window.location.href = `/#/stories/${result.id}/`;
         }).catch((err) => {
             Materialize.toast(err.responseJSON.message, 3000, 'red accent-2');
         });
@@ -2,11 +2,16 @@ import { requester } from '../../utils/requester.js';
 import { templates } from '../../utils/templates.js';
 import { validator } from '../../utils/validator.js';
 import { formHandler } from '../../utils/formHandler.js';
+import { liveUrl } from '../../utils/config.js';
 
 import { DeleteStorylineController } from './DeleteStorylineController.js';
 import { NotFoundController } from '../NotFoundController.js';
 
-let dataFromAPI, username;
+let dataFromAPI, username, storylinesCursor, storyEvents, storyRoom, refreshId, typingSentAt;
+let storylineTemplate;
+let roomMembers = {}, roomTyping = {};
+
+const domain = 'http://127.0.0.1:8080';
 
 export function DetailedStoryController(id) {
     let token = localStorage.getItem('tarina-token');
@@ -19,6 +24,7 @@ export function DetailedStoryController(id) {
     Promise.all([getData, getTemplate])
         .then((result) => {
             dataFromAPI = result[0];
+            storylinesCursor = dataFromAPI.storylines_cursor;
             let hbTemplate = Handlebars.compile(result[1]);
 
             dataFromAPI.editable = username === dataFromAPI.author.user.username;
@@ -59,17 +65,234 @@ export function DetailedStoryController(id) {
                 addStoryline(id);
             });
 
-            const domain = 'http://127.0.0.1:8080';
+            $('#new-storyline').on('input', () => {
+                sendTyping($('#new-storyline').val().length > 0);
+            });
+
+            $('#new-storyline').on('blur', () => {
+                sendTyping(false);
+            });
+
+            stopUpdates();
+            startUpdates(id, storyUrl);
+
+        }).catch((err) => {
+            NotFoundController();
+            console.log(err);
+        });
+}
+
+function startUpdates(id, storyUrl) {
+    // The room and the stream need the server running tarina.asgi; without it the page polls
+    if (liveUrl && window.WebSocket) {
+        openStoryRoom(id, storyUrl);
+    } else if (liveUrl && window.EventSource) {
+        openStoryEvents(id, storyUrl);
+    }
+
+    // Polling covers older browsers and the time the room or the stream is down
+    refreshId = setInterval(() => {
+        if (window.location.href !== `${domain}/#/stories/${id}`) {
+            stopUpdates();
+            return;
+        }
+
+        if (!isRoomOpen() && (!storyEvents || storyEvents.readyState !== EventSource.OPEN)) {
+            loadStorylines(id);
+        }
+    }, 1000);
+}
+
+function stopUpdates() {
+    clearInterval(refreshId);
+
+    if (storyEvents) {
+        storyEvents.close();
+        storyEvents = null;
+    }
+
+    if (storyRoom) {
+        let room = storyRoom;
+        storyRoom = null;
+        room.close();
+    }
+}
+
+function isRoomOpen() {
+    return storyRoom && storyRoom.readyState === WebSocket.OPEN;
+}
+
+function openStoryRoom(id, storyUrl) {
+    // Rooms are opened with a single-use ticket too, so every reconnect asks for a new one
+    requester.postJSON(`${storyUrl}ticket/`, {})
+        .then((result) => {
+            if (window.location.href !== `${domain}/#/stories/${id}`) {
+                return;
+            }
+
+            let roomUrl = liveUrl.replace(/^http/, 'ws');
+            let room = new WebSocket(`${roomUrl}/ws/story/${id}/?ticket=${result.ticket}`);
+            storyRoom = room;
+
+            room.onmessage = (message) => {
+                handleRoomEvent(id, JSON.parse(message.data));
+            };
+
+            room.onclose = (event) => {
+                if (storyRoom !== room) {
+                    return;
+                }
+
+                storyRoom = null;
+                roomMembers = {};
+                roomTyping = {};
+                renderPresence();
+
+                if (event.code === 4404) {
+                    stopUpdates();
+                    NotFoundController();
+                    return;
+                }
+
+                setTimeout(() => {
+                    if (!storyRoom && window.location.href === `${domain}/#/stories/${id}`) {
+                        openStoryRoom(id, storyUrl);
+                    }
+                }, 3000);
+            };
+        }).catch((err) => {
+            console.log(err);
+        });
+}
+
+function handleRoomEvent(id, data) {
+    if (data.type === 'storyline-created') {
+        renderChanges({ storylines: [data.storyline], deleted: [], cursor: data.cursor });
+    } else if (data.type === 'storyline-deleted') {
+        renderChanges({ storylines: [], deleted: [data.id], cursor: data.cursor });
+    } else if (data.type === 'storyline-posted') {
+        // The line itself arrives with the storyline-created event the room sends everyone
+        Materialize.toast('Storyline added successfully.', 3000, 'green accent-4');
+        $('#new-storyline').val('');
+        typingSentAt = null;
+    } else if (data.type === 'error') {
+        Materialize.toast(getRoomError(data), 3000, 'red accent-2');
+    } else if (data.type === 'presence') {
+        roomMembers = {};
+        roomTyping = {};
+        data.members.forEach((member) => {
+            roomMembers[member.id] = member.username;
+        });
+        data.typing.forEach((memberId) => {
+            roomTyping[memberId] = true;
+        });
+    } else if (data.type === 'joined') {
+        roomMembers[data.member.id] = data.member.username;
+    } else if (data.type === 'left') {
+        delete roomMembers[data.member.id];
+        delete roomTyping[data.member.id];
+    } else if (data.type === 'typing' && data.typing) {
+        roomTyping[data.member.id] = true;
+    } else if (data.type === 'typing') {
+        delete roomTyping[data.member.id];
+    }
+
+    renderPresence();
+}
+
+function getRoomError(data) {
+    if (data.message || typeof data.detail === 'string') {
+        return data.message || data.detail;
+    }
+
+    return Object.keys(data.detail)
+        .map((field) => data.detail[field])
+        .join(' ');
+}
+
+function renderPresence() {
+    let others = Object.keys(roomMembers).filter((memberId) => {
+        return roomMembers[memberId] !== username;
+    });
+    let typing = others.filter((memberId) => roomTyping[memberId]);
+    let presence = [];
+
+    if (others.length) {
+        presence.push(`${others.length} more writer${others.length === 1 ? '' : 's'} here`);
+    }
+
+    if (typing.length) {
+        let names = typing.map((memberId) => roomMembers[memberId]).join(', ');
+        presence.push(`${names} ${typing.length === 1 ? 'is' : 'are'} typing...`);
+    }
+
+    $('#story-room').text(presence.join(' · '));
+}
+
+function sendTyping(typing) {
+    if (!isRoomOpen()) {
+        return;
+    }
+
+    // The room drops a typing indicator that isn't renewed within a few seconds
+    if (typing && typingSentAt && Date.now() - typingSentAt < 3000) {
+        return;
+    }
+
+    if (!typing && !typingSentAt) {
+        return;
+    }
+
+    typingSentAt = typing ? Date.now() : null;
+    storyRoom.send(JSON.stringify({ type: 'typing', typing }));
+}
+
+function openStoryEvents(id, storyUrl, lastEventId) {
+    // Streams are opened with a single-use ticket, so every reconnect asks for a new one
+    requester.postJSON(`${storyUrl}ticket/`, {})
+        .then((result) => {
+            if (window.location.href !== `${domain}/#/stories/${id}`) {
+                return;
+            }
+
+            let resume = lastEventId ? `&last_event_id=${lastEventId}` : '';
+            let eventsUrl = `${liveUrl}/api/story/${id}/events/`;
+            let events = new EventSource(`${eventsUrl}?ticket=${result.ticket}${resume}`);
+            storyEvents = events;
+
+            events.addEventListener('storyline-created', (event) => {
+                lastEventId = event.lastEventId;
+                renderChanges({
+                    storylines: [JSON.parse(event.data)], deleted: [], cursor: event.lastEventId
+                });
+            });
+
+            events.addEventListener('storyline-deleted', (event) => {
+                lastEventId = event.lastEventId;
+                renderChanges({
+                    storylines: [], deleted: [JSON.parse(event.data).id], cursor: event.lastEventId
+                });
+            });
 
-            let refreshId = setInterval(() => {
+            events.addEventListener('reset', () => {
                 loadStorylines(id);
-                if (window.location.href !== `${domain}/#/stories/${id}`) {
-                    clearInterval(refreshId);
+            });
+
+            events.onerror = () => {
+                events.close();
+
+                if (storyEvents !== events) {
+                    return;
                 }
-            }, 1000);
 
+                storyEvents = null;
+                setTimeout(() => {
+                    if (!storyEvents && window.location.href === `${domain}/#/stories/${id}`) {
+                        openStoryEvents(id, storyUrl, lastEventId);
+                    }
+                }, 3000);
+            };
         }).catch((err) => {
-            NotFoundController();
             console.log(err);
         });
 }
@@ -88,6 +311,11 @@ function addStoryline(id) {
         return;
     }
 
+    if (isRoomOpen()) {
+        storyRoom.send(JSON.stringify({ type: 'storyline', content: data.content }));
+        return;
+    }
+
     requester.postJSON(storyUrl, data)
         .then((result) => {
             Materialize.toast('Storyline added successfully.', 3000, 'green accent-4');
@@ -100,24 +328,47 @@ function addStoryline(id) {
 }
 
 export function loadStorylines(id) {
-    const storylinesUrl = `http://tarina.herokuapp.com/api/story/${id}/storylines/`;
+    const storylinesUrl = `http://tarina.herokuapp.com/api/story/${id}/storylines/?cursor=${storylinesCursor}`;
     let getData = requester.getJSON(storylinesUrl);
-    let getTemplate = templates.get('partials/storyline');
 
-    Promise.all([getData, getTemplate])
-        .then((result) => {
-            let newData = result[0];
-            let storylinesToLoad = [];
+    getData.then((changes) => {
+        if (changes) {
+            renderChanges(changes);
+        }
+    });
+}
+
+function getLaterCursor(cursor, otherCursor) {
+    let parts = cursor.split('.').map(Number);
+    let otherParts = otherCursor.split('.').map(Number);
+
+    return `${Math.max(parts[0], otherParts[0])}.${Math.max(parts[1], otherParts[1])}`;
+}
+
+function renderChanges(changes) {
+    // Sharing one request for the template keeps changes rendering in the order they arrive
+    storylineTemplate = storylineTemplate || templates.get('partials/storyline');
+
+    storylineTemplate
+        .then((source) => {
+            storylinesCursor = getLaterCursor(storylinesCursor, changes.cursor);
 
-            storylinesToLoad = newData.filter((obj) => {
+            changes.deleted.forEach((storylineId) => {
+                $(`.storyline-container #storyline-${storylineId}`).parent().remove();
+            });
+
+            let storylinesToLoad = changes.storylines.filter((obj) => {
                 return !dataFromAPI.storyline_set.some((obj2) => {
                     return obj.id === obj2.id;
                 });
             });
 
-            dataFromAPI.storyline_set = newData;
+            dataFromAPI.storyline_set = dataFromAPI.storyline_set
+                .filter((obj) => changes.deleted.indexOf(obj.id) === -1)
+                .concat(storylinesToLoad);
+
             if (storylinesToLoad.length) {
-                let hbTemplate = Handlebars.compile(result[1]);
+                let hbTemplate = Handlebars.compile(source);
 
                 storylinesToLoad.forEach((el) => {
                     el.storyId = dataFromAPI.id;
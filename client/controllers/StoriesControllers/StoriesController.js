@@ -20,11 +20,11 @@ export function StoriesController(storiesUrl) {
 
     Promise.all([getData, getTemplate])
         .then((result) => {
-            let data = result[0],
+            let data = result[0].results,
                 hbTemplate = Handlebars.compile(result[1]);
             
             data.forEach((el) => {
-                el.starting = el.storyline_set[0].content.slice(0, 149).concat('...');
+                el.starting = el.excerpt;
             });
 
             let template = hbTemplate(data);
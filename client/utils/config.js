@@ -0,0 +1,5 @@
+// Base URL of the server running tarina.asgi, which serves the story rooms and the story event
+// streams, e.g. 'https://live.tarina.herokuapp.com'. Story pages only poll the API without it.
+const liveUrl = null;
+
+export { liveUrl };
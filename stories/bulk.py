@@ -0,0 +1,325 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import serializers
+
+from users.models import Author
+from . import search, trending
+from .models import Story, StoryLine, get_content_digest
+from .serializers import StorySerializer, StoryLineSerializer
+
+
+def is_story_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class StoryImporter:
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.title_field = StorySerializer().fields['title']
+        self.content_field = StoryLineSerializer().fields['content']
+
+        self.stories = 0
+        self.storylines = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.errors.append({'line': line_number, 'message': message})
+
+    def run(self, lines):
+        started = time.time()
+        batch = []
+
+        for line_number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.add_error(line_number, 'Invalid JSON.')
+                continue
+
+            if not isinstance(record, dict):
+                self.add_error(line_number, 'Expected a JSON object.')
+                continue
+
+            batch.append((line_number, record))
+
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+
+        if batch:
+            self.import_batch(batch)
+
+        return self.get_report(time.time() - started)
+
+    def get_report(self, seconds):
+        return {
+            'stories': self.stories,
+            'storylines': self.storylines,
+            'errors': self.errors,
+            'seconds': round(seconds, 3),
+            'storylines_per_second': round(self.storylines / seconds, 1) if seconds else None,
+        }
+
+    def get_usernames(self, batch):
+        usernames = set()
+
+        for _, record in batch:
+            storylines = record.get('storylines')
+            candidates = [record.get('author')] + [
+                storyline.get('author')
+                for storyline in (storylines if isinstance(storylines, list) else ())
+                if isinstance(storyline, dict)
+            ]
+
+            usernames.update(username for username in candidates if isinstance(username, str))
+
+        return usernames
+
+    def validate_field(self, field, value):
+        try:
+            return field.run_validation(value)
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError(
+                '{}: {}'.format(field.field_name, ' '.join(e.detail))
+            )
+
+    def get_author_id(self, username, authors):
+        if not isinstance(username, str):
+            raise serializers.ValidationError('author: Expected a username.')
+
+        if username not in authors:
+            raise serializers.ValidationError('Author "{}" does not exist.'.format(username))
+
+        return authors[username]
+
+    def validate_record(self, record, authors, existing):
+        storylines = record.get('storylines')
+
+        if not isinstance(storylines, list):
+            raise serializers.ValidationError('storylines: Expected a list of story lines.')
+
+        if 'story' in record:
+            if not is_story_id(record['story']):
+                raise serializers.ValidationError('story: Expected a story id.')
+
+            if record['story'] not in existing:
+                raise serializers.ValidationError(
+                    'Story {} does not exist.'.format(record['story'])
+                )
+
+            story = None
+            count, digests = existing[record['story']]
+        else:
+            story = Story(
+                title=self.validate_field(self.title_field, record.get('title')),
+                author_id=self.get_author_id(record.get('author'), authors)
+            )
+            count, digests = 0, set()
+
+        if count + len(storylines) > settings.MAX_STORYLINES:
+            raise serializers.ValidationError(
+                'Max number of story lines reached ({}).'.format(settings.MAX_STORYLINES)
+            )
+
+        validated = []
+        digests = set(digests)
+
+        for storyline in storylines:
+            if not isinstance(storyline, dict):
+                raise serializers.ValidationError('storylines: Expected a list of story lines.')
+
+            author_id = self.get_author_id(storyline.get('author'), authors)
+            content = self.validate_field(self.content_field, storyline.get('content'))
+            digest = get_content_digest(content)
+
+            if digest in digests:
+                raise serializers.ValidationError('Duplicate story line "{}".'.format(content))
+
+            digests.add(digest)
+            validated.append(StoryLine(
+                author_id=author_id, content=content, content_digest=digest
+            ))
+
+        return story, validated, digests
+
+    def import_batch(self, batch):
+        authors = dict(
+            Author.objects.filter(user__username__in=self.get_usernames(batch)).values_list(
+                'user__username', 'id'
+            )
+        )
+
+        story_ids = {record['story'] for _, record in batch if is_story_id(record.get('story'))}
+        existing = {
+            story_id: (storyline_count, set())
+            for story_id, storyline_count
+            in Story.objects.filter(id__in=story_ids).values_list('id', 'storyline_count')
+        }
+        for story_id, digest in StoryLine.objects.filter(story__in=story_ids).values_list(
+            'story', 'content_digest'
+        ):
+            existing[story_id][1].add(digest)
+
+        new_stories = []
+        appended = {}
+
+        for line_number, record in batch:
+            try:
+                story, storylines, digests = self.validate_record(record, authors, existing)
+            except serializers.ValidationError as e:
+                self.add_error(line_number, ' '.join(e.detail))
+                continue
+
+            if story is None:
+                story_id = record['story']
+                existing[story_id] = (existing[story_id][0] + len(storylines), digests)
+                appended.setdefault(story_id, []).extend(storylines)
+            else:
+                new_stories.append((story, storylines))
+
+        counts = self.stories, self.storylines
+
+        try:
+            with transaction.atomic():
+                self.create_stories(new_stories)
+                self.append_storylines(appended)
+
+                search.index_stories(
+                    [story.id for story, _ in new_stories if story.id is not None] + list(appended)
+                )
+        except IntegrityError as e:
+            self.stories, self.storylines = counts
+            self.add_error(batch[0][0], 'Lines {}-{} were not imported: {}'.format(
+                batch[0][0], batch[-1][0], e
+            ))
+
+    def create_stories(self, new_stories):
+        now = timezone.now()
+
+        for story, storylines in new_stories:
+            story.storyline_count = len(storylines)
+            story.last_storyline_author_id = storylines[-1].author_id if storylines else None
+            story.last_activity = now
+            story.trending_score = trending.get_activity_score(
+                trending.STORY_WEIGHT + trending.STORYLINE_WEIGHT * len(storylines), now
+            )
+
+        stories = [story for story, _ in new_stories]
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            Story.objects.bulk_create(stories, batch_size=self.batch_size)
+        else:
+            for story in stories:
+                story.save(force_insert=True)
+
+        storylines = []
+
+        for story, story_storylines in new_stories:
+            for storyline in story_storylines:
+                storyline.story_id = story.id
+                storylines.append(storyline)
+
+        StoryLine.objects.bulk_create(storylines, batch_size=self.batch_size)
+
+        self.stories += len(stories)
+        self.storylines += len(storylines)
+
+    def append_storylines(self, appended):
+        now = timezone.now()
+
+        for story_id, storylines in appended.items():
+            if not storylines:
+                continue
+
+            for storyline in storylines:
+                storyline.story_id = story_id
+
+            StoryLine.objects.bulk_create(storylines, batch_size=self.batch_size)
+
+            Story.objects.filter(id=story_id).touch(
+                storyline_count=F('storyline_count') + len(storylines),
+                last_storyline_author=storylines[-1].author_id,
+                last_activity=now
+            )
+            Story.objects.add_trending_activity(
+                story_id, trending.STORYLINE_WEIGHT * len(storylines), now
+            )
+
+            self.storylines += len(storylines)
+
+
+def parse_since(value):
+    since = parse_datetime(value)
+
+    if since is None:
+        raise ValueError('Invalid datetime: {}'.format(value))
+
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+
+    return since
+
+
+def get_story_chunk(last_id, since, chunk_size):
+    stories = Story.objects.filter(id__gt=last_id).order_by('id')
+
+    if since is not None:
+        stories = stories.filter(last_activity__gte=since)
+
+    return list(stories.values(
+        'id', 'title', 'author__user__username', 'posted_on', 'last_activity', 'num_vote_up'
+    )[:chunk_size])
+
+
+def export_stories(since=None, chunk_size=500):
+    last_id = 0
+
+    while True:
+        stories = get_story_chunk(last_id, since, chunk_size)
+
+        if not stories:
+            return
+
+        storylines = {story['id']: [] for story in stories}
+
+        for story_id, *storyline in StoryLine.objects.filter(story__in=storylines).order_by(
+            'story', 'posted_on', 'id'
+        ).values_list('story', 'id', 'author__user__username', 'content', 'posted_on'):
+            storylines[story_id].append(storyline)
+
+        for story in stories:
+            record = {
+                'id': story['id'],
+                'title': story['title'],
+                'author': story['author__user__username'],
+                'posted_on': story['posted_on'],
+                'last_activity': story['last_activity'],
+                'num_vote_up': story['num_vote_up'],
+                'storylines': [
+                    {
+                        'id': storyline_id,
+                        'author': author,
+                        'content': content,
+                        'posted_on': posted_on
+                    }
+                    for storyline_id, author, content, posted_on in storylines[story['id']]
+                ],
+            }
+
+            yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+        last_id = stories[-1]['id']
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from rest_framework import exceptions
+
+from .rooms import (
+    StoryRoom, channel_layer, run_in_database_thread, get_user, get_story, get_changes,
+    parse_cursor
+)
+
+
+logger = logging.getLogger(__name__)
+
+STREAMED_EVENTS = ('storyline-created', 'storyline-deleted', 'votes')
+
+
+def format_event(event_type, data, event_id=None):
+    lines = []
+
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+
+    lines.append('event: {}'.format(event_type))
+    lines.append('data: {}'.format(json.dumps(data)))
+
+    return '\n'.join(lines) + '\n\n'
+
+
+def get_event_data(event):
+    if event['type'] == 'storyline-created':
+        return event['storyline']
+
+    if event['type'] == 'storyline-deleted':
+        return {'id': event['id']}
+
+    return {'num_vote_up': event['num_vote_up']}
+
+
+class StoryEventsConsumer:
+    def __init__(self, scope, receive, send, story_id):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.story_id = story_id
+        self.cursor = None
+
+    def get_query_param(self, name):
+        query = parse_qs(self.scope.get('query_string', b'').decode('latin-1'))
+
+        return query.get(name, [None])[0]
+
+    def get_last_event_id(self):
+        for name, value in self.scope.get('headers', ()):
+            if name.lower() == b'last-event-id':
+                return value.decode('latin-1')
+
+        # A stream reopened with a new ticket can't set the header
+        return self.get_query_param('last_event_id')
+
+    async def respond(self, status, data):
+        await self.send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await self.send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
+
+    async def send_text(self, text, more_body=True):
+        await self.send({
+            'type': 'http.response.body', 'body': text.encode(), 'more_body': more_body
+        })
+
+    def is_new(self, event):
+        if self.cursor is None or 'cursor' not in event:
+            return True
+
+        last_storyline_id, last_deletion_id = parse_cursor(event['cursor'])
+
+        if event['type'] == 'storyline-created':
+            return last_storyline_id > self.cursor[0]
+
+        return last_deletion_id > self.cursor[1]
+
+    async def send_event(self, event):
+        if event['type'] not in STREAMED_EVENTS or not self.is_new(event):
+            return
+
+        if self.cursor is not None and 'cursor' in event:
+            self.cursor = tuple(map(max, self.cursor, parse_cursor(event['cursor'])))
+
+        await self.send_text(format_event(
+            event['type'], get_event_data(event), event_id=event.get('cursor')
+        ))
+
+    async def replay(self):
+        last_event_id = self.get_last_event_id()
+
+        if last_event_id is None:
+            return
+
+        try:
+            self.cursor = parse_cursor(last_event_id)
+        except ValueError:
+            await self.send_text(format_event('reset', {}))
+            return
+
+        try:
+            events, _, _ = await run_in_database_thread(get_changes, self.story_id, self.cursor)
+        except DatabaseError:
+            logger.exception('Could not replay the changes of story %s.', self.story_id)
+            await self.send_text(format_event('reset', {}))
+            self.cursor = None
+            return
+
+        for event in events:
+            await self.send_event(event)
+
+    async def stream(self, channel):
+        receiving = asyncio.ensure_future(self.receive())
+        forwarding = asyncio.ensure_future(channel_layer.receive(channel))
+
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {receiving, forwarding},
+                    timeout=settings.STORY_EVENTS_HEARTBEAT,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    await self.send_text(': keep-alive\n\n')
+
+                if receiving in done:
+                    if receiving.result()['type'] == 'http.disconnect':
+                        return
+
+                    receiving = asyncio.ensure_future(self.receive())
+
+                if forwarding in done:
+                    event = forwarding.result()
+
+                    # The client reconnects with its last event id and replays what it missed
+                    if event['type'] == 'reset':
+                        await self.send_text('', more_body=False)
+                        return
+
+                    await self.send_event(event)
+                    forwarding = asyncio.ensure_future(channel_layer.receive(channel))
+        finally:
+            receiving.cancel()
+            forwarding.cancel()
+
+    async def __call__(self):
+        if self.scope['method'] != 'GET':
+            await self.respond(405, {'detail': 'Method "{}" not allowed.'.format(
+                self.scope['method']
+            )})
+            return
+
+        try:
+            await run_in_database_thread(get_user, self.get_query_param('ticket'), self.story_id)
+        except exceptions.AuthenticationFailed as e:
+            await self.respond(401, {'detail': e.detail})
+            return
+
+        if await run_in_database_thread(get_story, self.story_id) is None:
+            await self.respond(404, {'detail': 'Not found.'})
+            return
+
+        room = StoryRoom.get(self.story_id)
+        channel = await channel_layer.new_channel()
+        # Listen before replaying, so nothing falls between the replay and the room's changes
+        await room.join(channel)
+
+        headers = [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]
+
+        # The stream is served apart from the API, so it answers cross-origin requests itself
+        if settings.CORS_ORIGIN_ALLOW_ALL:
+            headers.append((b'access-control-allow-origin', b'*'))
+
+        try:
+            await self.send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await self.send_text('retry: {}\n\n'.format(settings.STORY_EVENTS_RETRY * 1000))
+            await self.replay()
+            await self.stream(channel)
+        finally:
+            await room.leave(channel)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stories.bulk import export_stories, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Exports stories with their story lines as NDJSON, one story per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-')
+        parser.add_argument('--since', help='Only stories active since this ISO 8601 datetime.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        since = None
+
+        if options['since'] is not None:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as e:
+                raise CommandError(e)
+
+        records = export_stories(since=since, chunk_size=options['chunk_size'])
+
+        if options['output'] == '-':
+            for record in records:
+                self.stdout.write(record, ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(records)
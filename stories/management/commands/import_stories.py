@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from stories.bulk import StoryImporter
+
+
+class Command(BaseCommand):
+    help = 'Imports stories and story lines from an NDJSON file ("-" reads standard input).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        importer = StoryImporter(batch_size=options['batch_size'])
+
+        if options['path'] == '-':
+            report = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                report = importer.run(lines)
+
+        for error in report['errors']:
+            self.stderr.write('Line {line}: {message}'.format(**error))
+
+        self.stdout.write(
+            'Imported {stories} stories and {storylines} story lines in {seconds}s '
+            '({storylines_per_second} story lines/s, {errors} errors).'.format(
+                **dict(report, errors=len(report['errors']))
+            )
+        )
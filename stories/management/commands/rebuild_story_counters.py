@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from stories.models import Story, StoryLine
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the story line count, last story line author and last activity of every story.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def rebuild_chunk(self, stories):
+        counts = dict(
+            StoryLine.objects.filter(story__in=stories).order_by().values_list(
+                'story'
+            ).annotate(Count('id'))
+        )
+
+        last_storylines = {}
+        storylines = StoryLine.objects.filter(story__in=stories).order_by(
+            'story', '-posted_on', '-id'
+        ).values_list('story', 'author', 'posted_on')
+
+        for story_id, author_id, posted_on in storylines:
+            last_storylines.setdefault(story_id, (author_id, posted_on))
+
+        with transaction.atomic():
+            for story in stories:
+                author_id, posted_on = last_storylines.get(story.id, (None, story.posted_on))
+
+                Story.objects.filter(id=story.id).update(
+                    storyline_count=counts.get(story.id, 0),
+                    last_storyline_author=author_id,
+                    last_activity=posted_on
+                )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            stories = list(
+                Story.objects.filter(id__gt=last_id).order_by('id').only(
+                    'id', 'posted_on'
+                )[:chunk_size]
+            )
+
+            if not stories:
+                break
+
+            self.rebuild_chunk(stories)
+
+            last_id = stories[-1].id
+            rebuilt += len(stories)
+
+        self.stdout.write('Rebuilt the counters of {} stories.'.format(rebuilt))
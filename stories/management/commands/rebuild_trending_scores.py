@@ -0,0 +1,67 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from vote.models import Vote, UP
+
+from stories import trending
+from stories.models import Story, StoryLine
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the trending score of every story from its story lines and votes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def rebuild_chunk(self, stories):
+        scores = {
+            story.id: trending.get_activity_score(trending.STORY_WEIGHT, story.posted_on)
+            for story in stories
+        }
+
+        storylines = StoryLine.objects.filter(story__in=stories).order_by().values_list(
+            'story', 'posted_on'
+        )
+        votes = Vote.objects.filter(
+            content_type=ContentType.objects.get_for_model(Story),
+            object_id__in=scores.keys(),
+            action=UP
+        ).order_by().values_list('object_id', 'create_at')
+
+        activities = [
+            (story_id, trending.STORYLINE_WEIGHT, posted_on) for story_id, posted_on in storylines
+        ] + [
+            (story_id, trending.VOTE_WEIGHT, voted_on) for story_id, voted_on in votes
+        ]
+
+        for story_id, weight, when in activities:
+            scores[story_id] = trending.add_activity(
+                scores[story_id], trending.get_activity_score(weight, when)
+            )
+
+        with transaction.atomic():
+            for story_id, score in scores.items():
+                Story.objects.filter(id=story_id).update(trending_score=score)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            stories = list(
+                Story.objects.filter(id__gt=last_id).order_by('id').only(
+                    'id', 'posted_on'
+                )[:chunk_size]
+            )
+
+            if not stories:
+                break
+
+            self.rebuild_chunk(stories)
+
+            last_id = stories[-1].id
+            rebuilt += len(stories)
+
+        self.stdout.write('Rebuilt the trending scores of {} stories.'.format(rebuilt))
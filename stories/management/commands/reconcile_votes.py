@@ -0,0 +1,64 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from vote.models import Vote, UP
+
+from stories.models import Story
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the vote counters of every story from its vote rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def reconcile_chunk(self, stories):
+        counts = dict(
+            Vote.objects.filter(
+                content_type=ContentType.objects.get_for_model(Story),
+                object_id__in=stories.keys(),
+                action=UP
+            ).order_by().values_list('object_id').annotate(Count('id'))
+        )
+
+        reconciled = 0
+
+        with transaction.atomic():
+            for story_id, num_vote_up in stories.items():
+                count = counts.get(story_id, 0)
+
+                if count != num_vote_up:
+                    Story.objects.filter(id=story_id).touch(
+                        num_vote_up=count,
+                        vote_score=count - F('num_vote_down')
+                    )
+                    reconciled += 1
+
+        return reconciled
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        checked = 0
+        reconciled = 0
+
+        while True:
+            stories = list(
+                Story.objects.filter(id__gt=last_id).order_by('id').values_list(
+                    'id', 'num_vote_up'
+                )[:chunk_size]
+            )
+
+            if not stories:
+                break
+
+            reconciled += self.reconcile_chunk(dict(stories))
+
+            last_id = stories[-1][0]
+            checked += len(stories)
+
+        self.stdout.write('Checked the vote counters of {} stories, {} were reconciled.'.format(
+            checked, reconciled
+        ))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 20:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0005_auto_20170407_1330'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedStoryLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('storyline_id', models.PositiveIntegerField()),
+                ('deleted_on', models.DateTimeField(auto_now_add=True)),
+                ('story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stories.Story')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 20:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_story_counters(apps, schema_editor):
+    Story = apps.get_model('stories', 'Story')
+    StoryLine = apps.get_model('stories', 'StoryLine')
+
+    for story in Story.objects.iterator():
+        storylines = StoryLine.objects.filter(story=story).order_by('-posted_on', '-id')
+        last_storyline = storylines.first()
+
+        story.storyline_count = storylines.count()
+        story.last_storyline_author_id = last_storyline.author_id if last_storyline else None
+        story.last_activity = last_storyline.posted_on if last_storyline else story.posted_on
+        story.save(update_fields=['storyline_count', 'last_storyline_author', 'last_activity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20170325_1104'),
+        ('stories', '0006_deletedstoryline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='last_storyline_author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.Author'),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='storyline_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_story_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 20:22
+from __future__ import unicode_literals
+
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# A copy of the stories.trending scoring as of this migration
+EPOCH = datetime(2017, 1, 1, tzinfo=timezone.utc)
+
+STORY_WEIGHT = 1.0
+STORYLINE_WEIGHT = 0.5
+VOTE_WEIGHT = 1.0
+
+
+def get_activity_score(weight, when):
+    hours = (when - EPOCH).total_seconds() / 3600
+
+    return math.log2(weight) + hours / settings.TRENDING_HALF_LIFE
+
+
+def get_initial_score():
+    return get_activity_score(STORY_WEIGHT, timezone.now())
+
+
+def backfill_trending_scores(apps, schema_editor):
+    Story = apps.get_model('stories', 'Story')
+
+    for story in Story.objects.iterator():
+        weight = (
+            STORY_WEIGHT +
+            VOTE_WEIGHT * story.num_vote_up +
+            STORYLINE_WEIGHT * story.storyline_count
+        )
+
+        story.trending_score = get_activity_score(weight, story.posted_on)
+        story.save(update_fields=['trending_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0007_story_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=get_initial_score),
+        ),
+        migrations.RunPython(backfill_trending_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 21:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0008_story_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Copies of the stories.search backend SQL as of this migration
+CREATE_SQL = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE stories_storysearch USING fts5("
+        "title, content, tokenize='porter unicode61')"
+    ),
+    'postgresql': (
+        'CREATE TABLE stories_storysearch ('
+        'story_id integer PRIMARY KEY, content text NOT NULL, document tsvector NOT NULL); '
+        'CREATE INDEX stories_storysearch_document ON stories_storysearch USING GIN (document)'
+    ),
+}
+
+INDEX_SQL = {
+    'sqlite': (
+        'INSERT OR REPLACE INTO stories_storysearch (rowid, title, content) '
+        "SELECT story.id, story.title, COALESCE(("
+        "SELECT group_concat(content, ' ') FROM ("
+        'SELECT content FROM stories_storyline WHERE story_id = story.id '
+        'ORDER BY posted_on, id)), %s) '
+        'FROM stories_story story WHERE story.id IN ({})'
+    ),
+    'postgresql': (
+        'INSERT INTO stories_storysearch (story_id, content, document) '
+        'SELECT story.id, lines.content, '
+        "setweight(to_tsvector('english', story.title), 'A') || "
+        "setweight(to_tsvector('english', lines.content), 'B') "
+        'FROM stories_story story, LATERAL ('
+        "SELECT COALESCE(string_agg(content, ' ' ORDER BY posted_on, id), %s) AS content "
+        'FROM stories_storyline WHERE story_id = story.id) lines '
+        'WHERE story.id IN ({}) '
+        'ON CONFLICT (story_id) DO UPDATE '
+        'SET content = EXCLUDED.content, document = EXCLUDED.document'
+    ),
+}
+
+DROP_SQL = 'DROP TABLE IF EXISTS stories_storysearch'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor not in CREATE_SQL:
+        return
+
+    schema_editor.execute(CREATE_SQL[vendor])
+
+    Story = apps.get_model('stories', 'Story')
+    story_ids = list(Story.objects.values_list('id', flat=True))
+
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, len(story_ids), 500):
+            chunk = story_ids[start:start + 500]
+            cursor.execute(
+                INDEX_SQL[vendor].format(', '.join(['%s'] * len(chunk))), [''] + chunk
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0009_story_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
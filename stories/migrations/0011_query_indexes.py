@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 21:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_author_modified_on'),
+        ('stories', '0010_story_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='story',
+            name='posted_on',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='story',
+            index_together=set([('author', 'posted_on')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='storyline',
+            index_together=set([('author', 'story'), ('story', 'posted_on')]),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# A copy of stories.models.get_content_digest as of this migration
+def get_content_digest(content):
+    return hashlib.md5(' '.join(content.split()).casefold().encode()).hexdigest()
+
+
+def backfill_content_digests(apps, schema_editor):
+    StoryLine = apps.get_model('stories', 'StoryLine')
+    seen = set()
+
+    # Lines that only differed in whitespace or case were allowed before; later ones keep a
+    # digest of their own so no existing line is lost while new copies are still rejected.
+    for storyline_id, story_id, content in StoryLine.objects.order_by('id').values_list(
+        'id', 'story', 'content'
+    ):
+        digest = get_content_digest(content)
+
+        if (story_id, digest) in seen:
+            digest = get_content_digest('{}#{}'.format(content, storyline_id))
+
+        seen.add((story_id, digest))
+        StoryLine.objects.filter(id=storyline_id).update(content_digest=digest)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storyline',
+            name='content_digest',
+            field=models.CharField(default='', editable=False, max_length=32),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_content_digests, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='storyline',
+            unique_together=set([('story', 'content_digest')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import stories.trending
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0012_storyline_content_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='story',
+            name='trending_score',
+            field=models.FloatField(default=stories.trending.get_initial_score),
+        ),
+        migrations.AlterIndexTogether(
+            name='story',
+            index_together=set([('author', 'posted_on'), ('trending_score', 'id')]),
+        ),
+    ]
@@ -1,34 +1,192 @@
-from django.db import models
+import hashlib
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from vote.models import VoteModel
 
 from users.models import Author
+from . import trending
+
+
+class StoryQuerySet(models.QuerySet):
+    def touch(self, **fields):
+        return self.update(version=models.F('version') + 1, **fields)
+
+    def add_storyline(self, story_id, author_id, when):
+        return self.filter(
+            ~models.Q(last_storyline_author=author_id),
+            id=story_id,
+            storyline_count__lt=settings.MAX_STORYLINES
+        ).touch(
+            storyline_count=models.F('storyline_count') + 1,
+            last_storyline_author=author_id,
+            last_activity=when
+        )
+
+    def remove_storylines(self, story_id, posted_on):
+        with transaction.atomic():
+            story = self.select_for_update().filter(id=story_id).values_list(
+                'trending_score', 'posted_on'
+            ).first()
+
+            if story is None:
+                return
+
+            score, story_posted_on = story
+            minimum = trending.get_activity_score(trending.STORY_WEIGHT, story_posted_on)
+
+            for when in posted_on:
+                score = trending.remove_activity(
+                    score, trending.get_activity_score(trending.STORYLINE_WEIGHT, when), minimum
+                )
+
+            last_storyline_author = StoryLine.objects.filter(story_id=story_id).order_by(
+                '-posted_on', '-id'
+            ).values_list('author', flat=True).first()
+
+            self.filter(id=story_id).touch(
+                storyline_count=models.F('storyline_count') - len(posted_on),
+                last_storyline_author=last_storyline_author,
+                trending_score=score,
+                last_activity=timezone.now()
+            )
+
+    def add_trending_activity(self, story_id, weight, when):
+        with transaction.atomic():
+            score = self.select_for_update().filter(id=story_id).values_list(
+                'trending_score', flat=True
+            ).first()
+
+            if score is None:
+                return
+
+            activity_score = trending.get_activity_score(weight, when)
+
+            self.filter(id=story_id).update(
+                trending_score=trending.add_activity(score, activity_score)
+            )
+
+    def apply_votes(self, story_id, delta, added=None, removed=None):
+        with transaction.atomic():
+            story = self.select_for_update().filter(id=story_id).values_list(
+                'trending_score', 'posted_on', 'num_vote_up'
+            ).first()
+
+            if story is None:
+                return None
+
+            score, posted_on, num_vote_up = story
+
+            if added is not None:
+                score = trending.add_activity(score, added)
+
+            if removed is not None:
+                minimum = trending.get_activity_score(trending.STORY_WEIGHT, posted_on)
+                score = trending.remove_activity(score, removed, minimum)
+
+            self.filter(id=story_id).touch(
+                num_vote_up=models.F('num_vote_up') + delta,
+                vote_score=models.F('vote_score') + delta,
+                trending_score=score,
+                last_activity=timezone.now()
+            )
+
+        return num_vote_up + delta
 
 
 class Story(VoteModel, models.Model):
     title = models.CharField(max_length=100)
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
-    posted_on = models.DateTimeField(auto_now_add=True)
+    posted_on = models.DateTimeField(auto_now_add=True, db_index=True)
     blacklist = models.ManyToManyField(User, blank=True)
+    storyline_count = models.PositiveIntegerField(default=0)
+    last_storyline_author = models.ForeignKey(
+        Author, null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    last_activity = models.DateTimeField(default=timezone.now)
+    trending_score = models.FloatField(default=trending.get_initial_score)
+    version = models.PositiveIntegerField(default=1)
+
+    objects = StoryQuerySet.as_manager()
 
     class Meta:
         ordering = ['-posted_on']
+        index_together = [('author', 'posted_on'), ('trending_score', 'id')]
         verbose_name_plural = 'stories'
 
     def __str__(self):
         return '{} by {} ({})'.format(self.title, self.author, self.posted_on)
 
+    @property
+    def revision(self):
+        return '{}.{}.{:%Y%m%d%H%M%S%f}'.format(self.id, self.version, self.posted_on)
+
+    def load_storylines(self):
+        models.prefetch_related_objects(
+            [self], models.Prefetch('storyline_set', queryset=StoryLine.objects.with_authors())
+        )
+
+    def is_blacklisted(self, user):
+        if not hasattr(self, 'blacklisted_users'):
+            self.blacklisted_users = {}
+
+        if user.id not in self.blacklisted_users:
+            self.blacklisted_users[user.id] = Story.blacklist.through.objects.filter(
+                story_id=self.id, user_id=user.id
+            ).exists()
+
+        return self.blacklisted_users[user.id]
+
+    def block(self, user):
+        self.blacklist.add(user)
+        getattr(self, 'blacklisted_users', {}).pop(user.id, None)
+
+    def unblock(self, user):
+        self.blacklist.remove(user)
+        getattr(self, 'blacklisted_users', {}).pop(user.id, None)
+
+
+def get_content_digest(content):
+    return hashlib.md5(' '.join(content.split()).casefold().encode()).hexdigest()
+
+
+class StoryLineQuerySet(models.QuerySet):
+    def with_authors(self):
+        return self.select_related('author__user')
+
 
 class StoryLine(models.Model):
     story = models.ForeignKey(Story, on_delete=models.CASCADE)
     content = models.CharField(max_length=250)
+    content_digest = models.CharField(max_length=32, editable=False)
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
     posted_on = models.DateTimeField(auto_now_add=True)
 
+    objects = StoryLineQuerySet.as_manager()
+
     class Meta:
         ordering = ['posted_on']
-        unique_together = ('story', 'content')
+        unique_together = ('story', 'content_digest')
+        index_together = [('story', 'posted_on'), ('author', 'story')]
 
     def __str__(self):
         return 'Story line #{} - {}'.format(self.id, self.story)
+
+    def save(self, *args, **kwargs):
+        self.content_digest = get_content_digest(self.content)
+        super().save(*args, **kwargs)
+
+
+class DeletedStoryLine(models.Model):
+    story = models.ForeignKey(Story, on_delete=models.CASCADE)
+    storyline_id = models.PositiveIntegerField()
+    deleted_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return 'Deleted story line #{} - {}'.format(self.storyline_id, self.story)
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StoryCursorPagination(CursorPagination):
+    ordering = '-posted_on'
+    page_size = 20
+
+
+class BlacklistCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 50
+
+
+class TrendingStoryCursorPagination(CursorPagination):
+    # Scores change with every line and vote, so stories can move between pages while they are
+    # being paged through; the id keeps the order of equal scores stable.
+    ordering = ('-trending_score', '-id')
+    page_size = 10
+
+
+class SearchPagination(BasePagination):
+    page_size = 20
+    page_query_param = 'page'
+
+    def paginate_queryset(self, search, request, view=None):
+        try:
+            self.page = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Invalid page.')
+
+        if self.page < 1:
+            raise NotFound('Invalid page.')
+
+        self.request = request
+
+        results = search(self.page_size + 1, (self.page - 1) * self.page_size)
+        self.has_next = len(results) > self.page_size
+
+        return results[:self.page_size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+
+        return replace_query_param(url, self.page_query_param, self.page + 1)
+
+    def get_previous_link(self):
+        if self.page == 1:
+            return None
+
+        url = self.request.build_absolute_uri()
+
+        if self.page == 2:
+            return remove_query_param(url, self.page_query_param)
+
+        return replace_query_param(url, self.page_query_param, self.page - 1)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
@@ -2,34 +2,28 @@ from django.conf import settings
 
 from rest_framework import permissions
 
-from .models import StoryLine
-
 
 class IsAuthor(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user == obj.author.user
+        return request.user.id == obj.author.user_id
 
 
 class IsNotBlacklisted(permissions.BasePermission):
     message = 'You are not allowed to contribute to this story anymore.'
 
     def has_object_permission(self, request, view, obj):
-        return request.user not in obj.blacklist.all()
+        return not obj.is_blacklisted(request.user)
 
 
 class IsNotLastStoryLineAuthor(permissions.BasePermission):
     message = 'You are not allowed to add two consecutive story lines.'
 
     def has_object_permission(self, request, view, obj):
-        story_lines = StoryLine.objects.filter(story=obj)
-
-        return story_lines.last() != story_lines.filter(author=request.user.author).last()
+        return obj.last_storyline_author_id != request.user.author.id
 
 
 class IsNotFullOfStoryLines(permissions.BasePermission):
     message = 'Max number of story lines reached ({}).'.format(settings.MAX_STORYLINES)
 
     def has_object_permission(self, request, view, obj):
-        story_lines = StoryLine.objects.filter(story=obj)
-
-        return story_lines.count() < settings.MAX_STORYLINES
+        return obj.storyline_count < settings.MAX_STORYLINES
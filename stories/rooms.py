@@ -0,0 +1,443 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Max
+
+from rest_framework import exceptions
+
+from users.authentication import authenticate_stream_ticket
+from .models import Story, StoryLine, DeletedStoryLine
+from .permissions import IsNotBlacklisted, IsNotLastStoryLineAuthor, IsNotFullOfStoryLines
+from .serializers import StoryLineSerializer
+from .turns import story_turn
+
+
+logger = logging.getLogger(__name__)
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_RESET = 4408
+
+MAX_MESSAGE_SIZE = 4096
+
+executor = ThreadPoolExecutor(max_workers=settings.STORY_ROOMS_DATABASE_THREADS)
+
+
+def run_in_database_thread(func, *args):
+    def run():
+        close_old_connections()
+
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    return asyncio.get_event_loop().run_in_executor(executor, run)
+
+
+class InMemoryChannelLayer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.channels = {}
+        self.groups = defaultdict(set)
+
+    async def new_channel(self):
+        channel = 'room.{}'.format(uuid.uuid4().hex)
+        self.channels[channel] = asyncio.Queue(maxsize=self.capacity)
+
+        return channel
+
+    async def send(self, channel, message):
+        queue = self.channels.get(channel)
+
+        if queue is None:
+            return
+
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({'type': 'reset'})
+
+    async def receive(self, channel):
+        return await self.channels[channel].get()
+
+    async def group_add(self, group, channel):
+        self.groups[group].add(channel)
+
+    async def group_discard(self, group, channel):
+        self.groups[group].discard(channel)
+        self.channels.pop(channel, None)
+
+        if not self.groups[group]:
+            del self.groups[group]
+
+    async def group_send(self, group, message):
+        for channel in list(self.groups.get(group, ())):
+            await self.send(channel, message)
+
+
+channel_layer = InMemoryChannelLayer(settings.STORY_ROOMS_CHANNEL_CAPACITY)
+
+
+def get_user(ticket, story_id):
+    user, _ = authenticate_stream_ticket(ticket, story_id)
+
+    return user
+
+
+def get_story(story_id):
+    return Story.objects.filter(id=story_id).first()
+
+
+def get_cursor(story_id):
+    last_storyline_id = StoryLine.objects.filter(story_id=story_id).aggregate(
+        last=Max('id')
+    )['last']
+    last_deletion_id = DeletedStoryLine.objects.filter(story_id=story_id).aggregate(
+        last=Max('id')
+    )['last']
+
+    num_vote_up = Story.objects.filter(id=story_id).values_list('num_vote_up', flat=True).first()
+
+    return (last_storyline_id or 0, last_deletion_id or 0), num_vote_up
+
+
+def format_cursor(cursor):
+    return '{}.{}'.format(*cursor)
+
+
+def parse_cursor(value):
+    last_storyline_id, last_deletion_id = value.split('.')
+
+    return int(last_storyline_id), int(last_deletion_id)
+
+
+def get_changes(story_id, cursor):
+    last_storyline_id, last_deletion_id = cursor
+
+    storylines = list(
+        StoryLine.objects.with_authors().filter(
+            story_id=story_id, id__gt=last_storyline_id
+        ).order_by('id')
+    )
+    deletions = list(
+        DeletedStoryLine.objects.filter(
+            story_id=story_id, id__gt=last_deletion_id
+        ).values_list('id', 'storyline_id')
+    )
+
+    num_vote_up = Story.objects.filter(id=story_id).values_list('num_vote_up', flat=True).first()
+    events = []
+
+    # Every event carries the cursor up to it, so streams can resume right after it
+    for storyline in StoryLineSerializer(storylines, many=True).data:
+        last_storyline_id = storyline['id']
+        events.append({
+            'type': 'storyline-created',
+            'storyline': storyline,
+            'cursor': format_cursor((last_storyline_id, last_deletion_id))
+        })
+
+    for last_deletion_id, storyline_id in deletions:
+        events.append({
+            'type': 'storyline-deleted',
+            'id': storyline_id,
+            'cursor': format_cursor((last_storyline_id, last_deletion_id))
+        })
+
+    return events, (last_storyline_id, last_deletion_id), num_vote_up
+
+
+def post_storyline(user, story_id, data):
+    story = Story.objects.get(id=story_id)
+    request = type('RoomRequest', (), {'user': user})()
+
+    for permission in (IsNotBlacklisted(), IsNotLastStoryLineAuthor(), IsNotFullOfStoryLines()):
+        if not permission.has_object_permission(request, None, story):
+            raise exceptions.PermissionDenied(permission.message)
+
+    serializer = StoryLineSerializer(data=data, context={'request': request, 'story': story})
+    serializer.is_valid(raise_exception=True)
+
+    with story_turn(story.id, user.id):
+        serializer.save()
+
+    return serializer.data
+
+
+def get_member(user):
+    return {'id': user.id, 'username': user.username}
+
+
+class StoryRoom:
+    rooms = {}
+
+    def __init__(self, story_id):
+        self.story_id = story_id
+        self.group = 'story.{}'.format(story_id)
+        self.channels = set()
+        self.members = {}
+        self.typing = {}
+        self.cursor = None
+        self.num_vote_up = None
+        self.lock = asyncio.Lock()
+        self.changed = asyncio.Event()
+        self.follower = None
+
+    @classmethod
+    def get(cls, story_id):
+        if story_id not in cls.rooms:
+            cls.rooms[story_id] = cls(story_id)
+
+        return cls.rooms[story_id]
+
+    def get_presence(self):
+        members = {member['id']: member for member in self.members.values()}
+
+        return {
+            'type': 'presence',
+            'members': sorted(members.values(), key=lambda member: member['id']),
+            'typing': sorted(self.typing),
+        }
+
+    def is_present(self, user_id):
+        return any(member['id'] == user_id for member in self.members.values())
+
+    async def join(self, channel, user=None):
+        # Without a user the channel only listens to the story's changes, e.g. for an event
+        # stream, and isn't part of the presence
+        if self.cursor is None:
+            self.cursor, self.num_vote_up = await run_in_database_thread(
+                get_cursor, self.story_id
+            )
+
+        if user is not None and not self.is_present(user.id):
+            await channel_layer.group_send(
+                self.group, {'type': 'joined', 'member': get_member(user)}
+            )
+
+        if user is not None:
+            self.members[channel] = get_member(user)
+
+        self.channels.add(channel)
+        await channel_layer.group_add(self.group, channel)
+
+        if user is not None:
+            await channel_layer.send(channel, self.get_presence())
+
+        if self.follower is None:
+            self.follower = asyncio.ensure_future(self.follow())
+
+    async def leave(self, channel):
+        member = self.members.pop(channel, None)
+        self.channels.discard(channel)
+        await channel_layer.group_discard(self.group, channel)
+
+        if member is not None and not self.is_present(member['id']):
+            self.typing.pop(member['id'], None)
+            await channel_layer.group_send(self.group, {'type': 'left', 'member': member})
+
+        if not self.channels:
+            self.changed.set()
+
+    async def set_typing(self, user, typing):
+        if typing:
+            started = user.id not in self.typing
+            self.typing[user.id] = time.time() + settings.STORY_ROOMS_TYPING_TIMEOUT
+
+            if not started:
+                return
+        elif self.typing.pop(user.id, None) is None:
+            return
+
+        await channel_layer.group_send(
+            self.group, {'type': 'typing', 'member': get_member(user), 'typing': typing}
+        )
+
+    async def expire_typing(self):
+        now = time.time()
+        expired = [user_id for user_id, expires in self.typing.items() if expires <= now]
+
+        for user_id in expired:
+            del self.typing[user_id]
+
+            await channel_layer.group_send(self.group, {
+                'type': 'typing', 'member': {'id': user_id}, 'typing': False
+            })
+
+    async def post(self, user, data):
+        async with self.lock:
+            storyline = await run_in_database_thread(post_storyline, user, self.story_id, data)
+
+        self.changed.set()
+        await self.set_typing(user, False)
+
+        return storyline
+
+    async def broadcast_changes(self):
+        events, self.cursor, num_vote_up = await run_in_database_thread(
+            get_changes, self.story_id, self.cursor
+        )
+
+        for event in events:
+            await channel_layer.group_send(self.group, event)
+
+        if num_vote_up is not None and num_vote_up != self.num_vote_up:
+            self.num_vote_up = num_vote_up
+            await channel_layer.group_send(
+                self.group, {'type': 'votes', 'num_vote_up': num_vote_up}
+            )
+
+    async def follow(self):
+        try:
+            while self.channels:
+                try:
+                    await asyncio.wait_for(
+                        self.changed.wait(), settings.STORY_ROOMS_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+                self.changed.clear()
+
+                if not self.channels:
+                    break
+
+                try:
+                    await self.broadcast_changes()
+                except DatabaseError:
+                    logger.exception('Could not load the changes of story %s.', self.story_id)
+
+                await self.expire_typing()
+        finally:
+            self.follower = None
+
+            if not self.channels:
+                self.rooms.pop(self.story_id, None)
+
+
+class StoryRoomConsumer:
+    def __init__(self, scope, receive, send, story_id):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.story_id = story_id
+        self.user = None
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def close(self, code):
+        await self.send({'type': 'websocket.close', 'code': code})
+
+    def get_ticket(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode('latin-1'))
+
+        return query.get('ticket', [''])[0]
+
+    async def connect(self):
+        try:
+            self.user = await run_in_database_thread(get_user, self.get_ticket(), self.story_id)
+        except exceptions.AuthenticationFailed:
+            return CLOSE_UNAUTHORIZED
+
+        story = await run_in_database_thread(get_story, self.story_id)
+
+        if story is None:
+            return CLOSE_NOT_FOUND
+
+        return None
+
+    async def __call__(self):
+        message = await self.receive()
+
+        if message['type'] != 'websocket.connect':
+            return
+
+        await self.send({'type': 'websocket.accept'})
+
+        code = await self.connect()
+
+        if code is not None:
+            await self.close(code)
+            return
+
+        room = StoryRoom.get(self.story_id)
+        channel = await channel_layer.new_channel()
+        await room.join(channel, self.user)
+
+        receiving = asyncio.ensure_future(self.receive())
+        forwarding = asyncio.ensure_future(channel_layer.receive(channel))
+
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {receiving, forwarding}, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if forwarding in done:
+                    event = forwarding.result()
+
+                    if event['type'] == 'reset':
+                        await self.close(CLOSE_RESET)
+                        return
+
+                    await self.send_json(event)
+                    forwarding = asyncio.ensure_future(channel_layer.receive(channel))
+
+                if receiving in done:
+                    message = receiving.result()
+
+                    if message['type'] == 'websocket.disconnect':
+                        return
+
+                    code = await self.handle(room, message)
+
+                    if code is not None:
+                        await self.close(code)
+                        return
+
+                    receiving = asyncio.ensure_future(self.receive())
+        finally:
+            receiving.cancel()
+            forwarding.cancel()
+            await room.leave(channel)
+
+    async def handle(self, room, message):
+        text = message.get('text') or (message.get('bytes') or b'').decode('utf-8', 'replace')
+
+        try:
+            data = json.loads(text) if len(text) <= MAX_MESSAGE_SIZE else None
+        except ValueError:
+            data = None
+
+        if not isinstance(data, dict):
+            await self.send_json({'type': 'error', 'message': 'Invalid message.'})
+            return
+
+        if data.get('type') == 'typing':
+            await room.set_typing(self.user, bool(data.get('typing')))
+        elif data.get('type') == 'storyline':
+            try:
+                storyline = await room.post(self.user, {'content': data.get('content')})
+            except (Story.DoesNotExist, exceptions.NotFound):
+                return CLOSE_NOT_FOUND
+            except exceptions.APIException as e:
+                await self.send_json({'type': 'error', 'detail': e.detail})
+            except DatabaseError:
+                logger.exception('Could not post a story line to story %s.', self.story_id)
+                await self.send_json({'type': 'error', 'message': 'Could not post the story line.'})
+            else:
+                await self.send_json({'type': 'storyline-posted', 'storyline': storyline})
+        else:
+            await self.send_json({'type': 'error', 'message': 'Unknown message type.'})
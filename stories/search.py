@@ -0,0 +1,173 @@
+import html
+import re
+
+from django.db import connection
+
+from .models import Story
+
+
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def get_words(query):
+    return WORD_PATTERN.findall(query)[:16]
+
+
+def format_snippet(snippet):
+    return html.escape(snippet or '').replace(SNIPPET_START, '<mark>').replace(
+        SNIPPET_END, '</mark>'
+    )
+
+
+class SearchBackend:
+    create_sql = None
+    drop_sql = 'DROP TABLE IF EXISTS stories_storysearch'
+    index_sql = None
+    remove_sql = None
+
+    def index(self, cursor, story_ids):
+        cursor.execute(
+            self.index_sql.format(', '.join(['%s'] * len(story_ids))), [''] + list(story_ids)
+        )
+
+    def remove(self, cursor, story_id):
+        cursor.execute(self.remove_sql, [story_id])
+
+    def search(self, cursor, words, limit, offset):
+        raise NotImplementedError()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    create_sql = (
+        "CREATE VIRTUAL TABLE stories_storysearch USING fts5("
+        "title, content, tokenize='porter unicode61')"
+    )
+
+    index_sql = (
+        'INSERT OR REPLACE INTO stories_storysearch (rowid, title, content) '
+        "SELECT story.id, story.title, COALESCE(("
+        "SELECT group_concat(content, ' ') FROM ("
+        'SELECT content FROM stories_storyline WHERE story_id = story.id '
+        'ORDER BY posted_on, id)), %s) '
+        'FROM stories_story story WHERE story.id IN ({})'
+    )
+    remove_sql = 'DELETE FROM stories_storysearch WHERE rowid = %s'
+
+    search_sql = (
+        'SELECT rowid, snippet(stories_storysearch, -1, %s, %s, %s, 16) '
+        'FROM stories_storysearch WHERE stories_storysearch MATCH %s '
+        'ORDER BY bm25(stories_storysearch, 2.0, 1.0), rowid LIMIT %s OFFSET %s'
+    )
+
+    def get_match(self, words):
+        terms = ['"{}"'.format(word) for word in words]
+        terms[-1] += '*'
+
+        return ' '.join(terms)
+
+    def search(self, cursor, words, limit, offset):
+        cursor.execute(self.search_sql, [
+            SNIPPET_START, SNIPPET_END, '…', self.get_match(words), limit, offset
+        ])
+
+        return cursor.fetchall()
+
+
+class PostgresSearchBackend(SearchBackend):
+    create_sql = (
+        'CREATE TABLE stories_storysearch ('
+        'story_id integer PRIMARY KEY, content text NOT NULL, document tsvector NOT NULL); '
+        'CREATE INDEX stories_storysearch_document ON stories_storysearch USING GIN (document)'
+    )
+
+    index_sql = (
+        'INSERT INTO stories_storysearch (story_id, content, document) '
+        'SELECT story.id, lines.content, '
+        "setweight(to_tsvector('english', story.title), 'A') || "
+        "setweight(to_tsvector('english', lines.content), 'B') "
+        'FROM stories_story story, LATERAL ('
+        "SELECT COALESCE(string_agg(content, ' ' ORDER BY posted_on, id), %s) AS content "
+        'FROM stories_storyline WHERE story_id = story.id) lines '
+        'WHERE story.id IN ({}) '
+        'ON CONFLICT (story_id) DO UPDATE '
+        'SET content = EXCLUDED.content, document = EXCLUDED.document'
+    )
+    remove_sql = 'DELETE FROM stories_storysearch WHERE story_id = %s'
+
+    search_sql = (
+        "SELECT story_id, ts_headline('english', content, query, %s) "
+        "FROM stories_storysearch, to_tsquery('english', %s) query "
+        'WHERE document @@ query ORDER BY ts_rank(document, query) DESC, story_id '
+        'LIMIT %s OFFSET %s'
+    )
+
+    def get_match(self, words):
+        terms = [word.replace("'", '') for word in words]
+        terms[-1] += ':*'
+
+        return ' & '.join(terms)
+
+    def search(self, cursor, words, limit, offset):
+        options = 'StartSel="{}", StopSel="{}", MaxWords=24, MinWords=8'.format(
+            SNIPPET_START, SNIPPET_END
+        )
+        cursor.execute(self.search_sql, [options, self.get_match(words), limit, offset])
+
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend(),
+    'postgresql': PostgresSearchBackend(),
+}
+
+
+def get_backend(vendor=None):
+    return BACKENDS.get(vendor or connection.vendor)
+
+
+def index_stories(story_ids):
+    backend = get_backend()
+
+    if backend is None or not story_ids:
+        return
+
+    with connection.cursor() as cursor:
+        backend.index(cursor, story_ids)
+
+
+def remove_story(story_id):
+    backend = get_backend()
+
+    if backend is None:
+        return
+
+    with connection.cursor() as cursor:
+        backend.remove(cursor, story_id)
+
+
+def search_stories(query, limit, offset=0):
+    backend = get_backend()
+    words = get_words(query)
+
+    if backend is None or not words:
+        return []
+
+    with connection.cursor() as cursor:
+        rows = backend.search(cursor, words, limit, offset)
+
+    stories = Story.objects.select_related('author__user').in_bulk(
+        [story_id for story_id, _ in rows]
+    )
+    results = []
+
+    for story_id, snippet in rows:
+        if story_id in stories:
+            story = stories[story_id]
+            story.snippet = format_snippet(snippet)
+            results.append(story)
+
+    return results
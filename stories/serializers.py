@@ -1,7 +1,14 @@
-from rest_framework import serializers
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from rest_framework import exceptions, serializers
 
 from users.serializers import AuthorSerializer
-from .models import Story, StoryLine
+from .models import Story, StoryLine, get_content_digest
+from .permissions import IsNotLastStoryLineAuthor, IsNotFullOfStoryLines
+from .signals import counted_storylines
 
 
 class StoryLineSerializer(serializers.ModelSerializer):
@@ -18,25 +25,126 @@ class StoryLineSerializer(serializers.ModelSerializer):
 
         author = request.user.author
 
-        return StoryLine.objects.create(
-            story=story, author=author, **validated_data
-        )
+        try:
+            with transaction.atomic():
+                if not Story.objects.add_storyline(story.id, author.id, timezone.now()):
+                    self.reject(story.id)
+
+                storyline = StoryLine(story=story, author=author, **validated_data)
+
+                with counted_storylines():
+                    storyline.save(force_insert=True)
+        except IntegrityError:
+            digest = get_content_digest(validated_data['content'])
+
+            if StoryLine.objects.filter(story_id=story.id, content_digest=digest).exists():
+                raise serializers.ValidationError(
+                    {'content': ['This story line is already part of the story.']}
+                )
+
+            if not Story.objects.filter(id=story.id).exists():
+                raise exceptions.NotFound()
+
+            raise
+
+        return storyline
+
+    def reject(self, story_id):
+        storyline_count = Story.objects.filter(id=story_id).values_list(
+            'storyline_count', flat=True
+        ).first()
+
+        if storyline_count is None:
+            raise exceptions.NotFound()
+
+        if storyline_count >= settings.MAX_STORYLINES:
+            raise exceptions.PermissionDenied(IsNotFullOfStoryLines.message)
+
+        raise exceptions.PermissionDenied(IsNotLastStoryLineAuthor.message)
 
 
 class StorySerializer(serializers.ModelSerializer):
     title = serializers.CharField(min_length=3, max_length=100)
     author = AuthorSerializer(read_only=True)
     storyline_set = StoryLineSerializer(read_only=True, many=True)
-    blacklist = AuthorSerializer(read_only=True, many=True)
+    opening_line = serializers.CharField(
+        min_length=3, max_length=250, write_only=True, required=False
+    )
 
     class Meta:
         model = Story
         fields = (
-            'id', 'title', 'author', 'posted_on', 'num_vote_up', 'storyline_set', 'blacklist'
+            'id', 'title', 'author', 'posted_on', 'num_vote_up', 'storyline_set', 'opening_line'
         )
 
     def create(self, validated_data):
         request = self.context['request']
         author = request.user.author
 
-        return Story.objects.create(author=author, **validated_data)
+        opening_line = validated_data.pop('opening_line', None)
+
+        with transaction.atomic():
+            story = Story.objects.create(author=author, **validated_data)
+
+            if opening_line is not None:
+                StoryLine.objects.create(story=story, author=author, content=opening_line)
+                story.storyline_count = 1
+                story.opening_line = opening_line
+
+        return story
+
+
+class StorySummaryListSerializer(serializers.ListSerializer):
+    @staticmethod
+    def annotate_summaries(stories):
+        opening_line_ids = StoryLine.objects.filter(
+            story__in=[story for story in stories if story.storyline_count]
+        ).order_by().values('story').annotate(opening_line=Min('id')).values_list(
+            'opening_line', flat=True
+        )
+
+        opening_lines = dict(
+            StoryLine.objects.filter(id__in=list(opening_line_ids)).values_list('story', 'content')
+        )
+
+        for story in stories:
+            story.opening_line = opening_lines.get(story.id, '')
+
+    def to_representation(self, data):
+        stories = list(data)
+        self.annotate_summaries(stories)
+
+        return super().to_representation(stories)
+
+
+class StorySummarySerializer(serializers.ModelSerializer):
+    excerpt_length = 150
+
+    author = AuthorSerializer(read_only=True)
+    excerpt = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Story
+        fields = ('id', 'title', 'author', 'posted_on', 'num_vote_up', 'storyline_count', 'excerpt')
+        list_serializer_class = StorySummaryListSerializer
+
+    def to_representation(self, instance):
+        if not hasattr(instance, 'opening_line'):
+            StorySummaryListSerializer.annotate_summaries([instance])
+
+        return super().to_representation(instance)
+
+    def get_excerpt(self, obj):
+        opening_line = obj.opening_line
+
+        if len(opening_line) <= self.excerpt_length:
+            return opening_line
+
+        return opening_line[:self.excerpt_length - 3] + '...'
+
+
+class StorySearchSerializer(StorySummarySerializer):
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta(StorySummarySerializer.Meta):
+        fields = StorySummarySerializer.Meta.fields + ('snippet',)
@@ -0,0 +1,142 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from tarina import metrics
+from users.models import Author
+from . import search
+from .models import Story, StoryLine, DeletedStoryLine
+from .trending import STORYLINE_WEIGHT
+
+
+class DeletionState(threading.local):
+    def __init__(self):
+        # Stories and authors whose deletion cascades to story lines in this thread. Their
+        # lines skip the per-line updates; an author's other stories are updated once each.
+        self.stories = set()
+        self.authors = {}
+
+
+deleting = DeletionState()
+
+
+class CountingState(threading.local):
+    counted = False
+
+
+counting = CountingState()
+
+
+@contextmanager
+def counted_storylines():
+    # Story lines saved in this block were already counted by Story.objects.add_storyline,
+    # so their post_save only records the trending activity.
+    counting.counted = True
+
+    try:
+        yield
+    finally:
+        counting.counted = False
+
+
+def is_cascaded(storyline):
+    return storyline.story_id in deleting.stories or storyline.author_id in deleting.authors
+
+
+@receiver(post_save, sender=StoryLine)
+def count_created_storyline(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+
+    with transaction.atomic():
+        if not counting.counted:
+            Story.objects.filter(id=instance.story_id).touch(
+                storyline_count=F('storyline_count') + 1,
+                last_storyline_author=instance.author_id,
+                last_activity=instance.posted_on
+            )
+        Story.objects.add_trending_activity(
+            instance.story_id, STORYLINE_WEIGHT, instance.posted_on
+        )
+
+    metrics.storylines.inc()
+
+
+@receiver(post_delete, sender=StoryLine)
+def count_deleted_storyline(sender, instance, **kwargs):
+    if not is_cascaded(instance):
+        Story.objects.remove_storylines(instance.story_id, [instance.posted_on])
+
+
+@receiver(pre_delete, sender=Story)
+def start_story_deletion(sender, instance, **kwargs):
+    deleting.stories.add(instance.id)
+
+
+@receiver(post_delete, sender=Story)
+def finish_story_deletion(sender, instance, **kwargs):
+    deleting.stories.discard(instance.id)
+
+
+@receiver(pre_delete, sender=Author)
+def start_author_deletion(sender, instance, **kwargs):
+    storylines = deleting.authors[instance.id] = defaultdict(list)
+
+    for story_id, storyline_id, posted_on in StoryLine.objects.filter(author=instance).exclude(
+        story__author=instance
+    ).values_list('story', 'id', 'posted_on'):
+        storylines[story_id].append((storyline_id, posted_on))
+
+
+@receiver(post_delete, sender=Author)
+def finish_author_deletion(sender, instance, **kwargs):
+    storylines = deleting.authors.pop(instance.id, {})
+
+    # Clients following the surviving stories by cursor learn about the lines from tombstones
+    DeletedStoryLine.objects.bulk_create(
+        DeletedStoryLine(story_id=story_id, storyline_id=storyline_id)
+        for story_id, lines in storylines.items()
+        for storyline_id, _ in lines
+    )
+
+    for story_id, lines in storylines.items():
+        Story.objects.remove_storylines(story_id, [posted_on for _, posted_on in lines])
+
+    if storylines:
+        search.index_stories(list(storylines))
+
+
+@receiver(post_save, sender=Author)
+def touch_author_stories(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+
+    contributions = StoryLine.objects.filter(author=instance).values('story')
+
+    Story.objects.filter(Q(author=instance) | Q(id__in=contributions)).touch(
+        last_activity=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Story)
+def index_saved_story(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_stories([instance.id])
+
+
+@receiver(post_save, sender=StoryLine)
+@receiver(post_delete, sender=StoryLine)
+def index_storyline_story(sender, instance, raw=False, **kwargs):
+    if not raw and not is_cascaded(instance):
+        search.index_stories([instance.story_id])
+
+
+@receiver(post_delete, sender=Story)
+def remove_deleted_story(sender, instance, **kwargs):
+    search.remove_story(instance.id)
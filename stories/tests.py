@@ -1,12 +1,49 @@
+import asyncio
+import json
+import logging
+import os
+import pstats
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Min, Q
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.http import http_date
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import (
+    AuthenticationFailed, NotFound, PermissionDenied, ValidationError
+)
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from rest_framework.authtoken.models import Token
 
+from users.authentication import authenticate_stream_ticket, issue_stream_ticket, token_cache
 from users.models import Author
-from .models import Story, StoryLine
-from .permissions import IsNotBlacklisted, IsNotLastStoryLineAuthor
+from .models import Story, StoryLine, DeletedStoryLine, get_content_digest
+from tarina import asgi, benchmark, metrics
+from tarina.cache import FileBasedCache, LRUCache, SingleFlightCache
+from tarina.queries import QueryBudgetExceeded
+from tarina.slow_queries import ProcessRotatingFileHandler, explain
+from .bulk import StoryImporter
+from .serializers import StoryLineSerializer
+from .rooms import InMemoryChannelLayer, StoryRoom, post_storyline
+from .turns import TURN_TAKEN_MESSAGE, claim_turn, get_turn_key, release_turn
+from .views import StoriesViewSet
+from . import votes
+from . import trending
+from .permissions import IsNotBlacklisted, IsNotLastStoryLineAuthor, IsNotFullOfStoryLines
 
 
 HTTP_MESSAGES = {
@@ -14,7 +51,8 @@ HTTP_MESSAGES = {
     403: {
         'default': 'You do not have permission to perform this action.',
         'blacklisted': IsNotBlacklisted().message,
-        'last_author': IsNotLastStoryLineAuthor().message
+        'last_author': IsNotLastStoryLineAuthor().message,
+        'full': IsNotFullOfStoryLines().message
     },
     404: 'Not found.'
 }
@@ -49,9 +87,58 @@ class StoriesViewSetTests(APITestCase):
 
         response = self.client.get(reverse(self.list_view_name))
 
-        self.assertEqual(self.story.title, response.data[0]['title'])
+        self.assertEqual(self.story.title, response.data['results'][0]['title'])
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_story_list_returns_summaries(self):
+        self.client.force_authenticate(user=self.user)
+
+        StoryLine.objects.create(content='Sit down. Be humble.', story=self.story, author=self.author)
+        StoryLine.objects.create(content='Hol up.', story=self.story, author=self.author)
+        Story.objects.create(title='Empty story', author=self.author)
+
+        response = self.client.get(reverse(self.list_view_name))
+
+        empty_story, story = response.data['results']
+
+        self.assertEqual(story['excerpt'], 'Sit down. Be humble.')
+        self.assertEqual(story['storyline_count'], 2)
+        self.assertNotIn('storyline_set', story)
+        self.assertNotIn('blacklist', story)
+        self.assertEqual(empty_story['excerpt'], '')
+        self.assertEqual(empty_story['storyline_count'], 0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_list_with_long_opening_line(self):
+        self.client.force_authenticate(user=self.user)
+
+        StoryLine.objects.create(content='humble' * 40, story=self.story, author=self.author)
+
+        response = self.client.get(reverse(self.list_view_name))
+
+        excerpt = response.data['results'][0]['excerpt']
+
+        self.assertEqual(len(excerpt), 150)
+        self.assertTrue(excerpt.endswith('...'))
+
+    def test_story_list_pagination(self):
+        self.client.force_authenticate(user=self.user)
+
+        for number in range(25):
+            Story.objects.create(title='Story #{}'.format(number), author=self.author)
+
+        response = self.client.get(reverse(self.list_view_name))
+
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(response.data['results'][0]['title'], 'Story #24')
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(response.data['results'][-1]['title'], self.story.title)
+        self.assertIsNone(response.data['next'])
+
     def test_story_detail_with_unauthorized_user(self):
         response = self.client.get(reverse(self.detail_view_name, kwargs={'pk': self.story.id}))
 
@@ -108,6 +195,45 @@ class StoriesViewSetTests(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_story_creation_with_opening_line(self):
+        self.client.force_authenticate(user=self.user)
+
+        self.request_body['opening_line'] = 'Once upon a time in Sofia.'
+        response = self.client.post(reverse(self.list_view_name), self.request_body, format='json')
+
+        story = Story.objects.get(id=response.data['id'])
+
+        self.assertEqual(response.data['excerpt'], 'Once upon a time in Sofia.')
+        self.assertEqual(response.data['storyline_count'], 1)
+        self.assertEqual(story.storyline_count, 1)
+        self.assertEqual(story.last_storyline_author, self.author)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_story_creation_with_too_short_opening_line(self):
+        self.client.force_authenticate(user=self.user)
+        stories_count = Story.objects.count()
+
+        self.request_body['opening_line'] = 'Hi'
+        response = self.client.post(reverse(self.list_view_name), self.request_body, format='json')
+
+        self.assertEqual(
+            response.data['opening_line'], ['Ensure this field has at least 3 characters.']
+        )
+        self.assertEqual(Story.objects.count(), stories_count)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_story_creation_is_rolled_back_when_opening_line_fails(self):
+        self.client.force_authenticate(user=self.user)
+        stories_count = Story.objects.count()
+
+        self.request_body['opening_line'] = 'Once upon a time in Sofia.'
+
+        with mock.patch.object(StoryLine.objects, 'create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse(self.list_view_name), self.request_body, format='json')
+
+        self.assertEqual(Story.objects.count(), stories_count)
+
     def test_story_creation_with_authorized_user(self):
         self.client.force_authenticate(user=self.user)
 
@@ -145,6 +271,69 @@ class StoriesViewSetTests(APITestCase):
         self.assertEqual(response.data['message'], 'Story successfully deleted.')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+
+class StoryQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='Cole', password='middlechild')
+        self.author = Author.objects.create(user=self.user)
+        self.story = Story.objects.create(title='Test!', author=self.author)
+
+        self.client.force_authenticate(user=self.user)
+
+    def add_contributors(self, story, count):
+        for number in range(count):
+            user = User.objects.create(username='{}-{}'.format(story.id, number))
+            author = Author.objects.create(user=user)
+
+            StoryLine.objects.create(
+                content='Line #{}'.format(number), story=story, author=author
+            )
+            story.blacklist.add(user)
+
+    def test_story_list_query_count_does_not_grow_with_stories(self):
+        for number in range(5):
+            self.add_contributors(Story.objects.create(title='Story', author=self.author), 3)
+
+        with self.assertNumQueries(3):
+            self.client.get(reverse('stories:story-list'))
+
+    def test_story_detail_query_count_does_not_grow_with_story_lines(self):
+        self.add_contributors(self.story, 10)
+        self.story.votes.exists(self.user.pk)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse('stories:story-detail', kwargs={'pk': self.story.id})
+            )
+
+        self.assertEqual(len(response.data['storyline_set']), 10)
+        self.assertNotIn('blacklist', response.data)
+
+    def test_blacklist_check_is_memoized(self):
+        user = User.objects.create(username='Blocked')
+        self.story.blacklist.add(user)
+
+        story = Story.objects.get(id=self.story.id)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(story.is_blacklisted(user))
+            self.assertTrue(story.is_blacklisted(user))
+            self.assertFalse(IsNotBlacklisted().has_object_permission(
+                mock.Mock(user=user), None, story
+            ))
+
+    def test_story_line_list_query_count_does_not_grow_with_story_lines(self):
+        self.add_contributors(self.story, 10)
+
+        with self.assertNumQueries(2):
+            self.client.get(reverse('stories:storylines-list', kwargs={'story_pk': self.story.id}))
+
+    def test_story_list_over_query_budget(self):
+        with mock.patch.object(StoriesViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('stories:story-list'))
+
+
 class CategoryStoryListViewTests(APITestCase):
     def setUp(self):
         self.view_name = 'stories:category-list'
@@ -180,24 +369,104 @@ class CategoryStoryListViewTests(APITestCase):
 
         response = self.client.get(reverse(self.view_name, kwargs={'category': 'personal'}))
 
-        self.assertEqual(response.data[0]['title'], self.story2.title)
-        self.assertEqual(response.data[1]['title'], self.story1.title)
+        self.assertEqual(response.data['results'][0]['title'], self.story2.title)
+        self.assertEqual(response.data['results'][1]['title'], self.story1.title)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def vote(self, story, count):
+        for number in range(count):
+            voter = User.objects.create(username='voter-{}-{}'.format(story.id, number))
+            self.client.force_authenticate(user=voter)
+            self.client.put(reverse('stories:vote', kwargs={'pk': story.id}))
+
     def test_trending_category_list(self):
-        self.client.force_authenticate(user=self.user)
+        self.vote(self.story1, 3)
+        self.vote(self.story2, 1)
 
-        self.story1.num_vote_up += 3
-        self.story2.num_vote_up += 1
-        self.story1.save()
-        self.story2.save()
+        self.client.force_authenticate(user=self.user)
 
         response = self.client.get(reverse(self.view_name, kwargs={'category': 'trending'}))
 
-        self.assertEqual(response.data[0]['title'], self.story1.title)
-        self.assertEqual(response.data[1]['title'], self.story2.title)
+        self.assertEqual(response.data['results'][0]['title'], self.story1.title)
+        self.assertEqual(response.data['results'][1]['title'], self.story2.title)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_trending_category_list_decays_old_activity(self):
+        month_ago = timezone.now() - timedelta(days=30)
+
+        self.vote(self.story1, 3)
+        Story.objects.filter(id=self.story1.id).update(
+            trending_score=trending.get_activity_score(100, month_ago)
+        )
+
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse(self.view_name, kwargs={'category': 'trending'}))
+
+        self.assertEqual(response.data['results'][0]['title'], self.story2.title)
+
+    def test_trending_category_list_pagination(self):
+        for number in range(10):
+            Story.objects.create(title='Story #{}'.format(number), author=self.author)
+
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse(self.view_name, kwargs={'category': 'trending'}))
+
+        self.assertEqual(len(response.data['results']), 10)
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][-1]['title'], self.story1.title)
+
+    def test_trending_category_list_pagination_with_equal_scores(self):
+        for number in range(10):
+            Story.objects.create(title='Story #{}'.format(number), author=self.author)
+
+        Story.objects.update(trending_score=1)
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse(self.view_name, kwargs={'category': 'trending'}))
+        ids = [story['id'] for story in response.data['results']]
+        response = self.client.get(response.data['next'])
+        ids += [story['id'] for story in response.data['results']]
+
+        self.assertEqual(ids, sorted(Story.objects.values_list('id', flat=True), reverse=True))
+
+    def test_trending_score_after_unvote(self):
+        initial_score = Story.objects.get(id=self.story1.id).trending_score
+
+        self.vote(self.story1, 1)
+
+        self.assertGreater(Story.objects.get(id=self.story1.id).trending_score, initial_score)
+
+        self.client.put(reverse('stories:unvote', kwargs={'pk': self.story1.id}))
+
+        self.assertAlmostEqual(Story.objects.get(id=self.story1.id).trending_score, initial_score)
+
+    def test_trending_score_after_story_line_deletion(self):
+        StoryLine.objects.create(content='Kept line.', story=self.story1, author=self.author)
+        storyline = StoryLine.objects.create(
+            content='Deleted line.', story=self.story1, author=self.author
+        )
+        storyline.delete()
+        score = Story.objects.get(id=self.story1.id).trending_score
+
+        call_command('rebuild_trending_scores', stdout=StringIO())
+
+        self.assertAlmostEqual(Story.objects.get(id=self.story1.id).trending_score, score)
+
+    def test_rebuild_trending_scores_command(self):
+        self.vote(self.story1, 2)
+        score = Story.objects.get(id=self.story1.id).trending_score
+
+        Story.objects.update(trending_score=0)
+
+        call_command('rebuild_trending_scores', stdout=StringIO())
+
+        self.assertAlmostEqual(Story.objects.get(id=self.story1.id).trending_score, score)
+
 
 class StoryLinesViewSetTests(APITestCase):
     def setUp(self):
@@ -270,6 +539,100 @@ class StoryLinesViewSetTests(APITestCase):
         self.assertEqual(response.data[1]['content'], self.storyline2.content)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_story_line_changes_with_invalid_cursor(self):
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': 'test'}
+        )
+
+        self.assertEqual(response.data['message'], 'Invalid cursor.')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_story_line_changes_from_the_beginning(self):
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': '0.0'}
+        )
+
+        self.assertEqual(response.data['storylines'][0]['content'], self.storyline1.content)
+        self.assertEqual(response.data['storylines'][1]['content'], self.storyline2.content)
+        self.assertEqual(response.data['deleted'], [])
+        self.assertEqual(response.data['cursor'], '{}.0'.format(self.storyline2.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_line_changes_without_changes(self):
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': '{}.0'.format(self.storyline2.id)}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_story_line_changes_with_new_and_deleted_story_lines(self):
+        self.client.force_authenticate(user=self.user1)
+
+        cursor = '{}.0'.format(self.storyline2.id)
+
+        self.client.delete(
+            reverse(
+                self.detail_view_name,
+                kwargs={'story_pk': self.story.id, 'pk': self.storyline2.id}
+            )
+        )
+        storyline3 = StoryLine.objects.create(
+            content='Like a rolling stone.',
+            story=self.story,
+            author=self.author1
+        )
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': cursor}
+        )
+
+        self.assertEqual(len(response.data['storylines']), 1)
+        self.assertEqual(response.data['storylines'][0]['content'], storyline3.content)
+        self.assertEqual(response.data['deleted'], [self.storyline2.id])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': response.data['cursor']}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_story_line_changes_from_story_detail_cursor(self):
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.get(reverse('stories:story-detail', kwargs={'pk': self.story.id}))
+        cursor = response.data['storylines_cursor']
+
+        self.assertEqual(cursor, '{}.0'.format(self.storyline2.id))
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': cursor}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.author2.delete()
+
+        response = self.client.get(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            {'cursor': cursor}
+        )
+
+        self.assertEqual(response.data['storylines'], [])
+        self.assertEqual(response.data['deleted'], [self.storyline2.id])
+
     def test_story_line_detail_with_unauthorized_user(self):
         response = self.client.get(
             reverse(
@@ -417,7 +780,24 @@ class StoryLinesViewSetTests(APITestCase):
         self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
 
     def test_story_line_creation_when_story_is_full_of_story_lines(self):
-        pass
+        self.client.force_authenticate(user=self.user1)
+
+        for number in range(settings.MAX_STORYLINES - 2):
+            StoryLine.objects.create(
+                content='Line #{}'.format(number),
+                story=self.story,
+                author=self.author1 if number % 2 == 0 else self.author2
+            )
+
+        response = self.client.post(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            data={'content': 'for your eyez only!'}
+        )
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code]['full'])
+        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
 
     def test_story_line_creation_with_valid_data(self):
         self.client.force_authenticate(user=self.user1)
@@ -429,6 +809,27 @@ class StoryLinesViewSetTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_story_line_creation_with_duplicate_content(self):
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.post(
+            reverse(self.list_view_name, kwargs={'story_pk': self.story.id}),
+            data={'content': '  4 your   Eyez only'}
+        )
+
+        self.assertEqual(
+            response.data['content'], ['This story line is already part of the story.']
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(StoryLine.objects.filter(story=self.story).count(), 2)
+
+    def test_story_line_content_digest_is_normalized(self):
+        self.assertEqual(len(self.storyline2.content_digest), 32)
+        self.assertEqual(
+            self.storyline2.content_digest, get_content_digest('4 your\n eyez  ONLY')
+        )
+        self.assertNotEqual(self.storyline1.content_digest, self.storyline2.content_digest)
+
     def test_story_line_deletion_with_unauthorized_user(self):
         response = self.client.delete(
             reverse(
@@ -516,90 +917,1933 @@ class StoryLinesViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
-class StoryVotingTests(APITestCase):
+class StoryCountersTests(APITestCase):
     def setUp(self):
-        self.vote_view_name = 'stories:vote'
-        self.unvote_view_name = 'stories:unvote'
+        self.user1 = User.objects.create(username='Ab-Soul', password='controlsystem')
+        self.user2 = User.objects.create(username='ScHoolboy Q', password='oxymoron')
+        self.author1 = Author.objects.create(user=self.user1)
+        self.author2 = Author.objects.create(user=self.user2)
 
-        self.user = User.objects.create(
-            username='DAMN',
-            password='straightouttacompton',
-            first_name='Kendrick',
-            last_name='Lamar'
-        )
-        self.blocked_user = User.objects.create(
-            username='Millenium',
-            password='alwaysonyourmind',
-            first_name='Lifeline',
-            last_name='Ontheline'
+        self.story = Story.objects.create(title='Black Hippy', author=self.author1)
+        self.storyline1 = StoryLine.objects.create(
+            content='Terrorist threats.', story=self.story, author=self.author1
         )
-        self.author = Author.objects.create(user=self.user)
-        self.story = Story.objects.create(title='Church', author=self.author)
-        self.story.blacklist.add(self.blocked_user)
-        self.story.save()
-
-    def test_voting_with_unauthorized_user(self):
-        response = self.client.put(
-            reverse(self.vote_view_name, kwargs={'pk': self.story.id})
+        self.storyline2 = StoryLine.objects.create(
+            content='Collard greens.', story=self.story, author=self.author2
         )
 
-        status_code = response.status_code
+    def assertCounters(self, storyline_count, last_storyline_author):
+        self.story.refresh_from_db()
 
-        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code])
-        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.story.storyline_count, storyline_count)
+        self.assertEqual(self.story.last_storyline_author, last_storyline_author)
 
-    def test_voting_when_user_is_blocked(self):
-        self.client.force_authenticate(user=self.blocked_user)
+    def test_counters_on_story_line_creation(self):
+        self.assertCounters(2, self.author2)
+        self.assertEqual(self.story.last_activity, self.storyline2.posted_on)
 
-        response = self.client.put(
-            reverse(self.vote_view_name, kwargs={'pk': self.story.id})
-        )
+    def test_counters_on_story_line_deletion(self):
+        self.storyline2.delete()
 
-        status_code = response.status_code
+        self.assertCounters(1, self.author1)
 
-        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code]['blacklisted'])
-        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
+        self.storyline1.delete()
 
-    def test_voting_with_invalid_story_id(self):
-        self.client.force_authenticate(user=self.user)
+        self.assertCounters(0, None)
 
-        response = self.client.put(
-            reverse(self.vote_view_name, kwargs={'pk': self.story.id + 1})
-        )
+    def test_counters_on_author_deletion(self):
+        self.author2.delete()
 
-        status_code = response.status_code
+        self.assertCounters(1, self.author1)
 
-        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code])
-        self.assertEqual(status_code, status.HTTP_404_NOT_FOUND)
+    def test_story_deletion_skips_story_line_counters(self):
+        with mock.patch.object(Story.objects, 'remove_storylines') as remove_storylines:
+            self.story.delete()
 
-    def test_voting_with_authorized_user(self):
-        self.client.force_authenticate(user=self.user)
+        remove_storylines.assert_not_called()
 
-        response = self.client.put(
-            reverse(self.vote_view_name, kwargs={'pk': self.story.id})
+    def test_author_deletion_updates_each_story_once(self):
+        StoryLine.objects.create(
+            content='Hood Gone Love It.', story=self.story, author=self.author1
         )
+        storyline = StoryLine.objects.create(
+            content='Man of the Year.', story=self.story, author=self.author2
+        )
+        own_story = Story.objects.create(title='Setbacks', author=self.author2)
+        StoryLine.objects.create(content='Druggys Wit Hoes.', story=own_story, author=self.author1)
 
-        status_code = response.status_code
+        with mock.patch.object(
+            Story.objects, 'remove_storylines', wraps=Story.objects.remove_storylines
+        ) as remove_storylines:
+            self.author2.delete()
 
-        self.assertEqual(response.data['num_vote_up'], 1)
-        self.assertEqual(status_code, status.HTTP_200_OK)
+        remove_storylines.assert_called_once_with(
+            self.story.id, [self.storyline2.posted_on, storyline.posted_on]
+        )
+        self.assertCounters(2, self.author1)
+        self.assertEqual(
+            list(DeletedStoryLine.objects.values_list('story', 'storyline_id')),
+            [(self.story.id, self.storyline2.id), (self.story.id, storyline.id)]
+        )
 
-    def test_unvoting_with_unauthorized_user(self):
-        response = self.client.put(
-            reverse(self.unvote_view_name, kwargs={'pk': self.story.id})
+    def test_rebuild_story_counters_command(self):
+        Story.objects.filter(id=self.story.id).update(
+            storyline_count=0, last_storyline_author=None
         )
 
-        status_code = response.status_code
+        call_command('rebuild_story_counters', stdout=StringIO())
 
-        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code])
-        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertCounters(2, self.author2)
+        self.assertEqual(self.story.last_activity, self.storyline2.posted_on)
 
-    def test_unvoting_with_invalid_story_id(self):
-        self.client.force_authenticate(user=self.user)
 
-        response = self.client.put(
-            reverse(self.unvote_view_name, kwargs={'pk': self.story.id + 1})
-        )
+class StoryLineRaceTests(APITransactionTestCase):
+    def setUp(self):
+        self.users = []
+
+        for number in range(6):
+            user = User.objects.create(username='Writer {}'.format(number))
+            Author.objects.create(user=user)
+            self.users.append(User.objects.select_related('author').get(id=user.id))
+
+        self.story = Story.objects.create(title='Crowded', author=self.users[0].author)
+        self.url = reverse('stories:storylines-list', kwargs={'story_pk': self.story.id})
+
+    def create_storyline(self, story, user, content):
+        request = type('Request', (), {'user': user})()
+        serializer = StoryLineSerializer(
+            data={'content': content}, context={'request': request, 'story': story}
+        )
+        serializer.is_valid(raise_exception=True)
+
+        return serializer.save()
+
+    def test_stale_checks_are_enforced_by_the_insert(self):
+        self.create_storyline(self.story, self.users[1], 'First line.')
+
+        with self.assertRaisesMessage(PermissionDenied, IsNotLastStoryLineAuthor.message):
+            self.create_storyline(self.story, self.users[1], 'Second line.')
+
+        Story.objects.filter(id=self.story.id).update(storyline_count=settings.MAX_STORYLINES)
+
+        with self.assertRaisesMessage(PermissionDenied, IsNotFullOfStoryLines.message):
+            self.create_storyline(self.story, self.users[2], 'Third line.')
+
+        self.assertEqual(StoryLine.objects.filter(story=self.story).count(), 1)
+
+    def test_integrity_errors_are_not_all_reported_as_duplicates(self):
+        self.create_storyline(self.story, self.users[1], 'First line.')
+
+        with self.assertRaises(ValidationError):
+            self.create_storyline(self.story, self.users[2], 'first  LINE.')
+
+        with mock.patch.object(StoryLine, 'save', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.create_storyline(self.story, self.users[2], 'Second line.')
+
+            Story.objects.filter(id=self.story.id).delete()
+
+            with mock.patch.object(Story.objects, 'add_storyline', return_value=True):
+                with self.assertRaises(NotFound):
+                    self.create_storyline(self.story, self.users[2], 'Second line.')
+
+    def test_writers_take_turns_posting(self):
+        self.addCleanup(token_cache.cache.delete, get_turn_key(self.story.id))
+        client = APIClient()
+        client.force_authenticate(user=self.users[1])
+
+        self.assertTrue(claim_turn(self.story.id, self.users[2].id))
+        self.assertFalse(claim_turn(self.story.id, self.users[3].id))
+
+        response = client.post(self.url, {'content': 'Cutting in.'})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], TURN_TAKEN_MESSAGE)
+
+        with self.assertRaisesMessage(PermissionDenied, TURN_TAKEN_MESSAGE):
+            post_storyline(self.users[1], self.story.id, {'content': 'Cutting in.'})
+
+        # Only the holder hands the turn over
+        release_turn(self.story.id, self.users[1].id)
+        self.assertFalse(claim_turn(self.story.id, self.users[1].id))
+        release_turn(self.story.id, self.users[2].id)
+
+        response = client.post(self.url, {'content': 'My turn.'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertRaisesMessage(PermissionDenied, IsNotLastStoryLineAuthor.message):
+            post_storyline(self.users[1], self.story.id, {'content': 'My turn again.'})
+
+        # Refused posts give the turn back as well as saved ones
+        self.assertTrue(claim_turn(self.story.id, self.users[3].id))
+        self.assertEqual(StoryLine.objects.filter(story=self.story).count(), 1)
+
+    @override_settings(STORY_TURN_TIMEOUT=1)
+    def test_turn_of_a_stalled_writer_expires(self):
+        self.addCleanup(token_cache.cache.delete, get_turn_key(self.story.id))
+        client = APIClient()
+        client.force_authenticate(user=self.users[1])
+
+        claim_turn(self.story.id, self.users[2].id)
+
+        response = client.post(self.url, {'content': 'Too early.'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        time.sleep(1.1)
+
+        response = client.post(self.url, {'content': 'Just in time.'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_parallel_writers_keep_story_invariants(self):
+        writers = self.users * 2
+        barrier = threading.Barrier(len(writers))
+        statuses = []
+        check = IsNotFullOfStoryLines.has_object_permission
+
+        def slow_check(permission, request, view, obj):
+            allowed = check(permission, request, view, obj)
+            time.sleep(random.uniform(0, 0.01))
+
+            return allowed
+
+        def post(client, content):
+            # The shared-cache in-memory sqlite test database locks whole tables, so
+            # concurrent writes fail instead of waiting; retry them until they get through.
+            deadline = time.time() + 60
+            attempt = 0
+
+            # Writers refused while another one holds the turn retry the same way.
+            while True:
+                try:
+                    response = client.post(
+                        self.url, {'content': '{}.{}'.format(content, attempt)}
+                    )
+                except OperationalError:
+                    if time.time() > deadline:
+                        raise
+                else:
+                    if response.data.get('detail') != TURN_TAKEN_MESSAGE:
+                        return response
+
+                    self.assertLess(time.time(), deadline)
+
+                time.sleep(random.uniform(0, min(0.002 * 2 ** attempt, 0.05)))
+                attempt += 1
+
+        def write(user, tab):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            barrier.wait()
+
+            try:
+                for number in range(100):
+                    response = post(client, '{} line #{}.{}'.format(user.username, tab, number))
+                    statuses.append(response.status_code)
+
+                    if response.data.get('detail') == IsNotFullOfStoryLines.message:
+                        return
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=write, args=(user, tab)) for tab, user in enumerate(writers)
+        ]
+
+        with mock.patch.object(IsNotFullOfStoryLines, 'has_object_permission', slow_check):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        story = Story.objects.get(id=self.story.id)
+        authors = list(
+            StoryLine.objects.filter(story=story).order_by('posted_on', 'id').values_list(
+                'author', flat=True
+            )
+        )
+
+        self.assertEqual(len(authors), settings.MAX_STORYLINES)
+        self.assertEqual(story.storyline_count, len(authors))
+        self.assertEqual(story.last_storyline_author_id, authors[-1])
+        self.assertFalse([a for a, b in zip(authors, authors[1:]) if a == b])
+        self.assertLessEqual(
+            set(statuses), {status.HTTP_201_CREATED, status.HTTP_403_FORBIDDEN}
+        )
+
+
+class StoryImportTests(APITestCase):
+    def setUp(self):
+        self.view_name = 'stories:import'
+
+        self.admin = User.objects.create(username='Archivist', is_staff=True)
+        self.user = User.objects.create(username='Logic', password='everybody')
+        self.author = Author.objects.create(user=self.user)
+        self.other_user = User.objects.create(username='Joyner', password='stronghold')
+        self.other_author = Author.objects.create(user=self.other_user)
+
+        self.story = Story.objects.create(title='Under Pressure', author=self.author)
+        StoryLine.objects.create(content='Soul Food.', story=self.story, author=self.author)
+
+        self.client.force_authenticate(user=self.admin)
+
+    def post_records(self, *records):
+        body = '\n'.join(
+            record if isinstance(record, str) else json.dumps(record) for record in records
+        )
+
+        return self.client.post(
+            reverse(self.view_name), body, content_type='application/x-ndjson'
+        )
+
+    def test_import_with_non_admin_user(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.post_records({'title': 'Bobby', 'author': 'Logic', 'storylines': []})
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[403]['default'])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_new_stories(self):
+        response = self.post_records(
+            {
+                'title': 'The Incredible True Story',
+                'author': 'Logic',
+                'storylines': [
+                    {'author': 'Logic', 'content': 'Contact.'},
+                    {'author': 'Joyner', 'content': 'Innermission.'},
+                ]
+            },
+            {'title': 'Young Sinatra', 'author': 'Joyner', 'storylines': []}
+        )
+
+        story = Story.objects.get(title='The Incredible True Story')
+
+        self.assertEqual((response.data['stories'], response.data['storylines']), (2, 2))
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(story.storyline_count, 2)
+        self.assertEqual(story.last_storyline_author, self.other_author)
+        self.assertGreater(
+            story.trending_score, Story.objects.get(title='Young Sinatra').trending_score
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_import_story_lines_into_existing_story(self):
+        version = Story.objects.get(id=self.story.id).version
+
+        response = self.post_records({
+            'story': self.story.id,
+            'storylines': [{'author': 'Joyner', 'content': 'Gang Related.'}]
+        })
+
+        story = Story.objects.get(id=self.story.id)
+
+        self.assertEqual(response.data['storylines'], 1)
+        self.assertEqual(story.storyline_count, 2)
+        self.assertEqual(story.last_storyline_author, self.other_author)
+        self.assertEqual(story.version, version + 1)
+
+    def test_import_reports_invalid_records(self):
+        too_many = [
+            {'author': 'Logic', 'content': 'Line #{}'.format(number)}
+            for number in range(settings.MAX_STORYLINES)
+        ]
+
+        response = self.post_records(
+            '{not json',
+            {'title': 'No', 'author': 'Logic', 'storylines': []},
+            {'title': 'Ghost', 'author': 'Nobody', 'storylines': []},
+            {'story': self.story.id, 'storylines': [{'author': 'Logic', 'content': 'Soul Food.'}]},
+            {'story': self.story.id, 'storylines': too_many},
+            {'story': self.story.id + 100, 'storylines': []},
+            {
+                'title': 'Everybody',
+                'author': 'Logic',
+                'storylines': [{'author': 'Logic', 'content': 'Hallelujah.'}]
+            }
+        )
+
+        self.assertEqual(
+            response.data['errors'],
+            [
+                {'line': 1, 'message': 'Invalid JSON.'},
+                {'line': 2, 'message': 'title: Ensure this field has at least 3 characters.'},
+                {'line': 3, 'message': 'Author "Nobody" does not exist.'},
+                {'line': 4, 'message': 'Duplicate story line "Soul Food.".'},
+                {'line': 5, 'message': IsNotFullOfStoryLines().message},
+                {'line': 6, 'message': 'Story {} does not exist.'.format(self.story.id + 100)},
+            ]
+        )
+        self.assertEqual((response.data['stories'], response.data['storylines']), (1, 1))
+        self.assertEqual(Story.objects.get(id=self.story.id).storyline_count, 1)
+
+    def test_import_reports_records_with_wrongly_typed_keys(self):
+        response = self.post_records(
+            {'title': 'Bobby', 'author': ['Logic'], 'storylines': []},
+            {'story': {'id': self.story.id}, 'storylines': []},
+            {'story': True, 'storylines': []},
+            {'story': self.story.id, 'storylines': [{'author': {}, 'content': 'Gang Related.'}]},
+            {'title': 'Bobby', 'author': 'Logic', 'storylines': {'author': 'Logic'}}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['errors'],
+            [
+                {'line': 1, 'message': 'author: Expected a username.'},
+                {'line': 2, 'message': 'story: Expected a story id.'},
+                {'line': 3, 'message': 'story: Expected a story id.'},
+                {'line': 4, 'message': 'author: Expected a username.'},
+                {'line': 5, 'message': 'storylines: Expected a list of story lines.'},
+            ]
+        )
+
+    def test_import_reports_integrity_errors_per_batch(self):
+        story, author = self.story, self.author
+
+        class RacingStoryImporter(StoryImporter):
+            def append_storylines(self, appended):
+                if appended:
+                    StoryLine.objects.create(content='Gang Related.', story=story, author=author)
+
+                super().append_storylines(appended)
+
+        report = RacingStoryImporter(batch_size=1).run([
+            json.dumps({
+                'story': story.id,
+                'storylines': [{'author': 'Joyner', 'content': 'Gang Related.'}]
+            }),
+            json.dumps({'title': 'Bobby Tarantino', 'author': 'Logic', 'storylines': []})
+        ])
+
+        self.assertEqual((report['stories'], report['storylines']), (1, 0))
+        self.assertEqual(len(report['errors']), 1)
+        self.assertEqual(report['errors'][0]['line'], 1)
+        self.assertIn('Lines 1-1 were not imported', report['errors'][0]['message'])
+        self.assertEqual(StoryLine.objects.filter(story=story).count(), 1)
+
+    def test_import_rejects_story_lines_differing_only_in_case_and_spacing(self):
+        response = self.post_records(
+            {
+                'story': self.story.id,
+                'storylines': [{'author': 'Joyner', 'content': 'soul  FOOD.'}]
+            },
+            {
+                'title': 'The Incredible True Story',
+                'author': 'Logic',
+                'storylines': [
+                    {'author': 'Logic', 'content': 'Fade Away.'},
+                    {'author': 'Joyner', 'content': 'fade away.'}
+                ]
+            }
+        )
+
+        self.assertEqual(
+            response.data['errors'],
+            [
+                {'line': 1, 'message': 'Duplicate story line "soul  FOOD.".'},
+                {'line': 2, 'message': 'Duplicate story line "fade away.".'},
+            ]
+        )
+        self.assertEqual((response.data['stories'], response.data['storylines']), (0, 0))
+
+    def test_import_stories_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as ndjson:
+            ndjson.write(json.dumps({
+                'title': 'Bobby Tarantino',
+                'author': 'Logic',
+                'storylines': [{'author': 'Logic', 'content': 'Flexicution.'}]
+            }) + '\n')
+        self.addCleanup(os.remove, ndjson.name)
+
+        stdout = StringIO()
+        call_command('import_stories', ndjson.name, '--batch-size', '1', stdout=stdout)
+
+        self.assertIn('Imported 1 stories and 1 story lines', stdout.getvalue())
+        self.assertEqual(Story.objects.get(title='Bobby Tarantino').storyline_count, 1)
+
+
+class StorySearchTests(APITestCase):
+    def setUp(self):
+        self.search_url = reverse('stories:search')
+
+        self.user = User.objects.create(username='Gambino', password='awaken')
+        self.author = Author.objects.create(user=self.user)
+
+        self.dragon_story = Story.objects.create(title='The dragon of Sofia', author=self.author)
+        StoryLine.objects.create(
+            content='A knight rode north.', story=self.dragon_story, author=self.author
+        )
+
+        self.harbor_story = Story.objects.create(title='Quiet harbor', author=self.author)
+        StoryLine.objects.create(
+            content='The dragons slept by the sea.', story=self.harbor_story, author=self.author
+        )
+
+        Story.objects.create(title='Redbone', author=self.author)
+
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, query, **params):
+        return self.client.get(self.search_url, dict(params, q=query))
+
+    def get_ids(self, response):
+        return [story['id'] for story in response.data['results']]
+
+    def test_search_ranks_titles_and_story_lines(self):
+        with self.assertNumQueries(4):
+            response = self.search('dragon')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_ids(response), [self.dragon_story.id, self.harbor_story.id])
+        self.assertEqual(response.data['results'][0]['excerpt'], 'A knight rode north.')
+        self.assertIn('<mark>dragons</mark>', response.data['results'][1]['snippet'])
+
+    def test_search_matches_prefixes_of_the_last_word(self):
+        response = self.search('knight no')
+
+        self.assertEqual(self.get_ids(response), [self.dragon_story.id])
+
+    def test_search_index_follows_story_lines(self):
+        url = reverse('stories:storylines-list', kwargs={'story_pk': self.harbor_story.id})
+        contributor = User.objects.create(username='Childish')
+        Author.objects.create(user=contributor)
+        self.client.force_authenticate(user=contributor)
+
+        response = self.client.post(url, {'content': 'A wizard woke up.'})
+        storyline_id = response.data['id']
+
+        self.assertEqual(self.get_ids(self.search('wizard')), [self.harbor_story.id])
+
+        self.client.force_authenticate(user=self.user)
+        self.client.delete(url + '{}/'.format(storyline_id))
+
+        self.assertEqual(self.get_ids(self.search('wizard')), [])
+
+    def test_deleted_stories_are_not_found(self):
+        self.client.delete(reverse('stories:story-detail', kwargs={'pk': self.dragon_story.id}))
+
+        self.assertEqual(self.get_ids(self.search('dragon')), [self.harbor_story.id])
+
+    def test_deleted_stories_are_not_reindexed(self):
+        with mock.patch('stories.signals.search.index_stories') as index_stories:
+            self.dragon_story.delete()
+
+        index_stories.assert_not_called()
+
+    def test_author_deletion_reindexes_each_story_once(self):
+        contributor = User.objects.create(username='Childish')
+        author = Author.objects.create(user=contributor)
+        StoryLine.objects.create(
+            content='A wizard woke up.', story=self.harbor_story, author=author
+        )
+        StoryLine.objects.create(content='A wizard fell.', story=self.harbor_story, author=author)
+
+        with mock.patch('stories.signals.search.index_stories') as index_stories:
+            author.delete()
+
+        index_stories.assert_called_once_with([self.harbor_story.id])
+
+    def test_imported_stories_are_found(self):
+        StoryImporter().run([json.dumps({
+            'title': 'Imported',
+            'author': self.user.username,
+            'storylines': [{'author': self.user.username, 'content': 'A phoenix rose.'}]
+        })])
+
+        self.assertEqual(
+            self.get_ids(self.search('phoenix')), [Story.objects.get(title='Imported').id]
+        )
+
+    def test_snippets_are_escaped(self):
+        StoryLine.objects.create(
+            content='<b>A dragon</b> spoke.', story=self.dragon_story, author=self.author
+        )
+
+        snippet = self.search('spoke').data['results'][0]['snippet']
+
+        self.assertIn('&lt;b&gt;A dragon&lt;/b&gt; <mark>spoke</mark>', snippet)
+
+    def test_search_pagination(self):
+        for number in range(25):
+            Story.objects.create(title='Sweatpants #{}'.format(number), author=self.author)
+
+        first_page = self.search('sweatpants')
+
+        self.assertEqual(len(first_page.data['results']), 20)
+        self.assertIsNone(first_page.data['previous'])
+
+        second_page = self.client.get(first_page.data['next'])
+
+        self.assertEqual(len(second_page.data['results']), 5)
+        self.assertIsNone(second_page.data['next'])
+        self.assertFalse(set(self.get_ids(first_page)) & set(self.get_ids(second_page)))
+
+    def test_search_without_query(self):
+        response = self.search(' "* ')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Expected a search query.')
+
+    def test_search_with_invalid_page(self):
+        response = self.search('dragon', page='zero')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(
+    connection.vendor in ('sqlite', 'postgresql'), 'Checks SQLite and PostgreSQL query plans.'
+)
+class StoryIndexTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users, story_ids = benchmark.seed_dataset(stories=300, lines=10, users=30, votes=0)
+
+        cls.author = users[0].author
+        cls.story = Story.objects.get(id=story_ids[0])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # PostgreSQL prefers sequential scans on a test-sized table even when an index fits,
+        # so they are priced out to show which plans an index can serve at all
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndexes(self, queryset, ordered=False):
+        sql, params = queryset.query.sql_with_params()
+        plan = explain(connection, sql, params)
+
+        for line in plan:
+            self.assertNotRegex(line, r'^SCAN (TABLE )?\w+$', plan)
+            self.assertNotIn('TEMP B-TREE', line, plan)
+            self.assertNotIn('Seq Scan', line, plan)
+
+            if ordered:
+                self.assertNotRegex(line, r'\bSort\b', plan)
+
+    def test_story_list_indexes(self):
+        self.assertUsesIndexes(Story.objects.select_related('author__user')[:20], ordered=True)
+        self.assertUsesIndexes(
+            Story.objects.filter(posted_on__lt=timezone.now()).select_related('author__user')[:20],
+            ordered=True
+        )
+        self.assertUsesIndexes(Story.objects.filter(author=self.author)[:20], ordered=True)
+        self.assertUsesIndexes(
+            Story.objects.order_by('-trending_score', '-id')[:10], ordered=True
+        )
+
+    def test_story_line_indexes(self):
+        self.assertUsesIndexes(StoryLine.objects.with_authors().filter(story=self.story))
+        self.assertUsesIndexes(
+            StoryLine.objects.with_authors().filter(story=self.story, id__gt=0).order_by('id')
+        )
+        self.assertUsesIndexes(
+            DeletedStoryLine.objects.filter(story=self.story, id__gt=0).values_list('id')
+        )
+        self.assertUsesIndexes(
+            StoryLine.objects.filter(story=self.story).order_by('-posted_on', '-id').values_list(
+                'author', flat=True
+            )[:1]
+        )
+        self.assertUsesIndexes(Story.objects.filter(
+            Q(author=self.author) |
+            Q(id__in=StoryLine.objects.filter(author=self.author).values('story'))
+        ).order_by())
+        self.assertUsesIndexes(
+            StoryLine.objects.filter(story__in=[self.story.id, self.story.id + 1]).order_by(
+            ).values('story').annotate(opening_line=Min('id'))
+        )
+
+    def test_blacklist_index(self):
+        self.assertUsesIndexes(
+            Story.blacklist.through.objects.filter(story_id=self.story.id, user_id=1)
+        )
+
+
+class StoryExportTests(APITestCase):
+    def setUp(self):
+        self.view_name = 'stories:export'
+
+        self.admin = User.objects.create(username='Archivist', is_staff=True)
+        self.user = User.objects.create(username='Tyler', password='flowerboy')
+        self.author = Author.objects.create(user=self.user)
+
+        self.story = Story.objects.create(title='Scum Fuck Flower Boy', author=self.author)
+        StoryLine.objects.create(content='Foreword.', story=self.story, author=self.author)
+        StoryLine.objects.create(
+            content='Where this flower blooms.', story=self.story, author=self.author
+        )
+        self.empty_story = Story.objects.create(title='Cherry Bomb', author=self.author)
+
+        self.client.force_authenticate(user=self.admin)
+
+    def get_records(self, **params):
+        response = self.client.get(reverse(self.view_name), params)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_export_with_non_admin_user(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse(self.view_name))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_stories_in_chunks(self):
+        records = self.get_records(chunk_size=1)
+
+        self.assertEqual([record['id'] for record in records], [self.story.id, self.empty_story.id])
+        self.assertEqual(records[0]['author'], 'Tyler')
+        self.assertEqual(
+            [storyline['content'] for storyline in records[0]['storylines']],
+            ['Foreword.', 'Where this flower blooms.']
+        )
+        self.assertEqual(records[1]['storylines'], [])
+
+    def test_export_since(self):
+        since = timezone.now()
+        StoryLine.objects.create(
+            content='See you again.', story=self.empty_story, author=self.author
+        )
+
+        records = self.get_records(since=since.isoformat())
+
+        self.assertEqual([record['id'] for record in records], [self.empty_story.id])
+
+    def test_export_with_invalid_since(self):
+        response = self.client.get(reverse(self.view_name), {'since': 'yesterday'})
+
+        self.assertEqual(response.data['message'], 'Invalid since or chunk size.')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_queries_per_chunk(self):
+        with self.assertNumQueries(5):
+            self.get_records(chunk_size=1)
+
+    def test_export_can_be_imported(self):
+        stdout = StringIO()
+        call_command('export_stories', stdout=stdout)
+
+        Story.objects.all().delete()
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as ndjson:
+            ndjson.write(stdout.getvalue())
+        self.addCleanup(os.remove, ndjson.name)
+
+        call_command('import_stories', ndjson.name, stdout=StringIO())
+
+        self.assertEqual(Story.objects.get(title='Scum Fuck Flower Boy').storyline_count, 2)
+        self.assertTrue(Story.objects.filter(title='Cherry Bomb').exists())
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='Vince', password='bigfishtheory')
+        self.author = Author.objects.create(user=self.user)
+        self.reader = User.objects.create(username='Staples', password='summertime06')
+        Author.objects.create(user=self.reader)
+
+        self.story = Story.objects.create(title='Norf Norf', author=self.author)
+        StoryLine.objects.create(content='Bagbak.', story=self.story, author=self.author)
+
+        self.detail_url = reverse('stories:story-detail', kwargs={'pk': self.story.id})
+        self.storylines_url = reverse('stories:storylines-list', kwargs={'story_pk': self.story.id})
+        self.trending_url = reverse('stories:category-list', kwargs={'category': 'trending'})
+
+        self.client.force_authenticate(user=self.reader)
+
+    def test_story_detail_not_modified(self):
+        response = self.client.get(self.detail_url)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_story_detail_ignores_modified_since(self):
+        response = self.client.get(self.detail_url)
+
+        self.assertNotIn('Last-Modified', response)
+
+        StoryLine.objects.create(content='Bagbak!', story=self.story, author=self.author)
+
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=http_date())
+
+        self.assertEqual(len(response.data['storyline_set']), 2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_detail_etag_changes_on_new_story_line(self):
+        response = self.client.get(self.detail_url)
+
+        StoryLine.objects.create(content='Bagbak!', story=self.story, author=self.author)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(len(response.data['storyline_set']), 2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_detail_etag_changes_on_vote(self):
+        response = self.client.get(self.detail_url)
+
+        self.client.put(reverse('stories:vote', kwargs={'pk': self.story.id}))
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertTrue(response.data['have_voted'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_detail_etag_is_per_user(self):
+        response = self.client.get(self.detail_url)
+
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_lines_not_modified_until_deletion(self):
+        response = self.client.get(self.storylines_url)
+        etag = response['ETag']
+
+        response = self.client.get(self.storylines_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        StoryLine.objects.filter(story=self.story).delete()
+
+        response = self.client.get(self.storylines_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.data, [])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_category_list_not_modified_until_vote(self):
+        response = self.client.get(self.trending_url)
+        etag = response['ETag']
+
+        response = self.client.get(self.trending_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put(reverse('stories:vote', kwargs={'pk': self.story.id}))
+
+        response = self.client.get(self.trending_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.data['results'][0]['num_vote_up'], 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_story_version_changes_on_profile_edit(self):
+        version = Story.objects.get(id=self.story.id).version
+
+        self.author.profile_image = 'http://example.com/avatar.png'
+        self.author.save()
+
+        self.assertEqual(Story.objects.get(id=self.story.id).version, version + 1)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='Cudi', password='pursuitofhappiness')
+        self.author = Author.objects.create(user=self.user)
+        self.story = Story.objects.create(title='Day n Nite', author=self.author)
+        StoryLine.objects.create(content='The lonely stoner.', story=self.story, author=self.author)
+
+        self.detail_url = reverse('stories:story-detail', kwargs={'pk': self.story.id})
+
+        self.client.force_authenticate(user=self.user)
+
+    def test_story_detail_is_served_from_cache(self):
+        self.client.get(self.detail_url)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.detail_url)
+
+        self.assertEqual(len(response.data['storyline_set']), 1)
+        self.assertFalse(response.data['have_voted'])
+
+    def test_story_detail_cache_is_invalidated_by_new_story_line(self):
+        self.client.get(self.detail_url)
+
+        StoryLine.objects.create(content='Free my soul.', story=self.story, author=self.author)
+
+        response = self.client.get(self.detail_url)
+
+        self.assertEqual(len(response.data['storyline_set']), 2)
+
+    def test_story_detail_cache_is_invalidated_by_vote(self):
+        self.client.get(self.detail_url)
+
+        self.client.put(reverse('stories:vote', kwargs={'pk': self.story.id}))
+
+        response = self.client.get(self.detail_url)
+
+        self.assertEqual(response.data['num_vote_up'], 1)
+        self.assertTrue(response.data['have_voted'])
+
+    def test_story_lines_cache_is_invalidated_by_profile_edit(self):
+        url = reverse('stories:storylines-list', kwargs={'story_pk': self.story.id})
+        self.client.get(url)
+
+        self.client.put(
+            reverse('users:profile', kwargs={'user_pk': self.user.id}),
+            {'profile_image': 'http://example.com/avatar.png'}
+        )
+
+        response = self.client.get(url)
+
+        self.assertEqual(
+            response.data[0]['author']['profile_image'], 'http://example.com/avatar.png'
+        )
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        cache = LRUCache('lru-test', {'OPTIONS': {'MAX_ENTRIES': 2}})
+
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+        cache.set('third', 3)
+
+        self.assertEqual(cache.get('first'), 1)
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(cache.get('third'), 3)
+
+    def test_lru_cache_expires_entries(self):
+        cache = LRUCache('lru-test-expiry', {})
+
+        cache.set('key', 'value', timeout=-1)
+
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'value'))
+        self.assertFalse(cache.add('key', 'other'))
+
+    def test_file_based_cache_adds_a_key_once(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        caches = [FileBasedCache(location, {}) for _ in range(8)]
+        barrier = threading.Barrier(len(caches))
+        added = []
+
+        def add(cache, number):
+            barrier.wait()
+            if cache.add('key', number, timeout=60):
+                added.append(number)
+
+        threads = [
+            threading.Thread(target=add, args=(cache, number))
+            for number, cache in enumerate(caches)
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(added), 1)
+        self.assertEqual(caches[0].get('key'), added[0])
+
+        caches[0].set('key', 'expired', timeout=-1)
+
+        self.assertTrue(caches[1].add('key', 'value'))
+        self.assertFalse(caches[2].add('key', 'other'))
+        self.assertEqual(os.listdir(location), [os.path.basename(caches[0]._key_to_file('key'))])
+
+    def test_single_flight_computes_once(self):
+        cache = SingleFlightCache('responses')
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+
+        def read():
+            results.append(cache.get_or_set('single-flight', compute))
+
+        threads = [threading.Thread(target=read) for _ in range(5)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (4, 1))
+
+    @override_settings(RESPONSE_CACHE_LOCK_TIMEOUT=0.1)
+    def test_single_flight_recomputes_after_lock_timeout(self):
+        cache = SingleFlightCache('responses')
+        cache.cache.add('stale-lock:lock', True)
+
+        self.assertEqual(cache.get_or_set('stale-lock', lambda: 'value'), 'value')
+        self.assertEqual(cache.cache.get('stale-lock'), 'value')
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='Tyler', password='flowerboy')
+        self.author = Author.objects.create(user=self.user)
+        self.story = Story.objects.create(title='See You Again', author=self.author)
+
+        self.detail_url = reverse('stories:story-detail', kwargs={'pk': self.story.id})
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client.force_authenticate(user=self.user)
+
+    def get_metrics(self):
+        return self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+
+    def test_server_timing_header(self):
+        response = self.client.get(self.detail_url)
+
+        names = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+
+        self.assertEqual(names, ['auth', 'perm', 'render', 'serialize', 'db', 'total'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_metrics_require_token(self):
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            non_ascii_response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer sécret'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(non_ascii_response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_count_requests_votes_and_storylines(self):
+        before = self.get_metrics()
+
+        self.client.get(self.detail_url)
+        self.client.put(reverse('stories:vote', kwargs={'pk': self.story.id}))
+        self.client.post(
+            reverse('stories:storylines-list', kwargs={'story_pk': self.story.id}),
+            {'content': 'Where this flower blooms.'}
+        )
+
+        after = self.get_metrics()
+
+        def get_value(text, line):
+            for sample in text.splitlines():
+                if sample.startswith(line + ' '):
+                    return float(sample.split()[-1])
+
+            return 0
+
+        for line, increase in (
+            ('tarina_requests_total{route="stories:story-detail",method="GET",status="200"}', 1),
+            ('tarina_request_duration_seconds_count{route="stories:story-detail"}', 1),
+            ('tarina_votes_total{action="vote"}', 1),
+            ('tarina_storylines_created_total', 1),
+            ('tarina_cache_misses_total{cache="responses"}', 1),
+        ):
+            self.assertEqual(get_value(after, line) - get_value(before, line), increase, line)
+
+        self.assertIn('# TYPE tarina_request_duration_seconds histogram', after)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_add_up_workers(self):
+        before = self.get_metrics()
+
+        with open(os.path.join(self.metrics_dir, '1-worker.json'), 'w') as snapshot_file:
+            json.dump({
+                'tarina_storylines_created_total': [[[], 2]],
+                'tarina_request_duration_seconds': [
+                    [['other:route'], [[1] + [0] * len(metrics.DURATION_BUCKETS), 0.5]]
+                ],
+            }, snapshot_file)
+
+        with open(os.path.join(self.metrics_dir, '2-worker.json'), 'w') as snapshot_file:
+            snapshot_file.write('{"tarina_storylines')
+
+        after = self.get_metrics()
+
+        def get_value(text, line):
+            for sample in text.splitlines():
+                if sample.startswith(line + ' '):
+                    return float(sample.split()[-1])
+
+            return 0
+
+        self.assertEqual(
+            get_value(after, 'tarina_storylines_created_total') -
+            get_value(before, 'tarina_storylines_created_total'),
+            2
+        )
+        self.assertIn('tarina_request_duration_seconds_count{route="other:route"} 1', after)
+        self.assertIn('tarina_request_duration_seconds_sum{route="other:route"} 0.5', after)
+        self.assertEqual(
+            [name for name in os.listdir(self.metrics_dir) if name.startswith(str(os.getpid()))],
+            [os.path.basename(metrics.get_snapshot_path())]
+        )
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram('latency', 'Latency.', ('route',), buckets=(0.1, 1))
+
+        histogram.observe(0.05, route='a')
+        histogram.observe(0.5, route='a')
+        histogram.observe(5, route='a')
+
+        self.assertEqual(list(histogram.collect()), [
+            'latency_bucket{route="a",le="0.1"} 1',
+            'latency_bucket{route="a",le="1"} 2',
+            'latency_bucket{route="a",le="+Inf"} 3',
+            'latency_sum{route="a"} 5.55',
+            'latency_count{route="a"} 3',
+        ])
+
+
+class SlowQueryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='Frank', password='blonde')
+        self.author = Author.objects.create(user=self.user)
+        self.story = Story.objects.create(title='Nikes', author=self.author)
+        StoryLine.objects.create(
+            content='Said he needed some Nikes.', story=self.story, author=self.author
+        )
+
+        self.client.force_authenticate(user=self.user)
+
+    def get_slow_queries(self, url):
+        with self.assertLogs('tarina.slow_queries', 'WARNING') as logs:
+            self.client.get(url)
+
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_EXPLAIN_RATE=1)
+    def test_slow_queries_are_logged_with_view_stack_and_plan(self):
+        records = self.get_slow_queries(
+            reverse('stories:storylines-list', kwargs={'story_pk': self.story.id})
+        )
+        record = next(record for record in records if 'stories_storyline' in record['sql'])
+
+        self.assertEqual(record['view'], 'stories:storylines-list')
+        self.assertEqual(record['params'], [repr(self.story.id)])
+        self.assertTrue(any(frame.startswith('stories/views.py') for frame in record['stack']))
+        self.assertTrue(any('stories_storyline' in line for line in record['plan']))
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_EXPLAIN_RATE=0)
+    def test_credential_params_are_redacted(self):
+        token = Token.objects.create(user=self.user)
+        self.client.force_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token.key))
+
+        records = self.get_slow_queries(
+            reverse('stories:story-detail', kwargs={'pk': self.story.id})
+        )
+        record = next(record for record in records if 'authtoken_token' in record['sql'])
+
+        self.assertEqual(record['params'], '<redacted>')
+        self.assertNotIn(token.key, json.dumps(records))
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_EXPLAIN_RATE=0)
+    def test_slow_queries_are_explained_by_sample(self):
+        records = self.get_slow_queries(
+            reverse('stories:story-detail', kwargs={'pk': self.story.id})
+        )
+
+        self.assertTrue(records)
+        self.assertTrue(all(record['plan'] is None for record in records))
+
+    def test_fast_queries_are_not_logged(self):
+        with mock.patch('tarina.slow_queries.log_slow_query') as log_slow_query:
+            self.client.get(reverse('stories:story-detail', kwargs={'pk': self.story.id}))
+
+        log_slow_query.assert_not_called()
+
+    def test_failed_explain_keeps_the_transaction_usable(self):
+        plan = explain(connection, 'SELECT * FROM missing_table', [])
+
+        self.assertTrue(plan[0].startswith('EXPLAIN failed: '))
+        self.assertEqual(Story.objects.count(), 1)
+
+    def test_slow_query_logs_are_written_per_process(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        handler = ProcessRotatingFileHandler(os.path.join(log_dir, 'slow.log'), delay=True)
+        record = logging.makeLogRecord({'msg': '{}'})
+
+        handler.handle(record)
+
+        with mock.patch('tarina.slow_queries.os.getpid', return_value=1):
+            handler.handle(record)
+
+        handler.close()
+
+        self.assertEqual(sorted(os.listdir(log_dir)), sorted([
+            'slow.{}.log'.format(os.getpid()), 'slow.1.log'
+        ]))
+
+    def test_slow_queries_admin_page(self):
+        staff = User.objects.create(username='Ocean', is_staff=True)
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+
+        with open(os.path.join(log_dir, 'slow.10.log'), 'w') as log:
+            log.write(json.dumps({
+                'time': '2017-05-01T10:00:00', 'sql': 'SELECT 1', 'duration_ms': 120.5,
+                'plan': None
+            }) + '\n')
+            log.write('not json\n')
+            log.write(json.dumps({
+                'time': '2017-05-01T12:00:00', 'sql': 'SELECT 3', 'duration_ms': 300,
+                'plan': None
+            }) + '\n')
+
+        with open(os.path.join(log_dir, 'slow.11.log'), 'w') as log:
+            log.write(json.dumps({
+                'time': '2017-05-01T11:00:00', 'sql': 'SELECT 2', 'duration_ms': 250,
+                'plan': ['SCAN']
+            }) + '\n')
+
+        with override_settings(
+            SLOW_QUERY_LOG=os.path.join(log_dir, 'slow.log'),
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+        ):
+            self.assertEqual(self.client.get(reverse('slow-queries')).status_code, 302)
+
+            self.client.force_login(staff)
+            response = self.client.get(reverse('slow-queries'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([record['sql'] for record in response.context['records']], [
+            'SELECT 3', 'SELECT 2', 'SELECT 1'
+        ])
+        self.assertContains(response, 'SCAN')
+
+        with override_settings(
+            SLOW_QUERY_LOG=os.path.join(log_dir, 'slow.log'),
+            SLOW_QUERY_THRESHOLD=None,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+        ):
+            response = self.client.get(reverse('slow-queries'))
+
+        self.assertContains(response, 'Slow query logging is disabled')
+
+
+class ProfilerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='Kanye', password='graduation', is_staff=True)
+        self.author = Author.objects.create(user=self.user)
+        self.story = Story.objects.create(title='Stronger', author=self.author)
+
+        self.detail_url = reverse('stories:story-detail', kwargs={'pk': self.story.id})
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+
+        settings_override = override_settings(
+            PROFILER_TOKEN='secret',
+            PROFILER_DIR=self.profile_dir,
+            PROFILER_SAMPLE_INTERVAL=0.0001
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client.force_authenticate(user=self.user)
+
+    def get_profile_files(self):
+        return sorted(
+            name for name in os.listdir(self.profile_dir)
+            if name.endswith(('.pstats', '.collapsed'))
+        )
+
+    def get_download_url(self, profile_id, extension):
+        return reverse('profile-download', kwargs={
+            'profile_id': profile_id, 'extension': extension
+        })
+
+    def test_request_is_not_profiled_without_token(self):
+        with mock.patch('cProfile.Profile') as profile:
+            response = self.client.get(self.detail_url)
+            wrong_token_response = self.client.get(self.detail_url, HTTP_X_PROFILE='wrong')
+        non_ascii_response = self.client.get(self.detail_url, {'profile': 'sécret'})
+
+        profile.assert_not_called()
+        self.assertNotIn('X-Profile', response)
+        self.assertNotIn('X-Profile', wrong_token_response)
+        self.assertEqual(non_ascii_response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile', non_ascii_response)
+
+    def test_profiled_request_can_be_downloaded(self):
+        response = self.client.get(self.detail_url, HTTP_X_PROFILE='secret')
+
+        profile_id = response['X-Profile']
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stats = pstats.Stats(os.path.join(self.profile_dir, profile_id + '.pstats'))
+        self.assertTrue(any(
+            function_name == 'retrieve' for _, _, function_name in stats.stats
+        ))
+
+        response = self.client.get(self.get_download_url(profile_id, 'collapsed'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        for line in b''.join(response.streaming_content).decode().splitlines():
+            self.assertRegex(line, r'^.+ \d+$')
+
+    def test_profile_query_flag(self):
+        response = self.client.get(self.detail_url, {'profile': 'secret'})
+
+        self.assertTrue(os.path.exists(
+            os.path.join(self.profile_dir, response['X-Profile'] + '.collapsed')
+        ))
+
+    @override_settings(PROFILER_RATE_LIMIT=1)
+    def test_profiles_are_rate_limited(self):
+        self.client.get(self.detail_url, HTTP_X_PROFILE='secret')
+        response = self.client.get(self.detail_url, HTTP_X_PROFILE='secret')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Profile'], 'rate-limited')
+        self.assertEqual(len(self.get_profile_files()), 2)
+
+    @override_settings(PROFILER_RATE_LIMIT=1)
+    def test_rate_limit_is_shared_through_profile_dir(self):
+        os.makedirs(os.path.join(self.profile_dir, 'slots'))
+        window = int(time.time() // settings.PROFILER_RATE_WINDOW)
+        open(os.path.join(self.profile_dir, 'slots', '{}-0'.format(window)), 'w').close()
+
+        response = self.client.get(self.detail_url, HTTP_X_PROFILE='secret')
+
+        self.assertEqual(response['X-Profile'], 'rate-limited')
+
+    @override_settings(PROFILER_MAX_PROFILES=1)
+    def test_old_profiles_are_removed(self):
+        self.client.get(self.detail_url, HTTP_X_PROFILE='secret')
+        time.sleep(0.01)
+        response = self.client.get(self.detail_url, HTTP_X_PROFILE='secret')
+
+        self.assertEqual(self.get_profile_files(), [
+            response['X-Profile'] + '.collapsed', response['X-Profile'] + '.pstats'
+        ])
+
+    def test_profile_download_requires_admin(self):
+        profile_id = self.client.get(self.detail_url, HTTP_X_PROFILE='secret')['X-Profile']
+
+        self.client.force_authenticate(user=User.objects.create(username='Dummy'))
+        response = self.client.get(self.get_download_url(profile_id, 'pstats'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_download_unknown_profile(self):
+        response = self.client.get(self.get_download_url('0' * 32, 'pstats'))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RoomClient:
+    def __init__(self, path, ticket=''):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {
+            'type': 'websocket',
+            'path': path,
+            'query_string': 'ticket={}'.format(ticket).encode()
+        }
+
+        self.task = asyncio.ensure_future(
+            asgi.application(scope, self.incoming.get, self.outgoing.put)
+        )
+
+    async def connect(self):
+        await self.incoming.put({'type': 'websocket.connect'})
+
+        return await self.receive()
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), 5)
+
+    async def receive_json(self):
+        return json.loads((await self.receive())['text'])
+
+    async def send_json(self, data):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(STORY_ROOMS_POLL_INTERVAL=0.05)
+class StoryRoomTests(APITransactionTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+        self.user = User.objects.create(username='Jhene', password='souled out')
+        self.author = Author.objects.create(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.other_user = User.objects.create(username='Aiko', password='trip')
+        self.other_author = Author.objects.create(user=self.other_user)
+        self.other_token = Token.objects.create(user=self.other_user)
+
+        self.story = Story.objects.create(title='Sail Out', author=self.author)
+        self.path = '/ws/story/{}/'.format(self.story.id)
+
+    def run_async(self, coroutine):
+        self.loop.run_until_complete(coroutine)
+        self.loop.run_until_complete(asyncio.gather(*asyncio.Task.all_tasks(self.loop)))
+
+        self.assertEqual(StoryRoom.rooms, {})
+
+    def get_ticket(self, token, story_id=None):
+        return issue_stream_ticket(token, story_id or self.story.id)
+
+    def test_room_with_invalid_ticket(self):
+        async def scenario():
+            client = RoomClient(self.path, 'invalid')
+
+            self.assertEqual(await client.connect(), {'type': 'websocket.accept'})
+            self.assertEqual(await client.receive(), {'type': 'websocket.close', 'code': 4401})
+
+        self.run_async(scenario())
+
+    def test_room_with_invalid_story_id(self):
+        async def scenario():
+            story_id = self.story.id + 1
+            client = RoomClient(
+                '/ws/story/{}/'.format(story_id), self.get_ticket(self.token, story_id)
+            )
+
+            await client.connect()
+            self.assertEqual(await client.receive(), {'type': 'websocket.close', 'code': 4404})
+
+        self.run_async(scenario())
+
+    def test_room_presence_and_typing(self):
+        async def scenario():
+            client = RoomClient(self.path, self.get_ticket(self.token))
+            other_client = RoomClient(self.path, self.get_ticket(self.other_token))
+            member = {'id': self.user.id, 'username': 'Jhene'}
+            other_member = {'id': self.other_user.id, 'username': 'Aiko'}
+
+            await client.connect()
+            self.assertEqual(
+                await client.receive_json(),
+                {'type': 'presence', 'members': [member], 'typing': []}
+            )
+
+            await other_client.connect()
+            self.assertEqual(
+                await other_client.receive_json(),
+                {'type': 'presence', 'members': [member, other_member], 'typing': []}
+            )
+            self.assertEqual(
+                await client.receive_json(), {'type': 'joined', 'member': other_member}
+            )
+
+            await other_client.send_json({'type': 'typing', 'typing': True})
+            typing = {'type': 'typing', 'member': other_member, 'typing': True}
+            self.assertEqual(await client.receive_json(), typing)
+            self.assertEqual(await other_client.receive_json(), typing)
+
+            await other_client.disconnect()
+            self.assertEqual(await client.receive_json(), {'type': 'left', 'member': other_member})
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    @override_settings(STORY_ROOMS_TYPING_TIMEOUT=0)
+    def test_room_typing_expires(self):
+        async def scenario():
+            client = RoomClient(self.path, self.get_ticket(self.token))
+
+            await client.connect()
+            await client.receive_json()
+            await client.send_json({'type': 'typing', 'typing': True})
+
+            self.assertTrue((await client.receive_json())['typing'])
+            self.assertEqual(
+                await client.receive_json(),
+                {'type': 'typing', 'member': {'id': self.user.id}, 'typing': False}
+            )
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    def test_room_story_line_posting(self):
+        async def scenario():
+            client = RoomClient(self.path, self.get_ticket(self.token))
+            other_client = RoomClient(self.path, self.get_ticket(self.other_token))
+
+            await client.connect()
+            await client.receive_json()
+            await other_client.connect()
+            await other_client.receive_json()
+            await client.receive_json()
+
+            await other_client.send_json({'type': 'storyline', 'content': 'Sativa.'})
+            posted = await other_client.receive_json()
+            created = await client.receive_json()
+
+            self.assertEqual(posted['type'], 'storyline-posted')
+            self.assertEqual(posted['storyline']['content'], 'Sativa.')
+            self.assertEqual(created, {
+                'type': 'storyline-created',
+                'storyline': posted['storyline'],
+                'cursor': '{}.0'.format(posted['storyline']['id'])
+            })
+            self.assertEqual(await other_client.receive_json(), created)
+
+            await client.send_json({'type': 'storyline', 'content': '  SATIVA. '})
+            self.assertEqual(await client.receive_json(), {
+                'type': 'error',
+                'detail': {'content': ['This story line is already part of the story.']}
+            })
+
+            await other_client.send_json({'type': 'storyline', 'content': 'Triggered.'})
+            self.assertEqual(await other_client.receive_json(), {
+                'type': 'error', 'detail': IsNotLastStoryLineAuthor().message
+            })
+
+            await client.send_json({'type': 'dance'})
+            self.assertEqual(
+                await client.receive_json(), {'type': 'error', 'message': 'Unknown message type.'}
+            )
+
+            await client.disconnect()
+            await other_client.disconnect()
+
+        self.run_async(scenario())
+        self.assertEqual(Story.objects.get(id=self.story.id).storyline_count, 1)
+
+    def test_room_closes_when_its_story_is_deleted(self):
+        async def scenario():
+            client = RoomClient(self.path, self.get_ticket(self.token))
+
+            await client.connect()
+            await client.receive_json()
+
+            with mock.patch('stories.rooms.post_storyline', side_effect=Story.DoesNotExist):
+                await client.send_json({'type': 'storyline', 'content': 'Comfortable.'})
+
+                self.assertEqual(
+                    await client.receive(), {'type': 'websocket.close', 'code': 4404}
+                )
+
+            await asyncio.wait_for(client.task, 5)
+
+        self.run_async(scenario())
+
+    def test_room_reports_database_errors(self):
+        async def scenario():
+            client = RoomClient(self.path, self.get_ticket(self.token))
+
+            await client.connect()
+            await client.receive_json()
+
+            with mock.patch('stories.rooms.post_storyline', side_effect=OperationalError):
+                with self.assertLogs('stories.rooms', logging.ERROR):
+                    await client.send_json({'type': 'storyline', 'content': 'Comfortable.'})
+
+                    self.assertEqual(await client.receive_json(), {
+                        'type': 'error', 'message': 'Could not post the story line.'
+                    })
+
+            await client.send_json({'type': 'storyline', 'content': 'Comfortable.'})
+            self.assertEqual((await client.receive_json())['type'], 'storyline-posted')
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    @override_settings(STORY_ROOMS_POLL_INTERVAL=60)
+    def test_room_broadcasts_story_lines_changed_over_http(self):
+        async def scenario():
+            client = RoomClient(self.path, self.get_ticket(self.token))
+
+            await client.connect()
+            await client.receive_json()
+
+            self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.other_token.key))
+            response = self.client.post(
+                reverse('stories:storylines-list', kwargs={'story_pk': self.story.id}),
+                {'content': 'Bed Peace.'}
+            )
+            StoryRoom.rooms[self.story.id].changed.set()
+
+            created = await client.receive_json()
+            del response.data['story_id']
+
+            self.assertEqual(created, {
+                'type': 'storyline-created',
+                'storyline': response.data,
+                'cursor': '{}.0'.format(response.data['id'])
+            })
+
+            self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+            self.client.delete(reverse('stories:storylines-detail', kwargs={
+                'story_pk': self.story.id, 'pk': response.data['id']
+            }))
+            StoryRoom.rooms[self.story.id].changed.set()
+
+            deletion = DeletedStoryLine.objects.get(story=self.story)
+
+            self.assertEqual(await client.receive_json(), {
+                'type': 'storyline-deleted',
+                'id': created['storyline']['id'],
+                'cursor': '{}.{}'.format(created['storyline']['id'], deletion.id)
+            })
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    def test_channel_layer_resets_slow_clients(self):
+        async def scenario():
+            layer = InMemoryChannelLayer(capacity=2)
+            channel = await layer.new_channel()
+
+            for number in range(3):
+                await layer.send(channel, {'type': 'typing', 'number': number})
+
+            self.assertEqual(await layer.receive(channel), {'type': 'reset'})
+
+        self.run_async(scenario())
+
+
+class StreamClient:
+    def __init__(self, path, ticket='', method='GET', headers=(), query=''):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': 'ticket={}{}'.format(ticket, query).encode(),
+            'headers': list(headers),
+        }
+
+        self.task = asyncio.ensure_future(
+            asgi.application(scope, self.incoming.get, self.outgoing.put)
+        )
+        self.buffer = ''
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), 5)
+
+    async def receive_event(self):
+        while '\n\n' not in self.buffer:
+            self.buffer += (await self.receive())['body'].decode()
+
+        event, self.buffer = self.buffer.split('\n\n', 1)
+
+        return event
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(STORY_ROOMS_POLL_INTERVAL=60)
+class StoryEventsTests(APITransactionTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+        self.user = User.objects.create(
+            username='Cudder',
+            password='dayandnight',
+            first_name='Scott',
+            last_name='Mescudi'
+        )
+        self.author = Author.objects.create(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.story = Story.objects.create(title='Man on the moon', author=self.author)
+        self.storyline = StoryLine.objects.create(
+            content='Soundtrack 2 my life.', story=self.story, author=self.author
+        )
+        self.path = '/api/story/{}/events/'.format(self.story.id)
+
+    def run_async(self, coroutine):
+        self.loop.run_until_complete(coroutine)
+        self.loop.run_until_complete(asyncio.gather(*asyncio.Task.all_tasks(self.loop)))
+
+        self.assertEqual(StoryRoom.rooms, {})
+
+    def get_ticket(self, story_id=None):
+        return issue_stream_ticket(self.token, story_id or self.story.id)
+
+    async def open_stream(self, client):
+        start = await client.receive()
+
+        self.assertEqual(start['status'], status.HTTP_200_OK)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertIn((b'access-control-allow-origin', b'*'), start['headers'])
+        self.assertEqual(await client.receive_event(), 'retry: 3000')
+
+    def test_story_ticket(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+
+        response = self.client.post(reverse('stories:ticket', kwargs={'pk': self.story.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            authenticate_stream_ticket(response.data['ticket'], self.story.id),
+            (self.user, self.token)
+        )
+
+    def test_story_ticket_with_unauthorized_user(self):
+        response = self.client.post(reverse('stories:ticket', kwargs={'pk': self.story.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_story_ticket_with_invalid_story_id(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+
+        response = self.client.post(reverse('stories:ticket', kwargs={'pk': self.story.id + 1}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ticket_is_single_use(self):
+        ticket = self.get_ticket()
+
+        authenticate_stream_ticket(ticket, self.story.id)
+
+        with self.assertRaises(AuthenticationFailed):
+            authenticate_stream_ticket(ticket, self.story.id)
+
+    def test_ticket_is_bound_to_its_story(self):
+        with self.assertRaises(AuthenticationFailed):
+            authenticate_stream_ticket(self.get_ticket(self.story.id + 1), self.story.id)
+
+    def test_story_events_with_invalid_ticket(self):
+        async def scenario():
+            client = StreamClient(self.path, 'invalid')
+
+            self.assertEqual((await client.receive())['status'], status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(
+                json.loads((await client.receive())['body'].decode()),
+                {'detail': 'Invalid ticket.'}
+            )
+
+        self.run_async(scenario())
+
+    def test_story_events_with_invalid_story_id(self):
+        async def scenario():
+            story_id = self.story.id + 1
+            client = StreamClient(
+                '/api/story/{}/events/'.format(story_id), self.get_ticket(story_id)
+            )
+
+            self.assertEqual((await client.receive())['status'], status.HTTP_404_NOT_FOUND)
+
+        self.run_async(scenario())
+
+    def test_story_events_stream_changes_from_the_database(self):
+        async def scenario():
+            client = StreamClient(self.path, self.get_ticket())
+            await self.open_stream(client)
+
+            storyline = StoryLine.objects.create(
+                content='Day n nite.', story=self.story, author=self.author
+            )
+            votes.cast_vote(self.story, self.user.id)
+            StoryRoom.rooms[self.story.id].changed.set()
+
+            self.assertEqual(
+                await client.receive_event(),
+                'id: {}.0\nevent: storyline-created\ndata: {}'.format(
+                    storyline.id, json.dumps(StoryLineSerializer(storyline).data)
+                )
+            )
+            self.assertEqual(
+                await client.receive_event(), 'event: votes\ndata: {"num_vote_up": 1}'
+            )
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    def test_story_events_replay_after_last_event_id(self):
+        async def scenario():
+            deletion = DeletedStoryLine.objects.create(
+                story=self.story, storyline_id=self.storyline.id
+            )
+            StoryLine.objects.filter(id=self.storyline.id).delete()
+
+            client = StreamClient(
+                self.path, self.get_ticket(), headers=[(b'last-event-id', b'0.0')]
+            )
+            await self.open_stream(client)
+
+            self.assertEqual(
+                await client.receive_event(),
+                'id: 0.{}\nevent: storyline-deleted\ndata: {{"id": {}}}'.format(
+                    deletion.id, self.storyline.id
+                )
+            )
+
+            storyline = StoryLine.objects.create(
+                content='Pursuit of happiness.', story=self.story, author=self.author
+            )
+            StoryRoom.rooms[self.story.id].changed.set()
+
+            self.assertTrue((await client.receive_event()).startswith(
+                'id: {}.{}\nevent: storyline-created'.format(storyline.id, deletion.id)
+            ))
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    def test_story_events_resume_with_query_param(self):
+        async def scenario():
+            storyline = StoryLine.objects.create(
+                content='Pursuit of happiness.', story=self.story, author=self.author
+            )
+            client = StreamClient(
+                self.path, self.get_ticket(), query='&last_event_id={}.0'.format(self.storyline.id)
+            )
+            await self.open_stream(client)
+
+            self.assertTrue((await client.receive_event()).startswith('id: {}.0\n'.format(
+                storyline.id
+            )))
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    def test_story_events_with_unknown_last_event_id(self):
+        async def scenario():
+            client = StreamClient(
+                self.path, self.get_ticket(), headers=[(b'last-event-id', b'deadbeef-1')]
+            )
+            await self.open_stream(client)
+
+            self.assertEqual(await client.receive_event(), 'event: reset\ndata: {}')
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+    @override_settings(STORY_EVENTS_HEARTBEAT=0.01)
+    def test_story_events_keep_alive(self):
+        async def scenario():
+            client = StreamClient(self.path, self.get_ticket())
+            await self.open_stream(client)
+
+            self.assertEqual(await client.receive_event(), ': keep-alive')
+
+            await client.disconnect()
+
+        self.run_async(scenario())
+
+
+class StoryVotingTests(APITestCase):
+    def setUp(self):
+        self.vote_view_name = 'stories:vote'
+        self.unvote_view_name = 'stories:unvote'
+
+        self.user = User.objects.create(
+            username='DAMN',
+            password='straightouttacompton',
+            first_name='Kendrick',
+            last_name='Lamar'
+        )
+        self.blocked_user = User.objects.create(
+            username='Millenium',
+            password='alwaysonyourmind',
+            first_name='Lifeline',
+            last_name='Ontheline'
+        )
+        self.author = Author.objects.create(user=self.user)
+        self.story = Story.objects.create(title='Church', author=self.author)
+        self.story.blacklist.add(self.blocked_user)
+        self.story.save()
+
+    def test_voting_with_unauthorized_user(self):
+        response = self.client.put(
+            reverse(self.vote_view_name, kwargs={'pk': self.story.id})
+        )
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code])
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_voting_when_user_is_blocked(self):
+        self.client.force_authenticate(user=self.blocked_user)
+
+        response = self.client.put(
+            reverse(self.vote_view_name, kwargs={'pk': self.story.id})
+        )
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code]['blacklisted'])
+        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_voting_with_invalid_story_id(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.put(
+            reverse(self.vote_view_name, kwargs={'pk': self.story.id + 1})
+        )
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code])
+        self.assertEqual(status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_voting_with_authorized_user(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.put(
+            reverse(self.vote_view_name, kwargs={'pk': self.story.id})
+        )
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['num_vote_up'], 1)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+
+    def test_unvoting_with_unauthorized_user(self):
+        response = self.client.put(
+            reverse(self.unvote_view_name, kwargs={'pk': self.story.id})
+        )
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code])
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unvoting_with_invalid_story_id(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.put(
+            reverse(self.unvote_view_name, kwargs={'pk': self.story.id + 1})
+        )
 
         status_code = response.status_code
 
@@ -624,10 +2868,72 @@ class StoryVotingTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+    def vote(self, view_name):
+        return self.client.put(reverse(view_name, kwargs={'pk': self.story.id}))
+
+    def test_voting_twice_counts_once(self):
+        self.client.force_authenticate(user=self.user)
+
+        self.vote(self.vote_view_name)
+        response = self.vote(self.vote_view_name)
+
+        self.assertEqual(response.data['num_vote_up'], 1)
+        self.assertEqual(Story.objects.get(id=self.story.id).num_vote_up, 1)
+        self.assertEqual(Story.objects.get(id=self.story.id).vote_score, 1)
+
+    def test_unvoting_without_vote(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.vote(self.unvote_view_name)
+
+        self.assertEqual(response.data['num_vote_up'], 0)
+        self.assertEqual(Story.objects.get(id=self.story.id).num_vote_up, 0)
+
+    def test_voting_does_not_recount_votes(self):
+        self.client.force_authenticate(user=self.user)
+        self.vote(self.vote_view_name)
+        self.vote(self.unvote_view_name)
+
+        with self.assertNumQueries(9):
+            self.vote(self.vote_view_name)
+
+    @override_settings(VOTE_BUFFER_INTERVAL=60)
+    def test_buffered_votes(self):
+        self.client.force_authenticate(user=self.user)
+        self.addCleanup(votes.buffer.flush)
+
+        response = self.vote(self.vote_view_name)
+
+        self.assertEqual(response.data['num_vote_up'], 1)
+        self.assertEqual(Story.objects.get(id=self.story.id).num_vote_up, 0)
+
+        votes.buffer.flush()
+
+        story = Story.objects.get(id=self.story.id)
+
+        self.assertEqual(story.num_vote_up, 1)
+        self.assertGreater(story.trending_score, self.story.trending_score)
+
+    def test_reconcile_votes_command(self):
+        self.client.force_authenticate(user=self.user)
+        self.vote(self.vote_view_name)
+
+        Story.objects.filter(id=self.story.id).update(num_vote_up=5, vote_score=5)
+
+        stdout = StringIO()
+        call_command('reconcile_votes', stdout=stdout)
+
+        story = Story.objects.get(id=self.story.id)
+
+        self.assertEqual((story.num_vote_up, story.vote_score), (1, 1))
+        self.assertIn('1 were reconciled', stdout.getvalue())
+
+
 class UserBlockingTests(APITestCase):
     def setUp(self):
         self.block_view_name = 'stories:block'
         self.unblock_view_name = 'stories:unblock'
+        self.blacklist_view_name = 'stories:blacklist'
 
         self.author_user = User.objects.create(
             username='DAMN',
@@ -875,3 +3181,41 @@ class UserBlockingTests(APITestCase):
             'User {} has been successfully unblocked.'.format(self.user_to_block.username)
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_blacklist_with_author(self):
+        self.client.force_authenticate(user=self.author_user)
+
+        self.story.blacklist.add(self.user_to_block, self.dummy_user)
+
+        response = self.client.get(reverse(self.blacklist_view_name, kwargs={'pk': self.story.id}))
+
+        self.assertEqual(
+            [user['username'] for user in response.data['results']],
+            [self.user_to_block.username, self.dummy_user.username]
+        )
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_blacklist_pagination(self):
+        self.client.force_authenticate(user=self.author_user)
+
+        for number in range(55):
+            self.story.blacklist.add(User.objects.create(username='Blocked #{}'.format(number)))
+
+        response = self.client.get(reverse(self.blacklist_view_name, kwargs={'pk': self.story.id}))
+
+        self.assertEqual(len(response.data['results']), 50)
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_blacklist_when_request_user_is_not_author(self):
+        self.client.force_authenticate(user=self.dummy_user)
+
+        response = self.client.get(reverse(self.blacklist_view_name, kwargs={'pk': self.story.id}))
+
+        status_code = response.status_code
+
+        self.assertEqual(response.data['detail'], HTTP_MESSAGES[status_code]['default'])
+        self.assertEqual(status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,35 @@
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+
+EPOCH = datetime(2017, 1, 1, tzinfo=timezone.utc)
+
+STORY_WEIGHT = 1.0
+STORYLINE_WEIGHT = 0.5
+VOTE_WEIGHT = 1.0
+
+
+def get_activity_score(weight, when):
+    hours = (when - EPOCH).total_seconds() / 3600
+
+    return math.log2(weight) + hours / settings.TRENDING_HALF_LIFE
+
+
+def add_activity(score, activity_score):
+    high, low = max(score, activity_score), min(score, activity_score)
+
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def remove_activity(score, activity_score, minimum):
+    if activity_score >= score:
+        return minimum
+
+    return max(score + math.log2(1 - 2 ** (activity_score - score)), minimum)
+
+
+def get_initial_score():
+    return get_activity_score(STORY_WEIGHT, timezone.now())
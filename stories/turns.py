@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from rest_framework import exceptions
+
+from users.authentication import token_cache
+
+
+TURN_TAKEN_MESSAGE = 'Someone else is posting to this story. Try again in a moment.'
+
+def get_turn_key(story_id):
+    return 'turn:{}'.format(story_id)
+
+
+def claim_turn(story_id, user_id):
+    # Adding a key is atomic in the shared token cache, so one writer of a story at a time
+    # across every worker gets to open a write transaction
+    return token_cache.cache.add(get_turn_key(story_id), user_id, settings.STORY_TURN_TIMEOUT)
+
+
+def release_turn(story_id, user_id):
+    key = get_turn_key(story_id)
+
+    # A turn that expired mid-post may already belong to the next writer
+    if token_cache.cache.get(key) == user_id:
+        token_cache.cache.delete(key)
+
+
+@contextmanager
+def story_turn(story_id, user_id):
+    if not claim_turn(story_id, user_id):
+        raise exceptions.PermissionDenied(TURN_TAKEN_MESSAGE)
+
+    try:
+        yield
+    finally:
+        release_turn(story_id, user_id)
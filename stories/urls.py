@@ -3,9 +3,10 @@ from django.conf.urls import url
 from rest_framework_nested import routers
 
 from .views import (
-    StoriesViewSet, CategoryStoryList, StoryLinesViewSet,
+    StoriesViewSet, StoryImport, StoryExport, StorySearch, CategoryStoryList,
+    StoryLinesViewSet, StoryTicket,
     StoryVote, StoryUnvote,
-    UserBlock, UserUnblock
+    UserBlock, UserUnblock, StoryBlacklist
 )
 
 
@@ -22,15 +23,30 @@ storylines_router.register(
 )
 
 urlpatterns = [
+    url(
+        r'^story/import/$', StoryImport.as_view(), name='import'
+    ),
+    url(
+        r'^story/export/$', StoryExport.as_view(), name='export'
+    ),
+    url(
+        r'^story/search/$', StorySearch.as_view(), name='search'
+    ),
     url(
         r'^story/(?P<category>[a-z]+)/$', CategoryStoryList.as_view(), name='category-list'
     ),
+    url(
+        r'^story/(?P<pk>[0-9]+)/ticket/$', StoryTicket.as_view(), name='ticket'
+    ),
     url(
         r'^story/(?P<pk>[0-9]+)/vote/$', StoryVote.as_view(), name='vote'
     ),
     url(
         r'^story/(?P<pk>[0-9]+)/unvote/$', StoryUnvote.as_view(), name='unvote'
     ),
+    url(
+        r'^story/(?P<pk>[0-9]+)/blacklist/$', StoryBlacklist.as_view(), name='blacklist'
+    ),
     url(
         r'^story/(?P<pk>[0-9]+)/block/(?P<user_pk>[0-9]+)/$', UserBlock.as_view(), name='block'
     ),
@@ -1,21 +1,37 @@
+from django.db import transaction
+from django.db.models import Max
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 
 from rest_framework import generics, viewsets, status
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
-
-from .serializers import StorySerializer, StoryLineSerializer
-from .models import Story, StoryLine
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+
+from tarina.cache import response_cache
+from tarina.conditional import ConditionalGetMixin, get_list_etag
+from tarina.queries import QueryBudgetMixin
+from users.authentication import CachedTokenAuthentication, issue_stream_ticket
+from users.serializers import UserReadSerializer
+from .serializers import (
+    StorySerializer, StorySummarySerializer, StorySearchSerializer, StoryLineSerializer
+)
+from .models import Story, StoryLine, DeletedStoryLine
+from .bulk import StoryImporter, export_stories, parse_since
+from . import search, votes
+from .pagination import (
+    StoryCursorPagination, TrendingStoryCursorPagination, BlacklistCursorPagination,
+    SearchPagination
+)
 from .permissions import (
     IsAuthor, IsNotBlacklisted,
     IsNotLastStoryLineAuthor, IsNotFullOfStoryLines
 )
+from .turns import story_turn
 
 
-class StoriesViewSet(viewsets.ModelViewSet):
-    authentication_classes = (TokenAuthentication,)
+class StoriesViewSet(QueryBudgetMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes_by_action = {
         'list': (IsAuthenticated,),
         'retrieve': (IsAuthenticated,),
@@ -24,6 +40,8 @@ class StoriesViewSet(viewsets.ModelViewSet):
     }
     serializer_class = StorySerializer
     queryset = Story.objects.all()
+    pagination_class = StoryCursorPagination
+    query_budget = {'list': 4, 'retrieve': 5, 'create': 13}
 
     def get_permissions(self):
         return [
@@ -32,22 +50,57 @@ class StoriesViewSet(viewsets.ModelViewSet):
             in self.permission_classes_by_action[self.action]
         ]
 
+    def list(self, request):
+        stories = self.paginate_queryset(Story.objects.select_related('author__user'))
+
+        not_modified = self.get_not_modified_response(
+            request,
+            etag=get_list_etag(
+                'stories', stories,
+                self.paginator.get_next_link(), self.paginator.get_previous_link()
+            )
+        )
+        if not_modified:
+            return not_modified
+
+        data = response_cache.get_or_set(
+            self.etag, lambda: StorySummarySerializer(stories, many=True).data
+        )
+
+        return self.get_paginated_response(data)
+
+    def get_story_data(self, story):
+        # Taken before the lines are loaded, so polling from the cursor can only repeat a deletion
+        last_deletion_id = DeletedStoryLine.objects.filter(story=story).aggregate(
+            last=Max('id')
+        )['last'] or 0
+        story.load_storylines()
+
+        data = self.serializer_class(story).data
+        data['storylines_cursor'] = '{}.{}'.format(
+            max((storyline.id for storyline in story.storyline_set.all()), default=0),
+            last_deletion_id
+        )
+
+        return data
+
     def retrieve(self, request, pk=None):
-        story = get_object_or_404(Story, id=pk)
+        story = get_object_or_404(Story.objects.select_related('author__user'), id=pk)
         self.check_object_permissions(request, story)
 
-        serializer = self.serializer_class(story)
-
-        headers = self.get_success_headers(serializer)
+        not_modified = self.get_not_modified_response(
+            request,
+            etag='story-{}-{}'.format(story.revision, request.user.id)
+        )
+        if not_modified:
+            return not_modified
 
-        resp_data = serializer.data
+        resp_data = dict(response_cache.get_or_set(
+            'story-{}'.format(story.revision), lambda: self.get_story_data(story)
+        ))
         resp_data['have_voted'] = story.votes.exists(request.user.pk)
 
-        return Response(
-            resp_data,
-            status=status.HTTP_200_OK,
-            headers=headers
-        )
+        return Response(resp_data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         context = {'request': request}
@@ -58,14 +111,19 @@ class StoriesViewSet(viewsets.ModelViewSet):
 
         headers = self.get_success_headers(serializer)
 
+        if 'opening_line' in serializer.validated_data:
+            resp_data = StorySummarySerializer(serializer.instance).data
+        else:
+            resp_data = serializer.data
+
         return Response(
-            serializer.data,
+            resp_data,
             status=status.HTTP_201_CREATED,
             headers=headers
         )
 
     def destroy(self, request, pk=None):
-        story = get_object_or_404(Story, id=pk)
+        story = get_object_or_404(Story.objects.select_related('author'), id=pk)
         self.check_object_permissions(request, story)
 
         story.delete()
@@ -76,15 +134,104 @@ class StoriesViewSet(viewsets.ModelViewSet):
         )
 
 
-class CategoryStoryList(generics.ListAPIView):
-    authentication_classes = (TokenAuthentication,)
+class StoryImport(generics.GenericAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated, IsAdminUser)
+
+    def post(self, request):
+        if request.stream is None:
+            return Response(
+                {'message': 'Expected NDJSON stories in the request body.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            batch_size = int(request.query_params.get('batch_size', 500))
+        except ValueError:
+            batch_size = 0
+
+        if batch_size < 1:
+            return Response(
+                {'message': 'Invalid batch size.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        report = StoryImporter(batch_size=batch_size).run(request.stream)
+
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class StoryExport(generics.GenericAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated, IsAdminUser)
+
+    def get(self, request):
+        since = request.query_params.get('since')
+
+        try:
+            since = parse_since(since) if since is not None else None
+            chunk_size = int(request.query_params.get('chunk_size', 500))
+        except ValueError:
+            chunk_size = 0
+
+        if chunk_size < 1:
+            return Response(
+                {'message': 'Invalid since or chunk size.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return StreamingHttpResponse(
+            export_stories(since=since, chunk_size=chunk_size),
+            content_type='application/x-ndjson'
+        )
+
+
+class StorySearch(QueryBudgetMixin, generics.GenericAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
-    serializer_class = StorySerializer
+    serializer_class = StorySearchSerializer
+    pagination_class = SearchPagination
+    query_budget = 5
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+
+        if not search.get_words(query):
+            return Response(
+                {'message': 'Expected a search query.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        stories = self.paginate_queryset(
+            lambda limit, offset: search.search_stories(query, limit, offset)
+        )
+        serializer = self.serializer_class(stories, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+
+class CategoryStoryList(QueryBudgetMixin, ConditionalGetMixin, generics.ListAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = StorySummarySerializer
+    query_budget = 5
+    pagination_classes_by_category = {
+        'personal': StoryCursorPagination,
+        'trending': TrendingStoryCursorPagination,
+    }
+
+    def get_etag(self, request, category, stories):
+        owner = request.user.id if category == 'personal' else None
+
+        return get_list_etag(
+            category, stories, owner,
+            self.paginator.get_next_link(), self.paginator.get_previous_link()
+        )
 
     def get_stories(self, request, category):
         stories = {
             'personal': Story.objects.filter(author=request.user.author),
-            'trending': Story.objects.order_by('-num_vote_up', '-posted_on')[:10]
+            'trending': Story.objects.all()
         }
 
         return stories.get(category)
@@ -98,13 +245,25 @@ class CategoryStoryList(generics.ListAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        serializer = self.serializer_class(stories, many=True)
+        self.pagination_class = self.pagination_classes_by_category[kwargs['category']]
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        stories = self.paginate_queryset(stories.select_related('author__user'))
 
+        not_modified = self.get_not_modified_response(
+            request, etag=self.get_etag(request, kwargs['category'], stories)
+        )
+        if not_modified:
+            return not_modified
+
+        data = response_cache.get_or_set(
+            self.etag, lambda: self.serializer_class(stories, many=True).data
+        )
+
+        return self.get_paginated_response(data)
 
-class StoryLinesViewSet(viewsets.ModelViewSet):
-    authentication_classes = (TokenAuthentication,)
+
+class StoryLinesViewSet(QueryBudgetMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes_by_action = {
         'list': (IsAuthenticated,),
         'retrieve': (IsAuthenticated,),
@@ -114,6 +273,7 @@ class StoryLinesViewSet(viewsets.ModelViewSet):
         'destroy': (IsAuthenticated, IsAuthor),
     }
     serializer_class = StoryLineSerializer
+    query_budget = {'list': 4, 'retrieve': 3}
 
     def get_permissions(self):
         return [
@@ -122,26 +282,81 @@ class StoryLinesViewSet(viewsets.ModelViewSet):
             in self.permission_classes_by_action[self.action]
         ]
 
+    def parse_cursor(self, cursor):
+        last_storyline_id, last_deletion_id = cursor.split('.')
+
+        return int(last_storyline_id), int(last_deletion_id)
+
     def list(self, request, story_pk=None):
         story = get_object_or_404(Story, id=story_pk)
         self.check_object_permissions(request, story)
 
-        storylines = StoryLine.objects.filter(story=story)
-        serializer = self.serializer_class(storylines, many=True)
+        if 'cursor' in request.query_params:
+            return self.list_changes(request, story)
 
-        headers = self.get_success_headers(serializer)
+        not_modified = self.get_not_modified_response(
+            request,
+            etag='storylines-{}'.format(story.revision)
+        )
+        if not_modified:
+            return not_modified
+
+        data = response_cache.get_or_set(
+            self.etag, lambda: self.get_storylines_data(story)
+        )
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    def get_storylines_data(self, story):
+        storylines = StoryLine.objects.with_authors().filter(story=story)
+
+        return self.serializer_class(storylines, many=True).data
+
+    def list_changes(self, request, story):
+        try:
+            last_storyline_id, last_deletion_id = self.parse_cursor(request.query_params['cursor'])
+        except ValueError:
+            return Response(
+                {'message': 'Invalid cursor.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        storylines = list(
+            StoryLine.objects.with_authors().filter(
+                story=story, id__gt=last_storyline_id
+            ).order_by('id')
+        )
+        deletions = list(
+            DeletedStoryLine.objects.filter(
+                story=story, id__gt=last_deletion_id
+            ).values_list('id', 'storyline_id')
+        )
+
+        if not storylines and not deletions:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if storylines:
+            last_storyline_id = storylines[-1].id
+
+        if deletions:
+            last_deletion_id = deletions[-1][0]
+
+        serializer = self.serializer_class(storylines, many=True)
 
         return Response(
-            serializer.data,
-            status=status.HTTP_200_OK,
-            headers=headers
+            {
+                'storylines': serializer.data,
+                'deleted': [storyline_id for _, storyline_id in deletions],
+                'cursor': '{}.{}'.format(last_storyline_id, last_deletion_id)
+            },
+            status=status.HTTP_200_OK
         )
 
     def retrieve(self, request, story_pk=None, pk=None):
         story = get_object_or_404(Story, id=story_pk)
         self.check_object_permissions(request, story)
 
-        storyline = get_object_or_404(story.storyline_set, id=pk)
+        storyline = get_object_or_404(story.storyline_set.with_authors(), id=pk)
         serializer = self.serializer_class(storyline)
 
         headers = self.get_success_headers(serializer)
@@ -160,7 +375,9 @@ class StoryLinesViewSet(viewsets.ModelViewSet):
 
         serializer = self.serializer_class(data=request.data, context=context)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+
+        with story_turn(story.id, request.user.id):
+            self.perform_create(serializer)
 
         headers = self.get_success_headers(serializer)
 
@@ -174,11 +391,15 @@ class StoryLinesViewSet(viewsets.ModelViewSet):
         )
 
     def destroy(self, request, story_pk=None, pk=None):
-        story = get_object_or_404(Story, id=story_pk)
+        story = get_object_or_404(Story.objects.select_related('author'), id=story_pk)
         story_line = get_object_or_404(story.storyline_set, id=pk)
         self.check_object_permissions(request, story)
 
-        story_line.delete()
+        story_line_id = story_line.id
+
+        with transaction.atomic():
+            DeletedStoryLine.objects.create(story=story, storyline_id=story_line_id)
+            story_line.delete()
 
         return Response(
             {'message': 'Story line successfully deleted.'},
@@ -186,9 +407,25 @@ class StoryLinesViewSet(viewsets.ModelViewSet):
         )
 
 
-class StoryVotingView(generics.UpdateAPIView):
-    authentication_classes = (TokenAuthentication,)
+class StoryTicket(QueryBudgetMixin, generics.GenericAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    query_budget = 2
+
+    def post(self, request, pk=None):
+        story = get_object_or_404(Story, id=pk)
+        self.check_object_permissions(request, story)
+
+        return Response(
+            {'ticket': issue_stream_ticket(request.auth, story.id)},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class StoryVotingView(QueryBudgetMixin, generics.UpdateAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsNotBlacklisted)
+    query_budget = 11
 
     def perform_action(self, user_id, story):
         raise NotImplementedError()
@@ -197,27 +434,28 @@ class StoryVotingView(generics.UpdateAPIView):
         story = get_object_or_404(Story, id=pk)
         self.check_object_permissions(request, story)
 
-        self.perform_action(request.user.id, story)
+        _, num_vote_up = self.perform_action(request.user.id, story)
 
         return Response(
-            {'num_vote_up': story.votes.count()},
+            {'num_vote_up': num_vote_up},
             status=status.HTTP_200_OK
         )
 
 
 class StoryVote(StoryVotingView):
     def perform_action(self, user_id, story):
-        story.votes.up(user_id)
+        return votes.cast_vote(story, user_id)
 
 
 class StoryUnvote(StoryVotingView):
     def perform_action(self, user_id, story):
-        story.votes.delete(user_id)
+        return votes.withdraw_vote(story, user_id)
 
 
-class UserBlockingView(generics.UpdateAPIView):
-    authentication_classes = (TokenAuthentication,)
+class UserBlockingView(QueryBudgetMixin, generics.UpdateAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsAuthor)
+    query_budget = 6
 
     err_msg_format = 'User {} is {}.'
     resp_msg_format = 'User {} has been successfully {}.'
@@ -238,7 +476,7 @@ class UserBlockingView(generics.UpdateAPIView):
         raise NotImplementedError()
 
     def update(self, request, pk=None, user_pk=None, *args, **kwargs):
-        story = get_object_or_404(Story, id=pk)
+        story = get_object_or_404(Story.objects.select_related('author'), id=pk)
 
         user = get_object_or_404(self.get_users_queryset(story), id=user_pk)
 
@@ -266,13 +504,13 @@ class UserUnblock(UserBlockingView):
         return self.resp_msg_format.format(user, 'unblocked')
 
     def can_perform_action(self, user, story):
-        return user in story.blacklist.all()
+        return story.is_blacklisted(user)
 
     def get_users_queryset(self, story=None):
         return User.objects.all()
 
     def perform_action(self, user, story):
-        story.blacklist.remove(user)
+        story.unblock(user)
 
 
 class UserBlock(UserUnblock):
@@ -286,7 +524,24 @@ class UserBlock(UserUnblock):
         return not super().can_perform_action(user, story)
 
     def get_users_queryset(self, story=None):
-        return super().get_users_queryset(story=story).exclude(id=story.author.user.id)
+        return super().get_users_queryset(story=story).exclude(id=story.author.user_id)
 
     def perform_action(self, user, story):
-        story.blacklist.add(user)
+        story.block(user)
+
+
+class StoryBlacklist(QueryBudgetMixin, generics.ListAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated, IsAuthor)
+    serializer_class = UserReadSerializer
+    pagination_class = BlacklistCursorPagination
+    query_budget = 4
+
+    def get(self, request, pk=None):
+        story = get_object_or_404(Story.objects.select_related('author'), id=pk)
+        self.check_object_permissions(request, story)
+
+        users = self.paginate_queryset(story.blacklist.all())
+        serializer = self.serializer_class(users, many=True)
+
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,112 @@
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, connections, transaction
+
+from vote.models import Vote, UP
+
+from tarina import metrics
+from . import trending
+from .models import Story
+
+
+class VoteBuffer:
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, story_id, delta, activity_score):
+        with self.lock:
+            pending_delta, added, removed = self.pending.get(story_id, (0, None, None))
+
+            if delta > 0:
+                added = combine(added, activity_score)
+            else:
+                removed = combine(removed, activity_score)
+
+            self.pending[story_id] = (pending_delta + delta, added, removed)
+
+            if self.timer is None:
+                self.timer = threading.Timer(settings.VOTE_BUFFER_INTERVAL, self.flush_in_thread)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def get_pending_delta(self, story_id):
+        with self.lock:
+            return self.pending.get(story_id, (0, None, None))[0]
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        for story_id, (delta, added, removed) in pending.items():
+            Story.objects.apply_votes(story_id, delta, added=added, removed=removed)
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+
+buffer = VoteBuffer()
+
+
+def combine(score, activity_score):
+    if score is None:
+        return activity_score
+
+    return trending.add_activity(score, activity_score)
+
+
+def get_vote_filter(story, user_id):
+    return {
+        'content_type': ContentType.objects.get_for_model(Story),
+        'object_id': story.id,
+        'user_id': user_id,
+        'action': UP,
+    }
+
+
+def count_vote(story, delta, activity_score):
+    if not settings.VOTE_BUFFER_INTERVAL:
+        added, removed = (activity_score, None) if delta > 0 else (None, activity_score)
+
+        return Story.objects.apply_votes(story.id, delta, added=added, removed=removed)
+
+    buffer.add(story.id, delta, activity_score)
+
+    return story.num_vote_up + buffer.get_pending_delta(story.id)
+
+
+def cast_vote(story, user_id):
+    try:
+        with transaction.atomic():
+            vote = Vote.objects.create(**get_vote_filter(story, user_id))
+    except IntegrityError:
+        return False, story.num_vote_up + buffer.get_pending_delta(story.id)
+
+    activity_score = trending.get_activity_score(trending.VOTE_WEIGHT, vote.create_at)
+    metrics.votes.inc(action='vote')
+
+    return True, count_vote(story, 1, activity_score)
+
+
+def withdraw_vote(story, user_id):
+    vote = Vote.objects.filter(**get_vote_filter(story, user_id)).values_list(
+        'id', 'create_at'
+    ).first()
+
+    if vote is None or not Vote.objects.filter(id=vote[0]).delete()[0]:
+        return False, story.num_vote_up + buffer.get_pending_delta(story.id)
+
+    activity_score = trending.get_activity_score(trending.VOTE_WEIGHT, vote[1])
+    metrics.votes.inc(action='unvote')
+
+    return True, count_vote(story, -1, activity_score)
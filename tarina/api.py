@@ -1,7 +1,16 @@
 from django.conf.urls import url, include
 
+from .metrics import metrics_view
+from .profiling import ProfileDownload
+
 
 urlpatterns = [
     url(r'', include('users.urls')),
     url(r'', include('stories.urls')),
+    url(r'^metrics/$', metrics_view, name='metrics'),
+    url(
+        r'^profiles/(?P<profile_id>[0-9a-f]{32})\.(?P<extension>pstats|collapsed)$',
+        ProfileDownload.as_view(),
+        name='profile-download'
+    ),
 ]
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class TarinaConfig(AppConfig):
+    name = 'tarina'
+
+    def ready(self):
+        from . import metrics, queries
+
+        queries.install()
+        metrics.install()
@@ -0,0 +1,68 @@
+"""
+ASGI config for tarina project.
+
+It exposes the story rooms (WebSockets on /ws/story/{story_id}) and the story event streams
+(Server-Sent Events on /api/story/{story_id}/events/) as a module-level ASGI callable named
+``application``; the rest of the API keeps being served by ``tarina.wsgi``.
+
+Run it next to the WSGI app, e.g. ``uvicorn tarina.asgi:application --port 8001``, and point
+the client's ``liveUrl`` at it. Rooms pick up changes made by other processes from the
+database, but their presence lives in an in-memory channel layer, so a single process has to
+serve all of them.
+"""
+
+import os
+import re
+
+import django
+
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tarina.settings")
+django.setup()
+
+from stories.events import StoryEventsConsumer  # noqa: E402
+from stories.rooms import StoryRoomConsumer  # noqa: E402
+
+
+ROOM_PATH = re.compile(r'^/ws/story/(?P<story_id>\d+)/?$')
+EVENTS_PATH = re.compile(r'^/api/story/(?P<story_id>\d+)/events/?$')
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def not_found(send):
+    await send({
+        'type': 'http.response.start',
+        'status': 404,
+        'headers': [(b'content-type', b'text/plain')],
+    })
+    await send({'type': 'http.response.body', 'body': b'Not Found'})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'websocket':
+        match = ROOM_PATH.match(scope['path'])
+    else:
+        match = EVENTS_PATH.match(scope['path'])
+
+    if scope['type'] == 'websocket' and match:
+        await StoryRoomConsumer(scope, receive, send, int(match.group('story_id')))()
+    elif scope['type'] == 'websocket':
+        await send({'type': 'websocket.close', 'code': 4404})
+    elif match:
+        await StoryEventsConsumer(scope, receive, send, int(match.group('story_id')))()
+    else:
+        await not_found(send)
@@ -0,0 +1,352 @@
+import json
+import random
+import time
+import uuid
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from vote.models import Vote, UP
+
+from stories.bulk import StoryImporter
+from stories.models import Story, StoryLine
+from stories.votes import cast_vote, withdraw_vote
+from users.models import Author
+from .queries import QueryRecorder
+
+
+# Endpoints that are left out of the benchmark, with the reason
+EXCLUDED_ENDPOINTS = {
+    'metrics': 'an operations endpoint outside the API',
+    'profile-download': 'an operations endpoint outside the API',
+}
+
+
+def seed_dataset(stories=100, lines=10, users=20, votes=200, seed=0):
+    rng = random.Random(seed)
+    prefix = 'seed-{}'.format(uuid.uuid4().hex[:8])
+
+    User.objects.bulk_create([
+        User(username='{}-{}'.format(prefix, number), first_name='Seed', last_name='User')
+        for number in range(users)
+    ])
+    user_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+
+    Author.objects.bulk_create([Author(user_id=user_id) for user_id in user_ids])
+    Token.objects.bulk_create([
+        Token(key=uuid.uuid4().hex, user_id=user_id) for user_id in user_ids
+    ])
+    seeded_users = list(
+        User.objects.filter(username__startswith=prefix).select_related('author').order_by('id')
+    )
+
+    usernames = [user.username for user in seeded_users]
+    records = []
+
+    for number in range(stories):
+        authors = [rng.choice(usernames) for _ in range(lines)]
+
+        records.append(json.dumps({
+            'title': 'Seeded story #{}'.format(number),
+            'author': rng.choice(usernames),
+            'storylines': [
+                {'author': author, 'content': 'Seeded line #{} of story #{}.'.format(line, number)}
+                for line, author in enumerate(authors)
+            ]
+        }))
+
+    importer = StoryImporter()
+    importer.run(records)
+
+    if importer.errors:
+        raise ValueError('Could not seed story #{}: {}'.format(
+            importer.errors[0]['line'] - 1, importer.errors[0]['message']
+        ))
+
+    story_ids = list(
+        Story.objects.filter(author__user__username__startswith=prefix).values_list('id', flat=True)
+    )
+    content_type = ContentType.objects.get_for_model(Story)
+    pairs = {
+        (rng.choice(seeded_users).id, rng.choice(story_ids))
+        for _ in range(votes if story_ids else 0)
+    }
+
+    Vote.objects.bulk_create([
+        Vote(user_id=user_id, content_type=content_type, object_id=story_id, action=UP)
+        for user_id, story_id in pairs
+    ])
+
+    call_command('reconcile_votes', stdout=StringIO())
+    call_command('rebuild_trending_scores', stdout=StringIO())
+
+    return seeded_users, story_ids
+
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+    index = int(round(percentile / 100 * (len(values) - 1)))
+
+    return values[index]
+
+
+class Benchmark:
+    def __init__(self, users, story_ids, iterations=50):
+        self.users = users
+        self.story_ids = story_ids
+        self.iterations = iterations
+        self.client = APIClient()
+        self.tokens = dict(
+            Token.objects.filter(user__in=users).values_list('user', 'key')
+        )
+
+        self.admin, self.user, self.other_user = users[:3]
+        self.admin.is_staff = True
+        self.admin.save()
+
+        self.password = uuid.uuid4().hex
+        self.login_user = User.objects.create_user(
+            username='benchmark-{}'.format(uuid.uuid4().hex[:8]), password=self.password
+        )
+        Author.objects.create(user=self.login_user)
+        self.own_story_id = Story.objects.create(
+            title='Benchmark blacklist', author=self.user.author
+        ).id
+
+    def get_endpoints(self):
+        story_id = self.story_ids[0]
+
+        return [
+            ('story-list', 'get', lambda i: (reverse('stories:story-list'), None)),
+            ('story-detail', 'get', lambda i: (
+                reverse('stories:story-detail', kwargs={'pk': self.get_story_id(i)}), None
+            )),
+            ('story-create', 'post', lambda i: (
+                reverse('stories:story-list'),
+                {'title': 'Benchmark #{}'.format(i), 'opening_line': 'Once upon a benchmark.'}
+            )),
+            ('story-search', 'get', lambda i: (
+                reverse('stories:search') + '?q=seeded+line+{}'.format(i % 10), None
+            )),
+            ('category-personal', 'get', lambda i: (
+                reverse('stories:category-list', kwargs={'category': 'personal'}), None
+            )),
+            ('category-trending', 'get', lambda i: (
+                reverse('stories:category-list', kwargs={'category': 'trending'}), None
+            )),
+            ('storylines-list', 'get', lambda i: (
+                reverse('stories:storylines-list', kwargs={'story_pk': story_id}), None
+            )),
+            ('storylines-changes', 'get', lambda i: (
+                reverse('stories:storylines-list', kwargs={'story_pk': story_id}) + '?cursor=0.0',
+                None
+            )),
+            ('storyline-detail', 'get', lambda i: (
+                reverse('stories:storylines-detail', kwargs={
+                    'story_pk': story_id, 'pk': self.get_storyline_id(story_id)
+                }),
+                None
+            )),
+            ('storyline-create', 'post', lambda i: (
+                reverse('stories:storylines-list', kwargs={'story_pk': self.get_empty_story_id()}),
+                {'content': 'Benchmark line #{}.'.format(i)}
+            )),
+            ('storyline-delete', 'delete', lambda i: self.get_storyline_delete_request(i)),
+            ('story-delete', 'delete', lambda i: (
+                reverse('stories:story-detail', kwargs={'pk': Story.objects.create(
+                    title='Deleted benchmark #{}'.format(i), author=self.user.author
+                ).id}),
+                None
+            )),
+            ('ticket', 'post', lambda i: (
+                reverse('stories:ticket', kwargs={'pk': story_id}), None
+            )),
+            ('vote', 'put', lambda i: self.get_vote_request('vote', withdraw_vote)),
+            ('unvote', 'put', lambda i: self.get_vote_request('unvote', cast_vote)),
+            ('block', 'put', lambda i: self.get_block_request('block', False)),
+            ('unblock', 'put', lambda i: self.get_block_request('unblock', True)),
+            ('blacklist', 'get', lambda i: (
+                reverse('stories:blacklist', kwargs={'pk': self.own_story_id}), None
+            )),
+            ('profile', 'get', lambda i: (
+                reverse('users:profile', kwargs={'user_pk': self.user.id}), None
+            )),
+            ('profile-update', 'put', lambda i: (
+                reverse('users:profile', kwargs={'user_pk': self.user.id}),
+                {'profile_image': 'https://example.com/{}.png'.format(i)}
+            )),
+            ('register', 'post', lambda i: (
+                reverse('users:register'),
+                {
+                    'username': 'bench-{}'.format(uuid.uuid4().hex[:16]),
+                    'first_name': 'Bench',
+                    'last_name': 'Mark',
+                    'password': self.password
+                }
+            )),
+            ('login', 'post', lambda i: (
+                reverse('users:login'),
+                {'username': self.login_user.username, 'password': self.password}
+            )),
+            ('logout', 'post', lambda i: self.get_logout_request()),
+            ('import', 'post', lambda i: (
+                reverse('stories:import'),
+                json.dumps({
+                    'title': 'Imported benchmark #{}'.format(i),
+                    'author': self.user.username,
+                    'storylines': [{'author': self.other_user.username, 'content': 'Imported.'}]
+                })
+            )),
+            ('export', 'get', lambda i: (reverse('stories:export'), None)),
+        ]
+
+    def get_user(self, name):
+        if name in ('import', 'export'):
+            return self.admin
+
+        if name in ('register', 'login'):
+            return None
+
+        if name == 'logout':
+            return self.login_user
+
+        return self.user
+
+    def get_story_id(self, iteration):
+        return self.story_ids[iteration % len(self.story_ids)]
+
+    def get_vote_request(self, view_name, reset_vote):
+        story = Story.objects.get(id=self.story_ids[0])
+        reset_vote(story, self.user.id)
+
+        return reverse('stories:{}'.format(view_name), kwargs={'pk': story.id}), None
+
+    def get_empty_story_id(self):
+        return Story.objects.create(title='Benchmark story', author=self.other_user.author).id
+
+    def get_storyline_id(self, story_id):
+        storyline = StoryLine.objects.filter(story_id=story_id).first()
+
+        if storyline is None:
+            storyline = StoryLine.objects.create(
+                story_id=story_id, author=self.other_user.author, content='Benchmark line.'
+            )
+
+        return storyline.id
+
+    def get_storyline_delete_request(self, iteration):
+        story = Story.objects.create(title='Benchmark story', author=self.user.author)
+        storyline = StoryLine.objects.create(
+            story=story,
+            author=self.other_user.author,
+            content='Deleted benchmark line #{}.'.format(iteration)
+        )
+
+        return reverse('stories:storylines-detail', kwargs={
+            'story_pk': storyline.story_id, 'pk': storyline.id
+        }), None
+
+    def get_block_request(self, view_name, blocked):
+        story = Story.objects.get(id=self.own_story_id)
+
+        if blocked:
+            story.block(self.other_user)
+        else:
+            story.unblock(self.other_user)
+
+        return reverse('stories:{}'.format(view_name), kwargs={
+            'pk': story.id, 'user_pk': self.other_user.id
+        }), None
+
+    def get_logout_request(self):
+        token, _ = Token.objects.get_or_create(user=self.login_user)
+        self.tokens[self.login_user.id] = token.key
+
+        return reverse('users:logout'), None
+
+    def request(self, method, url, data, user):
+        if user is None:
+            self.client.credentials()
+        else:
+            self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.tokens[user.id]))
+
+        if isinstance(data, str):
+            kwargs = {'content_type': 'application/x-ndjson'}
+        else:
+            kwargs = {'format': 'json'}
+
+        with QueryRecorder() as recorder:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, data, **kwargs)
+
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+
+            duration = time.perf_counter() - started
+
+        return response.status_code, duration, recorder.count, size
+
+    def run_endpoint(self, method, get_request, user):
+        durations = []
+        queries = []
+        sizes = []
+        errors = 0
+
+        for iteration in range(self.iterations):
+            url, data = get_request(iteration)
+            status_code, duration, count, size = self.request(method, url, data, user)
+
+            durations.append(duration * 1000)
+            queries.append(count)
+            sizes.append(size)
+            errors += status_code >= 400
+
+        return {
+            'p50': round(get_percentile(durations, 50), 3),
+            'p95': round(get_percentile(durations, 95), 3),
+            'p99': round(get_percentile(durations, 99), 3),
+            'queries': max(queries),
+            'bytes': max(sizes),
+            'errors': errors,
+        }
+
+    def run(self, only=None):
+        results = {}
+
+        for name, method, get_request in self.get_endpoints():
+            if only and name not in only:
+                continue
+
+            results[name] = self.run_endpoint(method, get_request, self.get_user(name))
+
+        return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+
+        expected = baseline[name]
+
+        if result['queries'] > expected['queries']:
+            regressions.append('{}: {} queries, baseline {}'.format(
+                name, result['queries'], expected['queries']
+            ))
+
+        if result['p95'] > expected['p95'] * (1 + tolerance):
+            regressions.append('{}: p95 {}ms, baseline {}ms'.format(
+                name, result['p95'], expected['p95']
+            ))
+
+    return regressions
@@ -0,0 +1,211 @@
+import io
+import os
+import pickle
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LRUCache(BaseCache):
+    def __init__(self, name, params):
+        super().__init__(params)
+
+        with _stores_lock:
+            self.entries, self.lock = _stores.setdefault(name, (OrderedDict(), threading.Lock()))
+
+    def get_entry(self, key):
+        value, expires = self.entries[key]
+
+        if expires is not None and expires <= time.time():
+            del self.entries[key]
+            raise KeyError(key)
+
+        self.entries.move_to_end(key)
+
+        return value
+
+    def set_entry(self, key, value, timeout):
+        self.entries[key] = (
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout)
+        )
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self._max_entries:
+            self.entries.popitem(last=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        with self.lock:
+            try:
+                self.get_entry(key)
+            except KeyError:
+                self.set_entry(key, value, timeout)
+                return True
+
+        return False
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        with self.lock:
+            try:
+                value = self.get_entry(key)
+            except KeyError:
+                return default
+
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        with self.lock:
+            self.set_entry(key, value, timeout)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        with self.lock:
+            try:
+                self.get_entry(key)
+            except KeyError:
+                return False
+
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    # Django's add() checks for the key and then sets it, so two processes could both add it.
+    # Here the entry is written aside and hard linked into place, which fails for all but one.
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key, version):
+            return False
+
+        self._createdir()
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+
+        try:
+            with io.open(fd, 'wb') as f:
+                f.write(pickle.dumps(self.get_backend_timeout(timeout), pickle.HIGHEST_PROTOCOL))
+                f.write(zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+            os.link(tmp_path, self._key_to_file(key, version))
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+        return True
+
+    def has_key(self, key, version=None):
+        # The entry can be deleted by another process between Django's exists check and open
+        try:
+            return super().has_key(key, version)
+        except FileNotFoundError:
+            return False
+
+
+class SingleFlightCache:
+    instances = {}
+
+    def __init__(self, alias):
+        self.instances[alias] = self
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self.locks = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_local_lock(self, key):
+        with self.lock:
+            lock = self.locks.get(key)
+
+            if lock is None:
+                lock = self.locks[key] = threading.Lock()
+
+        return lock
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def wait_for(self, key, timeout):
+        deadline = time.time() + timeout
+
+        while time.time() < deadline:
+            time.sleep(settings.RESPONSE_CACHE_POLL_INTERVAL)
+
+            value = self.cache.get(key)
+            if value is not None:
+                return value
+
+        return None
+
+    def get_or_set(self, key, compute):
+        value = self.cache.get(key)
+        if value is not None:
+            self.count(hit=True)
+            return value
+
+        with self.get_local_lock(key):
+            value = self.cache.get(key)
+            if value is not None:
+                self.count(hit=True)
+                return value
+
+            lock_key = '{}:lock'.format(key)
+            lock_timeout = settings.RESPONSE_CACHE_LOCK_TIMEOUT
+
+            if not self.cache.add(lock_key, True, lock_timeout):
+                value = self.wait_for(key, lock_timeout)
+                if value is not None:
+                    self.count(hit=True)
+                    return value
+
+            self.count(hit=False)
+
+            try:
+                value = compute()
+                self.cache.set(key, value)
+            finally:
+                self.cache.delete(lock_key)
+
+        return value
+
+
+response_cache = SingleFlightCache('responses')
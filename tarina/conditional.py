@@ -0,0 +1,38 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def get_list_etag(prefix, objects, *extra):
+    digest = hashlib.md5()
+
+    for part in extra:
+        digest.update('{}\n'.format(part).encode())
+
+    for obj in objects:
+        digest.update('{}\n'.format(obj.revision).encode())
+
+    return '{}-{}'.format(prefix, digest.hexdigest())
+
+
+class ConditionalGetMixin:
+    etag = None
+
+    def get_not_modified_response(self, request, etag=None):
+        self.etag = etag
+
+        return get_conditional_response(request, etag=self.etag)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304):
+            return response
+
+        if self.etag is not None:
+            response['ETag'] = quote_etag(self.etag)
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+
+        return response
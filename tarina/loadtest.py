@@ -0,0 +1,237 @@
+import http.client
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .benchmark import get_percentile
+
+
+STEPS = ('browse', 'trending', 'open-story', 'poll', 'post-line', 'post-story', 'vote')
+
+
+class LoadReport:
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS}
+        self.lock = threading.Lock()
+
+    def record(self, step, duration, status):
+        with self.lock:
+            self.samples[step].append((duration, status))
+
+    def get_summary(self, elapsed):
+        summary = OrderedDict()
+
+        for step in STEPS:
+            samples = self.samples[step]
+
+            if not samples:
+                continue
+
+            durations = [duration * 1000 for duration, _ in samples]
+            errors = sum(status == 0 or status >= 500 for _, status in samples)
+            rejected = sum(400 <= status < 500 for _, status in samples)
+
+            summary[step] = {
+                'requests': len(samples),
+                'throughput': round(len(samples) / elapsed, 1),
+                'error_rate': round(100 * errors / len(samples), 2),
+                'rejected_rate': round(100 * rejected / len(samples), 2),
+                'p50': round(get_percentile(durations, 50), 1),
+                'p95': round(get_percentile(durations, 95), 1),
+                'p99': round(get_percentile(durations, 99), 1),
+                'max': round(max(durations), 1),
+            }
+
+        return summary
+
+
+class HotStory:
+    def __init__(self, story_id):
+        self.story_id = story_id
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            return self.story_id
+
+    def replace(self, full_story_id, story_id):
+        with self.lock:
+            if self.story_id == full_story_id:
+                self.story_id = story_id
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, address, token, story_ids, hot_story, report, deadline, options, seed=0):
+        super().__init__(daemon=True)
+
+        self.address = address
+        self.token = token
+        self.story_ids = story_ids
+        self.hot_story = hot_story
+        self.report = report
+        self.deadline = deadline
+        self.options = options
+        self.rng = random.Random(seed)
+        self.connection = None
+
+    def request(self, step, method, path, data=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(*self.address, timeout=30)
+
+        headers = {
+            'Host': 'localhost',
+            'Authorization': 'Token {}'.format(self.token),
+            'Content-Type': 'application/json',
+        }
+        body = json.dumps(data) if data is not None else None
+
+        started = time.perf_counter()
+
+        try:
+            self.connection.request(method, '/api/' + path, body, headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = None
+            content = b''
+            status = 0
+
+        self.report.record(step, time.perf_counter() - started, status)
+
+        try:
+            return status, json.loads(content.decode()) if content else None
+        except ValueError:
+            return status, None
+
+    def is_done(self):
+        return time.time() >= self.deadline
+
+    def pick_story(self):
+        if self.rng.random() < self.options['hot_share']:
+            return self.hot_story.get()
+
+        return self.rng.choice(self.story_ids)
+
+    def post_line(self, story_id):
+        status, data = self.request(
+            'post-line', 'POST', 'story/{}/storylines/'.format(story_id),
+            {'content': 'Load test line {}.'.format(self.rng.getrandbits(32))}
+        )
+
+        if status == 403 and data and data.get('detail', '').startswith('Max number'):
+            status, data = self.request('post-story', 'POST', 'story/', {
+                'title': 'Load test story {}'.format(self.rng.getrandbits(32)),
+                'opening_line': 'Once upon a load test.',
+            })
+
+            if status == 201:
+                self.hot_story.replace(story_id, data['id'])
+
+    def visit(self):
+        self.request('browse', 'GET', 'story/')
+
+        if self.rng.random() < self.options['trending_share']:
+            self.request('trending', 'GET', 'story/trending/')
+
+        story_id = self.pick_story()
+        status, _ = self.request('open-story', 'GET', 'story/{}/'.format(story_id))
+
+        if status != 200:
+            return
+
+        cursor = '0.0'
+
+        for _ in range(self.options['polls']):
+            if self.is_done():
+                return
+
+            time.sleep(self.options['poll_interval'])
+
+            status, data = self.request(
+                'poll', 'GET', 'story/{}/storylines/?cursor={}'.format(story_id, cursor)
+            )
+
+            if status == 200 and data:
+                cursor = data['cursor']
+
+            if self.rng.random() < self.options['post_share']:
+                self.post_line(story_id)
+
+            if self.rng.random() < self.options['vote_share']:
+                action = self.rng.choice(('vote', 'unvote'))
+                self.request('vote', 'PUT', 'story/{}/{}/'.format(story_id, action))
+
+    def run(self):
+        try:
+            while not self.is_done():
+                self.visit()
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+
+
+def run_load(address, tokens, story_ids, users, duration, **options):
+    report = LoadReport()
+    hot_story = HotStory(story_ids[0])
+    deadline = time.time() + duration
+
+    virtual_users = [
+        VirtualUser(
+            address, tokens[number % len(tokens)], story_ids, hot_story, report, deadline,
+            options, seed=number
+        )
+        for number in range(users)
+    ]
+
+    started = time.time()
+
+    for virtual_user in virtual_users:
+        virtual_user.start()
+
+    for virtual_user in virtual_users:
+        virtual_user.join()
+
+    return report.get_summary(time.time() - started)
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, threads, env, cwd):
+    return subprocess.Popen([
+        sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()', 'tarina.wsgi',
+        '--bind', '127.0.0.1:{}'.format(port),
+        '--workers', str(workers),
+        '--worker-class', 'gthread',
+        '--threads', str(threads),
+        '--log-level', 'warning',
+    ], env=env, cwd=cwd)
+
+
+def wait_for_server(address, timeout=30):
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        connection = http.client.HTTPConnection(*address, timeout=1)
+
+        try:
+            connection.request('GET', '/api/story/', headers={'Host': 'localhost'})
+            connection.getresponse().read()
+            return True
+        except (http.client.HTTPException, OSError):
+            time.sleep(0.2)
+        finally:
+            connection.close()
+
+    return False
@@ -0,0 +1,92 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tarina.benchmark import EXCLUDED_ENDPOINTS, Benchmark, seed_dataset, compare_with_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database and reports latency percentiles, query counts '
+        'and response sizes of every API endpoint, optionally against a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stories', type=int, default=100)
+        parser.add_argument('--lines', type=int, default=10)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--votes', type=int, default=200)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--endpoint', action='append', dest='endpoints')
+        parser.add_argument('--baseline', default='benchmark-baseline.json')
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+
+    def run_benchmark(self, options):
+        settings.DEBUG = False
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+
+        try:
+            users, story_ids = seed_dataset(
+                stories=options['stories'],
+                lines=options['lines'],
+                users=options['users'],
+                votes=options['votes']
+            )
+
+            return Benchmark(users, story_ids, iterations=options['iterations']).run(
+                only=options['endpoints']
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def handle(self, *args, **options):
+        if options['users'] < 3 or options['stories'] < 1 or options['iterations'] < 1:
+            raise CommandError('At least 3 users, 1 story and 1 iteration are needed.')
+
+        try:
+            results = self.run_benchmark(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        row = '{:<20}{:>10}{:>10}{:>10}{:>9}{:>10}{:>8}'
+        self.stdout.write(row.format(
+            'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'bytes', 'errors'
+        ))
+
+        for name, result in results.items():
+            self.stdout.write(row.format(
+                name, result['p50'], result['p95'], result['p99'],
+                result['queries'], result['bytes'], result['errors']
+            ))
+
+        for name, reason in sorted(EXCLUDED_ENDPOINTS.items()):
+            self.stdout.write('Not benchmarked: {} ({}).'.format(name, reason))
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+
+            self.stdout.write('Baseline saved to {}.'.format(options['baseline']))
+            return
+
+        if not os.path.exists(options['baseline']):
+            return
+
+        with open(options['baseline']) as baseline:
+            regressions = compare_with_baseline(results, json.load(baseline), options['tolerance'])
+
+        if regressions:
+            raise CommandError('Regressions against {}:\n{}'.format(
+                options['baseline'], '\n'.join(regressions)
+            ))
+
+        self.stdout.write('No regressions against {}.'.format(options['baseline']))
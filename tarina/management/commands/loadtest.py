@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tarina import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the app under gunicorn on a freshly seeded database and replays the client '
+        'flows (browse, open story, poll, post line, vote) with concurrent virtual users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds of load.')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--database-url',
+            help='Database to migrate, seed and serve. Defaults to a temporary SQLite file.'
+        )
+        parser.add_argument('--stories', type=int, default=50)
+        parser.add_argument('--lines', type=int, default=10)
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--polls', type=int, default=10, help='Polls per opened story.')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--hot-share', type=float, default=0.3)
+        parser.add_argument('--trending-share', type=float, default=0.3)
+        parser.add_argument('--post-share', type=float, default=0.05)
+        parser.add_argument('--vote-share', type=float, default=0.05)
+        parser.add_argument('--output', help='Writes the report as JSON to this file.')
+
+    def call(self, env, *args):
+        subprocess.check_call(
+            [sys.executable, 'manage.py'] + list(args),
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL
+        )
+
+    def prepare_database(self, env, directory, options):
+        self.call(env, 'migrate', '--noinput')
+
+        seed_path = os.path.join(directory, 'seed.json')
+        self.call(
+            env, 'seed_dataset',
+            '--stories', str(options['stories']),
+            '--lines', str(options['lines']),
+            '--users', str(options['accounts']),
+            '--output', seed_path
+        )
+
+        with open(seed_path) as seed:
+            return json.load(seed)
+
+    def run_load(self, options):
+        directory = tempfile.mkdtemp(prefix='tarina-loadtest-')
+        database_url = options['database_url'] or 'sqlite:///{}'.format(
+            os.path.join(directory, 'db.sqlite3')
+        )
+        env = dict(os.environ, DATABASE_URL=database_url, DEBUG='False')
+        server = None
+
+        try:
+            seed = self.prepare_database(env, directory, options)
+
+            port = loadtest.get_free_port()
+            address = ('127.0.0.1', port)
+            server = loadtest.start_server(
+                port, options['workers'], options['threads'], env, settings.BASE_DIR
+            )
+
+            if not loadtest.wait_for_server(address):
+                raise CommandError('The server did not start.')
+
+            return loadtest.run_load(
+                address, seed['tokens'], seed['stories'],
+                users=options['users'],
+                duration=options['duration'],
+                polls=options['polls'],
+                poll_interval=options['poll_interval'],
+                hot_share=options['hot_share'],
+                trending_share=options['trending_share'],
+                post_share=options['post_share'],
+                vote_share=options['vote_share']
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['stories'] < 1 or options['accounts'] < 2:
+            raise CommandError('At least 1 virtual user, 1 story and 2 accounts are needed.')
+
+        summary = self.run_load(options)
+
+        row = '{:<12}{:>10}{:>9}{:>9}{:>10}{:>9}{:>9}{:>9}{:>9}'
+        self.stdout.write(row.format(
+            'step', 'requests', 'req/s', 'errors%', 'rejected%', 'p50 ms', 'p95 ms', 'p99 ms',
+            'max ms'
+        ))
+
+        for step, result in summary.items():
+            self.stdout.write(row.format(
+                step, result['requests'], result['throughput'], result['error_rate'],
+                result['rejected_rate'], result['p50'], result['p95'], result['p99'], result['max']
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(summary, output, indent=2)
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.authtoken.models import Token
+
+from tarina.benchmark import seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Seeds the database with users, tokens, stories, story lines and votes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stories', type=int, default=100)
+        parser.add_argument('--lines', type=int, default=10)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--votes', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Writes the tokens and story ids of the seeded data to this file.'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['lines'] < 0:
+            raise CommandError('At least 1 user and 0 story lines are needed.')
+
+        users, story_ids = seed_dataset(
+            stories=options['stories'],
+            lines=options['lines'],
+            users=options['users'],
+            votes=options['votes'],
+            seed=options['seed']
+        )
+
+        if options['output']:
+            tokens = list(Token.objects.filter(user__in=users).values_list('key', flat=True))
+
+            with open(options['output'], 'w') as output:
+                json.dump({'tokens': tokens, 'stories': story_ids}, output)
+
+        self.stdout.write('Seeded {} users and {} stories.'.format(len(users), len(story_ids)))
@@ -0,0 +1,380 @@
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+from .cache import SingleFlightCache
+from .queries import QueryRecorder
+
+
+_local = threading.local()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for name, value in zip(names, values)
+    ))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+
+        with self.lock:
+            self.values[key] += amount
+
+    def get_values(self):
+        with self.lock:
+            return dict(self.values)
+
+    def merge(self, value, other):
+        return value + other
+
+    def collect(self, values=None):
+        values = self.get_values() if values is None else values
+
+        for key, value in sorted(values.items()):
+            yield '{}{} {}'.format(self.name, format_labels(self.labels, key), value)
+
+
+class CallbackCounter(Counter):
+    def __init__(self, name, description, labels, callback):
+        super().__init__(name, description, labels)
+        self.callback = callback
+
+    def get_values(self):
+        return self.callback()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = next(
+            (index for index, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets)
+        )
+
+        with self.lock:
+            counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def get_values(self):
+        with self.lock:
+            return {key: (list(counts), total[0]) for key, (counts, total) in self.values.items()}
+
+    def merge(self, value, other):
+        return [a + b for a, b in zip(value[0], other[0])], value[1] + other[1]
+
+    def collect(self, values=None):
+        values = self.get_values() if values is None else values
+
+        for key, (counts, total) in sorted(values.items()):
+            observed = 0
+
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                observed += count
+                yield '{}_bucket{} {}'.format(
+                    self.name, format_labels(self.labels + ('le',), key + (bound,)), observed
+                )
+
+            yield '{}_sum{} {}'.format(self.name, format_labels(self.labels, key), total)
+            yield '{}_count{} {}'.format(self.name, format_labels(self.labels, key), observed)
+
+
+def get_cache_counts(attribute):
+    return {
+        (alias,): getattr(cache, attribute)
+        for alias, cache in SingleFlightCache.instances.items()
+    }
+
+
+requests = Counter(
+    'tarina_requests_total', 'HTTP requests by route, method and status.',
+    ('route', 'method', 'status')
+)
+errors = Counter(
+    'tarina_request_errors_total', 'HTTP requests that ended in a server error.',
+    ('route', 'method')
+)
+durations = Histogram(
+    'tarina_request_duration_seconds', 'Time spent handling HTTP requests.', ('route',)
+)
+db_queries = Counter('tarina_db_queries_total', 'Database queries run by each route.', ('route',))
+db_durations = Counter(
+    'tarina_db_duration_seconds_total', 'Time spent in database queries by each route.',
+    ('route',)
+)
+cache_hits = CallbackCounter(
+    'tarina_cache_hits_total', 'Single flight cache hits.', ('cache',),
+    lambda: get_cache_counts('hits')
+)
+cache_misses = CallbackCounter(
+    'tarina_cache_misses_total', 'Single flight cache misses.', ('cache',),
+    lambda: get_cache_counts('misses')
+)
+votes = Counter('tarina_votes_total', 'Votes cast and withdrawn.', ('action',))
+storylines = Counter('tarina_storylines_created_total', 'Story lines created.')
+
+registry = (
+    requests, errors, durations, db_queries, db_durations, cache_hits, cache_misses, votes,
+    storylines
+)
+
+
+class SnapshotState:
+    lock = threading.Lock()
+    pid = None
+    name = None
+    written = 0
+
+
+snapshot = SnapshotState()
+
+
+def get_snapshot_path():
+    # Named after the process and a random suffix, so a reused pid never overwrites the counts
+    # of an earlier worker
+    if snapshot.pid != os.getpid():
+        snapshot.pid = os.getpid()
+        snapshot.name = '{}-{}.json'.format(snapshot.pid, uuid.uuid4().hex[:8])
+
+    return os.path.join(settings.METRICS_DIR, snapshot.name)
+
+
+def write_snapshot(force=False):
+    if not settings.METRICS_DIR:
+        return
+
+    with snapshot.lock:
+        now = time.monotonic()
+
+        if not force and now - snapshot.written < settings.METRICS_SNAPSHOT_INTERVAL:
+            return
+
+        snapshot.written = now
+        path = get_snapshot_path()
+        data = {
+            metric.name: [[list(key), value] for key, value in metric.get_values().items()]
+            for metric in registry
+        }
+
+        # A full or read-only disk costs the scrape this worker's latest counts, not the request
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+
+            with open(path + '.tmp', 'w') as snapshot_file:
+                json.dump(data, snapshot_file)
+
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+
+# Keeps the requests a worker served since its last snapshot
+atexit.register(write_snapshot, force=True)
+
+
+def read_snapshots():
+    values = {metric.name: {} for metric in registry}
+    metrics = {metric.name: metric for metric in registry}
+
+    for path in glob.glob(os.path.join(glob.escape(settings.METRICS_DIR), '*.json')):
+        try:
+            with open(path) as snapshot_file:
+                data = json.load(snapshot_file)
+        except (OSError, ValueError):
+            continue
+
+        for name, samples in data.items():
+            if name not in metrics:
+                continue
+
+            for key, value in samples:
+                key = tuple(key)
+                merged = values[name]
+                merged[key] = metrics[name].merge(merged[key], value) if key in merged else value
+
+    return values
+
+
+def render_metrics():
+    lines = []
+    values = {}
+
+    # Every worker keeps writing its counts to METRICS_DIR, so a scrape served by any of them
+    # sees the sum over all of them
+    if settings.METRICS_DIR:
+        write_snapshot(force=True)
+        values = read_snapshots()
+
+    for metric in registry:
+        lines.append('# HELP {} {}'.format(metric.name, metric.description))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+        lines.extend(metric.collect(values.get(metric.name)))
+
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = {}
+        self.active = set()
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+
+@contextmanager
+def timed(name):
+    timings = getattr(_local, 'timings', None)
+
+    if timings is None or name in timings.active:
+        yield
+        return
+
+    timings.active.add(name)
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+        timings.active.discard(name)
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+
+    return match.view_name if match is not None else 'unmatched'
+
+
+def get_server_timing(timings, recorder, total):
+    entries = [
+        '{};dur={:.2f}'.format(name, duration * 1000)
+        for name, duration in sorted(timings.durations.items())
+    ]
+    entries.append('db;dur={:.2f};desc="{} queries"'.format(
+        recorder.duration * 1000, recorder.count
+    ))
+    entries.append('total;dur={:.2f}'.format(total * 1000))
+
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _local.timings = RequestTimings()
+        started = time.perf_counter()
+
+        try:
+            with QueryRecorder() as recorder:
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+
+        total = time.perf_counter() - started
+        route = get_route(request)
+
+        requests.inc(route=route, method=request.method, status=response.status_code)
+        if response.status_code >= 500:
+            errors.inc(route=route, method=request.method)
+
+        durations.observe(total, route=route)
+        db_queries.inc(recorder.count, route=route)
+        db_durations.inc(recorder.duration, route=route)
+
+        response['Server-Timing'] = get_server_timing(timings, recorder, total)
+
+        write_snapshot()
+
+        return response
+
+
+def wrap_method(cls, attribute, name):
+    method = getattr(cls, attribute)
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with timed(name):
+            return method(*args, **kwargs)
+
+    setattr(cls, attribute, wrapper)
+
+
+def wrap_property(cls, attribute, name):
+    getter = getattr(cls, attribute).fget
+
+    @wraps(getter)
+    def wrapper(self):
+        with timed(name):
+            return getter(self)
+
+    setattr(cls, attribute, property(wrapper))
+
+
+def install():
+    if getattr(APIView, 'metrics_installed', False):
+        return
+
+    wrap_method(APIView, 'perform_authentication', 'auth')
+    wrap_method(APIView, 'check_permissions', 'perm')
+    wrap_method(APIView, 'check_object_permissions', 'perm')
+    wrap_property(BaseSerializer, 'data', 'serialize')
+    wrap_property(Response, 'rendered_content', 'render')
+
+    APIView.metrics_installed = True
+
+
+def metrics_view(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    token = settings.METRICS_TOKEN
+
+    if not token or not hmac.compare_digest(
+        authorization.encode(), 'Bearer {}'.format(token).encode()
+    ):
+        return HttpResponseForbidden()
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,167 @@
+import cProfile
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+
+from rest_framework import generics
+from rest_framework.permissions import IsAdminUser
+
+from users.authentication import CachedTokenAuthentication
+
+
+PROFILE_EXTENSIONS = {
+    'pstats': 'application/octet-stream',
+    'collapsed': 'text/plain',
+}
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{} ({}:{})'.format(
+                code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+            ))
+            frame = frame.f_back
+
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, 'w') as collapsed:
+            for stack, count in self.stacks.most_common():
+                collapsed.write('{} {}\n'.format(stack, count))
+
+
+def get_profile_path(profile_id, extension):
+    return os.path.join(settings.PROFILER_DIR, '{}.{}'.format(profile_id, extension))
+
+
+def is_profile_requested(request):
+    token = request.META.get('HTTP_X_PROFILE') or request.GET.get('profile')
+
+    return bool(token and settings.PROFILER_TOKEN) and hmac.compare_digest(
+        token.encode(), settings.PROFILER_TOKEN.encode()
+    )
+
+
+def take_profile_slot():
+    window = '{}-'.format(int(time.time() // settings.PROFILER_RATE_WINDOW))
+    slot_dir = os.path.join(settings.PROFILER_DIR, 'slots')
+    os.makedirs(slot_dir, exist_ok=True)
+
+    for entry in os.scandir(slot_dir):
+        if not entry.name.startswith(window):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Creating a file with O_EXCL is atomic, so workers sharing PROFILER_DIR share the limit
+    for slot in range(settings.PROFILER_RATE_LIMIT):
+        try:
+            os.close(os.open(
+                os.path.join(slot_dir, window + str(slot)), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+            ))
+        except FileExistsError:
+            continue
+
+        return True
+
+    return False
+
+
+def remove_old_profiles():
+    profiles = sorted(
+        (entry for entry in os.scandir(settings.PROFILER_DIR) if entry.name.endswith('.pstats')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+
+    for entry in profiles[:max(len(profiles) - settings.PROFILER_MAX_PROFILES, 0)]:
+        profile_id = entry.name[:-len('.pstats')]
+
+        for extension in PROFILE_EXTENSIONS:
+            try:
+                os.remove(get_profile_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_profile_requested(request):
+            return self.get_response(request)
+
+        if not take_profile_slot():
+            response = self.get_response(request)
+            response['X-Profile'] = 'rate-limited'
+            return response
+
+        profile_id = uuid.uuid4().hex
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), settings.PROFILER_SAMPLE_INTERVAL)
+
+        sampler.start()
+        profiler.enable()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            sampler.stop()
+
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        profiler.dump_stats(get_profile_path(profile_id, 'pstats'))
+        sampler.write(get_profile_path(profile_id, 'collapsed'))
+        remove_old_profiles()
+
+        response['X-Profile'] = profile_id
+
+        return response
+
+
+class ProfileDownload(generics.GenericAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, profile_id=None, extension=None):
+        path = get_profile_path(profile_id, extension)
+
+        if not os.path.exists(path):
+            raise Http404
+
+        response = FileResponse(open(path, 'rb'), content_type=PROFILE_EXTENSIONS[extension])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+            profile_id, extension
+        )
+
+        return response
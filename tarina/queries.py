@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.backends.utils import CursorWrapper
+
+from . import slow_queries
+
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def get_recorders():
+    if not hasattr(_local, 'recorders'):
+        _local.recorders = []
+
+    return _local.recorders
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __enter__(self):
+        get_recorders().append(self)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        get_recorders().remove(self)
+
+    def record(self, sql, params, duration):
+        self.count += 1
+        self.duration += duration
+
+
+class RecordingCursorWrapper(CursorWrapper):
+    def is_recording(self):
+        return get_recorders() or settings.SLOW_QUERY_THRESHOLD is not None
+
+    def notify(self, sql, params, start, many=False):
+        duration = time.time() - start
+
+        for recorder in get_recorders():
+            recorder.record(sql, params, duration)
+
+        threshold = settings.SLOW_QUERY_THRESHOLD
+
+        if threshold is not None and duration >= threshold:
+            slow_queries.log_slow_query(self.db, sql, params, duration, many=many)
+
+    def execute(self, sql, params=None):
+        if not self.is_recording():
+            return self.cursor.execute(sql, params)
+
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.notify(sql, params, start)
+
+    def executemany(self, sql, param_list):
+        if not self.is_recording():
+            return self.cursor.executemany(sql, param_list)
+
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.notify(sql, param_list, start, many=True)
+
+
+def install_query_recording(connection, **kwargs):
+    if getattr(connection, 'query_recording_installed', False):
+        return
+
+    make_cursor = connection.make_cursor
+    make_debug_cursor = connection.make_debug_cursor
+
+    connection.make_cursor = lambda cursor: RecordingCursorWrapper(
+        make_cursor(cursor), connection
+    )
+    connection.make_debug_cursor = lambda cursor: RecordingCursorWrapper(
+        make_debug_cursor(cursor), connection
+    )
+    connection.query_recording_installed = True
+
+
+def install():
+    connection_created.connect(install_query_recording)
+
+    for connection in connections.all():
+        install_query_recording(connection)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMixin:
+    query_budget = None
+
+    def get_query_budget(self):
+        if isinstance(self.query_budget, dict):
+            action = getattr(self, 'action', None) or self.request.method.lower()
+
+            return self.query_budget.get(action)
+
+        return self.query_budget
+
+    def dispatch(self, request, *args, **kwargs):
+        with QueryRecorder() as recorder:
+            response = super().dispatch(request, *args, **kwargs)
+
+        budget = self.get_query_budget()
+
+        if budget is not None and recorder.count > budget:
+            message = '{} {} ran {} queries, over its budget of {}.'.format(
+                request.method, request.path, recorder.count, budget
+            )
+
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+
+            logger.warning(message)
+
+        return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 
 import os
+import tempfile
 
 import dj_database_url
 
@@ -25,7 +26,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'b0^9)u2%79sip$^-3rv0c*e#q45sf0-t_=e!zh!ue(ap0lvgmf'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = ['localhost', 'tarina.herokuapp.com']
 
@@ -45,11 +46,15 @@ INSTALLED_APPS = [
     'corsheaders',
     'vote',
 
+    'tarina',
     'users',
     'stories'
 ]
 
 MIDDLEWARE = [
+    'tarina.metrics.MetricsMiddleware',
+    'tarina.slow_queries.SlowQueryMiddleware',
+    'tarina.profiling.ProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -80,6 +85,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'tarina.wsgi.application'
 
+TEST_RUNNER = 'tarina.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/1.10/ref/settings/#databases
@@ -160,5 +167,123 @@ STATICFILES_STORAGE = 'whitenoise.django.GzipManifestStaticFilesStorage'
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Rendered story payloads are cached per story revision, so entries never need deleting.
+# Any Django cache backend works here, e.g. the file based one or a Redis-compatible server.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'tarina.cache.LRUCache'),
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+    # Resolved auth tokens, keyed on a generation that logout, token rotation and user changes
+    # replace. Revocations only reach the processes sharing the backend: the default one is
+    # shared by the processes of a host, use e.g. memcached across hosts.
+    'tokens': {
+        'BACKEND': os.environ.get(
+            'TOKEN_CACHE_BACKEND', 'tarina.cache.FileBasedCache'
+        ),
+        'LOCATION': os.environ.get(
+            'TOKEN_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'tarina-tokens')
+        ),
+        'TIMEOUT': 10,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Seconds a cache miss may hold the recomputation lock, and how often others poll for it
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+
+# Bearer token Prometheus sends to scrape /api/metrics/; without it the endpoint is disabled.
+# Each worker writes its counts to METRICS_DIR at most every METRICS_SNAPSHOT_INTERVAL
+# seconds, and a scrape adds up the counts of every worker sharing the directory.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'tarina-metrics')
+)
+METRICS_SNAPSHOT_INTERVAL = 1
+
+# Requests sent with `X-Profile: $PROFILER_TOKEN` (or `?profile=`) are profiled, at most
+# PROFILER_RATE_LIMIT per PROFILER_RATE_WINDOW seconds across the workers sharing PROFILER_DIR,
+# where the results are kept
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+PROFILER_DIR = os.environ.get('PROFILER_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILER_RATE_LIMIT = 10
+PROFILER_RATE_WINDOW = 60
+PROFILER_SAMPLE_INTERVAL = 0.001
+PROFILER_MAX_PROFILES = 100
+
 # Global constants for projects apps
 MAX_STORYLINES = 30
+
+# Views over their declared query budget are logged; the test runner makes them fail
+QUERY_BUDGET_STRICT = False
+
+# Queries slower than this many seconds are logged (None disables it), a share of them with
+# their EXPLAIN plan. Each process rotates its own log next to SLOW_QUERY_LOG; all of them are
+# shown at /admin/slow-queries/.
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_EXPLAIN_RATE = 0.1
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'slow_queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'tarina.slow_queries.ProcessRotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'tarina.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Hours after which an activity counts half as much towards the trending score
+TRENDING_HALF_LIFE = 24
+
+# Seconds vote counter updates are buffered in memory before being written; 0 writes every vote
+VOTE_BUFFER_INTERVAL = 0
+
+# Server-Sent Events for story updates, served by tarina.asgi along with the story rooms:
+# seconds between keep-alive comments and seconds clients wait before reconnecting
+STORY_EVENTS_HEARTBEAT = 15
+STORY_EVENTS_RETRY = 3
+
+# Seconds the single-use tickets that open event streams and story rooms stay valid
+STREAM_TICKET_TIMEOUT = 30
+
+# WebSocket story rooms served by tarina.asgi: messages queued per connection before a slow
+# client is disconnected, seconds between checks for lines posted over HTTP, and seconds a
+# typing indicator lasts without being renewed
+STORY_ROOMS_CHANNEL_CAPACITY = 100
+STORY_ROOMS_POLL_INTERVAL = 2
+STORY_ROOMS_TYPING_TIMEOUT = 6
+STORY_ROOMS_DATABASE_THREADS = 4
+
+# Seconds a writer holds the turn to post the next line of a story. The turn is kept in the
+# tokens cache, so it is shared by the workers sharing that backend, and it is given back as
+# soon as the line is saved; the timeout only frees the turn of a worker that died mid-post.
+STORY_TURN_TIMEOUT = 10
@@ -0,0 +1,185 @@
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import threading
+import traceback
+from collections import deque
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+IGNORED_FILES = ('queries.py', 'slow_queries.py')
+
+# Parameters of these queries can hold credentials (token keys, sessions, password hashes),
+# so they are never written to the log
+REDACTED_QUERIES = re.compile(
+    r'\b(authtoken_token|django_session)\b|^\s*(INSERT INTO|UPDATE)\s+"?auth_user\b',
+    re.IGNORECASE
+)
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            _local.view = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = request.resolver_match.view_name
+
+
+def get_stack_summary(limit=6):
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+        and os.path.basename(frame.filename) not in IGNORED_FILES
+    ]
+
+    return [
+        '{}:{} in {}'.format(
+            os.path.relpath(frame.filename, settings.BASE_DIR), frame.lineno, frame.name
+        )
+        for frame in frames[-limit:]
+    ]
+
+
+def explain(connection, sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    cursor = connection.create_cursor()
+    savepoint = None
+
+    try:
+        # A failed statement aborts a PostgreSQL transaction, so EXPLAIN gets a savepoint
+        if connection.in_atomic_block:
+            cursor.execute(connection.ops.savepoint_create_sql('slow_query_explain'))
+            savepoint = 'slow_query_explain'
+
+        cursor.execute(prefix + sql, params)
+
+        return [str(row[-1]) for row in cursor.fetchall()]
+    except connection.Database.Error as e:
+        if savepoint is not None:
+            cursor.execute(connection.ops.savepoint_rollback_sql(savepoint))
+
+        return ['EXPLAIN failed: {}'.format(e)]
+    finally:
+        if savepoint is not None:
+            cursor.execute(connection.ops.savepoint_commit_sql(savepoint))
+
+        cursor.close()
+
+
+def format_params(sql, params):
+    if params is None:
+        return None
+
+    if REDACTED_QUERIES.search(sql):
+        return '<redacted>'
+
+    if isinstance(params, dict):
+        return {key: repr(value)[:200] for key, value in params.items()}
+
+    return [repr(value)[:200] for value in params]
+
+
+def log_slow_query(connection, sql, params, duration, many=False):
+    plan = None
+
+    if (
+        not many
+        and sql.lstrip()[:6].upper() == 'SELECT'
+        and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+    ):
+        plan = explain(connection, sql, params)
+
+    logger.warning(json.dumps({
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 1),
+        'database': connection.alias,
+        'view': getattr(_local, 'view', None),
+        'sql': sql,
+        'params': None if many else format_params(sql, params),
+        'stack': get_stack_summary(),
+        'plan': plan,
+    }))
+
+
+def get_process_log_path(path, pid):
+    root, extension = os.path.splitext(path)
+
+    return '{}.{}{}'.format(root, pid, extension)
+
+
+class ProcessRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # Each process writes and rotates a log of its own, named after its pid, so forked
+    # workers never rotate a file under each other
+    def __init__(self, filename, *args, **kwargs):
+        self.path = filename
+        self.pid = os.getpid()
+
+        super().__init__(get_process_log_path(filename, self.pid), *args, **kwargs)
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.baseFilename = os.path.abspath(get_process_log_path(self.path, self.pid))
+
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+        super().emit(record)
+
+
+def read_slow_queries(path, limit=100):
+    root, extension = os.path.splitext(path)
+    records = []
+
+    for log_path in glob.glob('{}.*{}'.format(glob.escape(root), extension)):
+        try:
+            with open(log_path) as log:
+                lines = deque(log, maxlen=limit)
+        except FileNotFoundError:
+            continue
+
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+    records.sort(key=lambda record: record.get('time', ''), reverse=True)
+
+    return records[:limit]
+
+
+@staff_member_required
+def slow_queries_view(request):
+    context = dict(
+        admin.site.each_context(request),
+        title='Slow queries',
+        threshold_ms=(
+            None if settings.SLOW_QUERY_THRESHOLD is None
+            else settings.SLOW_QUERY_THRESHOLD * 1000
+        ),
+        records=read_slow_queries(settings.SLOW_QUERY_LOG)
+    )
+
+    return TemplateResponse(request, 'admin/slow_queries.html', context)
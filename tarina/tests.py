@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.test import LiveServerTestCase
+
+from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+
+from stories.models import Story
+from . import benchmark, loadtest
+
+
+class BenchmarkTests(APITestCase):
+    def test_seed_dataset(self):
+        users, story_ids = benchmark.seed_dataset(stories=3, lines=2, users=4, votes=5)
+
+        self.assertEqual(len(users), 4)
+        self.assertEqual(len(story_ids), 3)
+
+        for story in Story.objects.filter(id__in=story_ids):
+            self.assertEqual(story.storyline_count, 2)
+            self.assertEqual(story.storyline_set.count(), 2)
+
+    def test_seed_dataset_reports_import_errors(self):
+        with self.assertRaisesMessage(ValueError, 'Could not seed story #0: '):
+            benchmark.seed_dataset(stories=1, lines=settings.MAX_STORYLINES + 1, users=3)
+
+    def test_benchmark_reports_every_endpoint(self):
+        users, story_ids = benchmark.seed_dataset(stories=2, lines=2, users=3, votes=2)
+
+        results = benchmark.Benchmark(users, story_ids, iterations=2).run()
+
+        self.assertEqual(set(results), {
+            'story-list', 'story-detail', 'story-create', 'story-delete', 'story-search',
+            'category-personal', 'category-trending',
+            'storylines-list', 'storylines-changes', 'storyline-detail', 'storyline-create',
+            'storyline-delete', 'ticket', 'vote', 'unvote', 'block', 'unblock', 'blacklist',
+            'profile', 'profile-update', 'register', 'login', 'logout', 'import', 'export',
+        })
+
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50'], result['p99'])
+            self.assertGreater(result['bytes'], 0)
+
+    def test_benchmark_runs_selected_endpoints(self):
+        users, story_ids = benchmark.seed_dataset(stories=1, lines=1, users=3, votes=0)
+
+        results = benchmark.Benchmark(users, story_ids, iterations=1).run(only=['vote'])
+
+        self.assertEqual(list(results), ['vote'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(benchmark.get_percentile(values, 50), 51)
+        self.assertEqual(benchmark.get_percentile(values, 99), 99)
+        self.assertEqual(benchmark.get_percentile([5], 95), 5)
+
+    def test_compare_with_baseline(self):
+        baseline = {'story-list': {'p95': 10, 'queries': 4}}
+
+        self.assertEqual(
+            benchmark.compare_with_baseline({'story-list': {'p95': 11.5, 'queries': 4}}, baseline),
+            []
+        )
+
+        regressions = benchmark.compare_with_baseline(
+            {'story-list': {'p95': 13, 'queries': 5}, 'profile': {'p95': 1, 'queries': 1}},
+            baseline
+        )
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith('story-list') for regression in regressions))
+
+
+class LoadTestTests(LiveServerTestCase):
+    def test_load_report_summary(self):
+        report = loadtest.LoadReport()
+
+        report.record('poll', 0.01, 200)
+        report.record('poll', 0.03, 500)
+        report.record('post-line', 0.02, 403)
+        report.record('post-line', 0.02, 0)
+
+        summary = report.get_summary(elapsed=2)
+
+        self.assertEqual(list(summary), ['poll', 'post-line'])
+        self.assertEqual(summary['poll']['throughput'], 1)
+        self.assertEqual(summary['poll']['error_rate'], 50)
+        self.assertEqual(summary['poll']['max'], 30)
+        self.assertEqual(summary['post-line']['rejected_rate'], 50)
+        self.assertEqual(summary['post-line']['error_rate'], 50)
+
+    def test_virtual_users_replay_client_flows(self):
+        users, story_ids = benchmark.seed_dataset(stories=2, lines=1, users=3, votes=0)
+        tokens = list(Token.objects.filter(user__in=users).values_list('key', flat=True))
+
+        summary = loadtest.run_load(
+            (self.server_thread.host, self.server_thread.port), tokens, story_ids,
+            users=2, duration=1, polls=2, poll_interval=0.1, hot_share=0.5,
+            trending_share=1, post_share=1, vote_share=1
+        )
+
+        for step in ('browse', 'trending', 'open-story', 'poll', 'post-line', 'vote'):
+            self.assertGreater(summary[step]['requests'], 0)
+            self.assertEqual(summary[step]['error_rate'], 0)
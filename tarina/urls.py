@@ -16,7 +16,10 @@ Including another URLconf
 from django.conf.urls import url, include
 from django.contrib import admin
 
+from .slow_queries import slow_queries_view
+
 urlpatterns = [
+    url(r'^admin/slow-queries/$', slow_queries_view, name='slow-queries'),
     url(r'^admin/', admin.site.urls),
     url(r'^api/', include('tarina.api'))
 ]
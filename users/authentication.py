@@ -0,0 +1,85 @@
+import binascii
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from tarina.cache import SingleFlightCache
+
+
+token_cache = SingleFlightCache('tokens')
+
+
+def get_token_cache_key(key):
+    return 'token:{}'.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def get_token_generation(key):
+    generation_key = '{}:generation'.format(get_token_cache_key(key))
+    generation = token_cache.cache.get(generation_key)
+
+    if generation is None:
+        generation = uuid.uuid4().hex
+
+        if not token_cache.cache.add(generation_key, generation, None):
+            generation = token_cache.cache.get(generation_key, generation)
+
+    return generation
+
+
+def forget_token_key(key):
+    # Cached credentials are keyed on the token's generation, so a new one makes every process
+    # miss, including a lookup that read the old generation before the token was revoked.
+    token_cache.cache.set(
+        '{}:generation'.format(get_token_cache_key(key)), uuid.uuid4().hex, None
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def get_credentials(self, key):
+        model = self.get_model()
+
+        try:
+            token = model.objects.select_related('user__author').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return token.user, token
+
+    def authenticate_credentials(self, key):
+        cache_key = '{}:{}'.format(get_token_cache_key(key), get_token_generation(key))
+
+        return token_cache.get_or_set(cache_key, lambda: self.get_credentials(key))
+
+
+def issue_stream_ticket(token, story_id):
+    ticket = binascii.hexlify(os.urandom(20)).decode()
+    token_cache.cache.set(
+        'ticket:{}'.format(ticket), (token.key, story_id), settings.STREAM_TICKET_TIMEOUT
+    )
+
+    return ticket
+
+
+def authenticate_stream_ticket(ticket, story_id):
+    # Streams can't send headers from the browser, so they are opened with a short-lived,
+    # single-use ticket instead of putting the token in the URL (and the access logs).
+    cache_key = 'ticket:{}'.format(ticket)
+    credentials = token_cache.cache.get(cache_key) if ticket else None
+
+    if credentials is None or credentials[1] != story_id or not token_cache.cache.add(
+        '{}:redeemed'.format(cache_key), True, settings.STREAM_TICKET_TIMEOUT
+    ):
+        raise exceptions.AuthenticationFailed(_('Invalid ticket.'))
+
+    token_cache.cache.delete(cache_key)
+
+    return CachedTokenAuthentication().authenticate_credentials(credentials[0])
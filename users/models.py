@@ -8,6 +8,7 @@ class Author(models.Model):
         default='http://tarina.herokuapp.com/static/images/default.jpg',
         blank=False
     )
+    modified_on = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.user.username
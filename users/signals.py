@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token_key
+from .models import Author
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    forget_token_key(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Author)
+def forget_user_tokens(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+
+    user_id = instance.id if sender is User else instance.user_id
+
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        forget_token_key(key)
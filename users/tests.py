@@ -1,10 +1,13 @@
+from unittest import mock
+
 from django.urls import reverse
 from django.contrib.auth.models import User
 
-from rest_framework import status
+from rest_framework import exceptions, status
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
 
+from .authentication import CachedTokenAuthentication, token_cache, forget_token_key
 from .models import Author
 
 
@@ -77,6 +80,98 @@ class UserAuthenticationTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.logout_view = reverse('users:logout')
+
+        self.user = User.objects.create_user(username='Pusha', password='darkestbeforedawn')
+        self.author = Author.objects.create(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+
+        self.profile_view = reverse('users:profile', kwargs={'user_pk': self.user.id})
+        self.client.credentials(HTTP_AUTHORIZATION='Token {}'.format(self.token.key))
+
+    def test_token_is_resolved_once(self):
+        with self.assertNumQueries(2):
+            self.client.get(self.profile_view)
+
+        hits = token_cache.hits
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.profile_view)
+
+        self.assertEqual(token_cache.hits, hits + 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        response = self.client.get(self.profile_view)
+
+        self.assertEqual(response.data['detail'], 'Invalid token.')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_token(self):
+        self.client.get(self.profile_view)
+
+        response = self.client.post(self.logout_view)
+
+        self.assertEqual(response.data['message'], 'You successfully logged out.')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.profile_view)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_after_logout_issues_new_token(self):
+        self.client.post(self.logout_view)
+        self.client.credentials()
+
+        response = self.client.post(
+            reverse('users:login'), {'username': 'Pusha', 'password': 'darkestbeforedawn'}
+        )
+
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        self.client.get(self.profile_view)
+
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(self.profile_view)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_drops_cached_token(self):
+        self.client.get(self.profile_view)
+
+        self.user.set_password('mynameismyname')
+        self.user.save()
+
+        with self.assertNumQueries(2):
+            self.client.get(self.profile_view)
+
+    def test_lookup_racing_logout_is_not_cached(self):
+        get_credentials = CachedTokenAuthentication.get_credentials
+
+        def get_credentials_then_logout(authentication, key):
+            credentials = get_credentials(authentication, key)
+            Token.objects.filter(key=key).delete()
+            forget_token_key(key)
+
+            return credentials
+
+        with mock.patch.object(
+            CachedTokenAuthentication, 'get_credentials', get_credentials_then_logout
+        ):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+
 class AuthorProfileTests(APITestCase):
     def setUp(self):
         self.view_name = 'users:profile'
@@ -103,6 +198,27 @@ class AuthorProfileTests(APITestCase):
         self.assertEqual(response.data['user']['username'], self.user.username)
         self.assertEqual(response.status_code, status.HTTP_200_OK)        
 
+    def test_profile_query_count(self):
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse(self.view_name, kwargs={'user_pk': self.user.id}))
+
+    def test_profile_not_modified(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse(self.view_name, kwargs={'user_pk': self.user.id})
+
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put(url, {'profile_image': 'http://example.com/avatar.png'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.data['profile_image'], 'http://example.com/avatar.png')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_profile_with_invalid_user_id(self):
         self.client.force_authenticate(user=self.user)
 
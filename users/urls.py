@@ -1,6 +1,6 @@
 from django.conf.urls import url
 
-from .views import UserRegistration, UserLogin, AuthorProfile
+from .views import UserRegistration, UserLogin, UserLogout, AuthorProfile
 
 
 app_name = 'users'
@@ -8,5 +8,6 @@ app_name = 'users'
 urlpatterns = [
     url(r'^register/', UserRegistration.as_view(), name='register'),
     url(r'^login/', UserLogin.as_view(), name='login'),
+    url(r'^logout/', UserLogout.as_view(), name='logout'),
     url(r'^profile/(?P<user_pk>[0-9]+)/', AuthorProfile.as_view(), name='profile')
 ]
@@ -4,13 +4,15 @@ from django.contrib.auth import authenticate
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from tarina.conditional import ConditionalGetMixin
+from tarina.queries import QueryBudgetMixin
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer,
     AuthorSerializer
 )
+from .authentication import CachedTokenAuthentication
 from .models import Author
 
 
@@ -49,7 +51,7 @@ class UserLogin(generics.CreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        token = Token.objects.get(user=user)
+        token, _ = Token.objects.get_or_create(user=user)
         headers = self.get_success_headers(serializer)
 
         resp_data = {
@@ -61,20 +63,41 @@ class UserLogin(generics.CreateAPIView):
         return Response(resp_data, status=status.HTTP_200_OK, headers=headers)
 
 
-class AuthorProfile(generics.RetrieveUpdateAPIView):
+class UserLogout(generics.GenericAPIView):
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        request.auth.delete()
+
+        return Response(
+            {'message': 'You successfully logged out.'},
+            status=status.HTTP_200_OK
+        )
+
+
+class AuthorProfile(QueryBudgetMixin, ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = AuthorSerializer
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    query_budget = {'get': 2}
 
     def retrieve(self, request, user_pk=None, *args, **kwargs):
-        author = get_object_or_404(Author, user__id=user_pk)
+        author = get_object_or_404(Author.objects.select_related('user'), user__id=user_pk)
+
+        not_modified = self.get_not_modified_response(
+            request,
+            etag='author-{}-{:%Y%m%d%H%M%S%f}'.format(author.id, author.modified_on)
+        )
+        if not_modified:
+            return not_modified
 
         serializer = self.serializer_class(author)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def update(self, request, user_pk=None):
-        author = get_object_or_404(Author, user__id=user_pk)
+        author = get_object_or_404(Author.objects.select_related('user'), user__id=user_pk)
 
         serializer = self.serializer_class(author, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)